@@ -0,0 +1,23 @@
+from .memory import (
+    InMemoryAppointmentRepository,
+    InMemorySeriesRepository,
+    InMemoryUserRepository,
+)
+from .sharded import ShardedAppointmentRepository
+from .sqlite import (
+    SQLiteAppointmentRepository,
+    SQLiteDatabase,
+    SQLiteSeriesRepository,
+    SQLiteUserRepository,
+)
+
+__all__ = [
+    "InMemoryAppointmentRepository",
+    "InMemorySeriesRepository",
+    "InMemoryUserRepository",
+    "ShardedAppointmentRepository",
+    "SQLiteAppointmentRepository",
+    "SQLiteDatabase",
+    "SQLiteSeriesRepository",
+    "SQLiteUserRepository",
+]
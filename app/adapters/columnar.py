@@ -0,0 +1,242 @@
+"""Appointments stored column by column in NumPy arrays.
+
+Needs the ``columnar`` extra (``numpy``).
+"""
+
+import builtins
+from datetime import datetime
+from typing import Any, Collection, Iterable, Mapping, Self, Sequence
+from uuid import UUID
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.domain import Appointment, AppointmentKey, AppointmentRepository
+
+from .encoding import MICROSECOND, from_timestamp, join_uuid, split_uuid, to_timestamp
+
+COLUMNS: dict[str, type[np.generic]] = dict(
+    start=np.int64,
+    duration=np.int64,
+    id_high=np.uint64,
+    id_low=np.uint64,
+    therapist_high=np.uint64,
+    therapist_low=np.uint64,
+    patient_high=np.uint64,
+    patient_low=np.uint64,
+    title=np.int32,
+)
+
+
+class ColumnarAppointmentRepository(AppointmentRepository):
+    """Appointments kept as one row per index across typed NumPy columns.
+
+    Starts and durations are int64 microseconds, each UUID is two uint64
+    halves and titles are interned into a shared table, so a row costs 68
+    bytes. Filters and overlap checks are vectorized masks over the columns;
+    ``Appointment`` objects are only built for the rows returned.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._size = 0
+        self._columns: dict[str, NDArray[Any]] = {
+            name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS.items()
+        }
+        self._titles: list[str] = []
+        self._title_codes: dict[str, int] = {}
+
+    @classmethod
+    def from_columns(
+        cls, columns: Mapping[str, NDArray[Any]], titles: Sequence[str]
+    ) -> Self:
+        """A repository over existing ``columns``, used as they are, not copied,
+        whose ``title`` codes index ``titles``."""
+        repository = cls(capacity=0)
+        repository._size = len(columns["start"])
+        repository._columns = {name: columns[name] for name in COLUMNS}
+        repository._titles = list(titles)
+        repository._title_codes = {
+            title: code for code, title in enumerate(repository._titles)
+        }
+        return repository
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def columns(self) -> dict[str, NDArray[Any]]:
+        """The filled part of each column, as views."""
+        return {name: self._column(name) for name in COLUMNS}
+
+    @property
+    def titles(self) -> builtins.list[str]:
+        return builtins.list(self._titles)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the filled part of the columns."""
+        return sum(column[: self._size].nbytes for column in self._columns.values())
+
+    def _column(self, name: str) -> NDArray[Any]:
+        return self._columns[name][: self._size]
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._columns["start"])
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: self._size] = column[: self._size]
+            self._columns[name] = grown
+
+    def _intern(self, title: str) -> int:
+        code = self._title_codes.get(title)
+        if code is None:
+            code = self._title_codes[title] = len(self._titles)
+            self._titles.append(title)
+        return code
+
+    def _rows_of(self, ids: Iterable[UUID]) -> NDArray[np.intp]:
+        """Row of each id, or -1 when it is not stored."""
+        halves = np.array([split_uuid(id) for id in ids], dtype=np.uint64)
+        rows = np.full(len(halves), -1, dtype=np.intp)
+        if not len(halves) or not self._size:
+            return rows
+        high, low = self._column("id_high"), self._column("id_low")
+        candidates = np.flatnonzero(np.isin(high, halves[:, 0]))
+        by_id = {(int(high[row]), int(low[row])): row for row in candidates.tolist()}
+        for position, (id_high, id_low) in enumerate(halves.tolist()):
+            rows[position] = by_id.get((id_high, id_low), -1)
+        return rows
+
+    def _write(self, row: int, appointment: Appointment) -> None:
+        columns = self._columns
+        columns["start"][row] = to_timestamp(appointment.start_at)
+        columns["duration"][row] = to_timestamp(appointment.end_at) - to_timestamp(
+            appointment.start_at
+        )
+        columns["id_high"][row], columns["id_low"][row] = split_uuid(appointment.id)
+        columns["therapist_high"][row], columns["therapist_low"][row] = split_uuid(
+            appointment.therapist_id
+        )
+        columns["patient_high"][row], columns["patient_low"][row] = split_uuid(
+            appointment.patient_id
+        )
+        columns["title"][row] = self._intern(appointment.title)
+
+    def _build(self, row: int) -> Appointment:
+        columns = self._columns
+        start = int(columns["start"][row])
+        return Appointment.hydrate(
+            id=join_uuid(int(columns["id_high"][row]), int(columns["id_low"][row])),
+            title=self._titles[int(columns["title"][row])],
+            start_at=from_timestamp(start),
+            duration=int(columns["duration"][row]) * MICROSECOND,
+            therapist_id=join_uuid(
+                int(columns["therapist_high"][row]),
+                int(columns["therapist_low"][row]),
+            ),
+            patient_id=join_uuid(
+                int(columns["patient_high"][row]), int(columns["patient_low"][row])
+            ),
+        )
+
+    def _matching(self, prefix: str, ids: Collection[UUID]) -> NDArray[np.bool_]:
+        high, low = self._column(f"{prefix}_high"), self._column(f"{prefix}_low")
+        mask = np.zeros(self._size, dtype=np.bool_)
+        for id in ids:
+            id_high, id_low = split_uuid(id)
+            mask |= (high == id_high) & (low == id_low)
+        return mask
+
+    def _sorted(self, rows: NDArray[np.intp]) -> NDArray[np.intp]:
+        """``rows`` in (start_at, id) order."""
+        order = np.lexsort(
+            (
+                self._columns["id_low"][rows],
+                self._columns["id_high"][rows],
+                self._columns["start"][rows],
+            )
+        )
+        return rows[order]
+
+    async def get(self, id: UUID) -> Appointment:
+        row = int(self._rows_of([id])[0])
+        if row < 0:
+            raise KeyError(id)
+        return self._build(row)
+
+    async def save(self, appointment: Appointment) -> UUID:
+        return (await self.save_many([appointment]))[0]
+
+    async def save_many(
+        self, appointments: Iterable[Appointment]
+    ) -> builtins.list[UUID]:
+        appointments = builtins.list(appointments)
+        rows = self._rows_of(an_appointment.id for an_appointment in appointments)
+        self._grow(self._size + int(np.count_nonzero(rows < 0)))
+        for row, an_appointment in zip(rows.tolist(), appointments):
+            if row < 0:
+                row = self._size
+                self._size += 1
+            self._write(row, an_appointment)
+        return [an_appointment.id for an_appointment in appointments]
+
+    async def list(self) -> builtins.list[Appointment]:
+        return [self._build(row) for row in range(self._size)]
+
+    async def delete(self, id: UUID) -> None:
+        """Move the last row into the deleted one, keeping the rows packed."""
+        row = int(self._rows_of([id])[0])
+        if row < 0:
+            raise KeyError(id)
+        self._size -= 1
+        for column in self._columns.values():
+            column[row] = column[self._size]
+
+    async def query(
+        self,
+        *,
+        therapist_id: UUID | None = None,
+        patient_id: UUID | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        after: AppointmentKey | None = None,
+        limit: int | None = None,
+    ) -> builtins.list[Appointment]:
+        starts = self._column("start")
+        mask = np.ones(self._size, dtype=np.bool_)
+        if therapist_id is not None:
+            mask &= self._matching("therapist", [therapist_id])
+        if patient_id is not None:
+            mask &= self._matching("patient", [patient_id])
+        if start is not None:
+            mask &= starts >= to_timestamp(start)
+        if end is not None:
+            mask &= starts < to_timestamp(end)
+        if after is not None:
+            after_start = to_timestamp(after[0])
+            after_high, after_low = split_uuid(after[1])
+            high, low = self._column("id_high"), self._column("id_low")
+            mask &= (starts > after_start) | (
+                (starts == after_start)
+                & ((high > after_high) | ((high == after_high) & (low > after_low)))
+            )
+
+        rows = self._sorted(np.flatnonzero(mask))
+        return [self._build(row) for row in rows[:limit].tolist()]
+
+    async def find_overlapping(
+        self,
+        therapist_ids: Collection[UUID],
+        patient_ids: Collection[UUID],
+        start: datetime,
+        end: datetime,
+    ) -> builtins.list[Appointment]:
+        starts = self._column("start")
+        ends = starts + self._column("duration")
+        mask = self._matching("therapist", therapist_ids)
+        mask |= self._matching("patient", patient_ids)
+        mask &= (starts <= to_timestamp(end)) & (ends >= to_timestamp(start))
+        return [self._build(row) for row in self._sorted(np.flatnonzero(mask))]
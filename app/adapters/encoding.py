@@ -0,0 +1,133 @@
+from base64 import b64decode, b64encode
+from datetime import datetime, timedelta
+from typing import Any
+from uuid import UUID, SafeUUID
+
+from app.domain import Appointment, Frequency, Series, User
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+LOW_BITS = (1 << 64) - 1
+
+
+def to_timestamp(value: datetime) -> int:
+    """Microseconds since the epoch of a naive datetime."""
+    return (value - EPOCH) // MICROSECOND
+
+
+def from_timestamp(value: int) -> datetime:
+    return EPOCH + value * MICROSECOND
+
+
+def split_uuid(value: UUID) -> tuple[int, int]:
+    """The high and low 64 bits of a UUID, in UUID comparison order."""
+    return value.int >> 64, value.int & LOW_BITS
+
+
+def join_uuid(high: int, low: int) -> UUID:
+    return uuid_from_int((high << 64) | low)
+
+
+def uuid_from_int(value: int) -> UUID:
+    """A UUID from a value this application stored, skipping the checks and
+    keyword parsing of ``UUID.__init__``, which dominate row decoding."""
+    uuid = object.__new__(UUID)
+    object.__setattr__(uuid, "int", value)
+    object.__setattr__(uuid, "is_safe", SafeUUID.unknown)
+    return uuid
+
+
+def uuid_from_bytes(value: bytes) -> UUID:
+    return uuid_from_int(int.from_bytes(value))
+
+
+def appointment_to_row(appointment: Appointment) -> list[Any]:
+    """A JSON-ready row holding every field of ``appointment``."""
+    return [
+        appointment.id.int,
+        appointment.title,
+        to_timestamp(appointment.start_at),
+        appointment.duration // MICROSECOND,
+        appointment.patient_id.int,
+        appointment.therapist_id.int,
+    ]
+
+
+def appointment_from_row(row: list[Any]) -> Appointment:
+    id, title, start_at, duration, patient_id, therapist_id = row
+    return Appointment.hydrate(
+        id=uuid_from_int(id),
+        title=title,
+        start_at=from_timestamp(start_at),
+        duration=duration * MICROSECOND,
+        patient_id=uuid_from_int(patient_id),
+        therapist_id=uuid_from_int(therapist_id),
+    )
+
+
+def user_to_row(user: User) -> list[Any]:
+    return [
+        user.id.int,
+        user.firstname,
+        user.lastname,
+        user.email,
+        b64encode(user.password_hash).decode(),
+        user.salt,
+    ]
+
+
+def user_from_row(row: list[Any]) -> User:
+    id, firstname, lastname, email, password_hash, salt = row
+    return User.hydrate(
+        id=uuid_from_int(id),
+        firstname=firstname,
+        lastname=lastname,
+        email=email,
+        password_hash=b64decode(password_hash),
+        salt=salt,
+    )
+
+
+def series_to_row(series: Series) -> list[Any]:
+    return [
+        series.id.int,
+        series.title,
+        to_timestamp(series.start_at),
+        series.duration // MICROSECOND,
+        series.patient_id.int,
+        series.therapist_id.int,
+        series.frequency.value,
+        series.interval,
+        None if series.until is None else to_timestamp(series.until),
+        series.count,
+        sorted(to_timestamp(an_exception) for an_exception in series.exceptions),
+    ]
+
+
+def series_from_row(row: list[Any]) -> Series:
+    (
+        id,
+        title,
+        start_at,
+        duration,
+        patient_id,
+        therapist_id,
+        frequency,
+        interval,
+        until,
+        count,
+        exceptions,
+    ) = row
+    return Series.hydrate(
+        id=uuid_from_int(id),
+        title=title,
+        start_at=from_timestamp(start_at),
+        duration=duration * MICROSECOND,
+        patient_id=uuid_from_int(patient_id),
+        therapist_id=uuid_from_int(therapist_id),
+        frequency=Frequency(frequency),
+        interval=interval,
+        until=None if until is None else from_timestamp(until),
+        count=count,
+        exceptions=frozenset(map(from_timestamp, exceptions)),
+    )
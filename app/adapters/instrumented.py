@@ -0,0 +1,131 @@
+import builtins
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Collection, Iterable
+from uuid import UUID
+
+from app.domain import (
+    Appointment,
+    AppointmentKey,
+    AppointmentRepository,
+    User,
+    UserRepository,
+)
+from app.metrics import REPOSITORY_ERRORS, REPOSITORY_RESULT_SIZE, REPOSITORY_SECONDS
+
+
+class _Recorder:
+    """Times repository calls under the name of the wrapped repository."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    async def record[T](
+        self,
+        method: str,
+        call: Awaitable[T],
+        size: Callable[[T], int] | None = None,
+    ) -> T:
+        before = time.perf_counter()
+        try:
+            result = await call
+        except Exception as error:
+            REPOSITORY_ERRORS.inc(self.name, method, type(error).__name__)
+            raise
+        finally:
+            REPOSITORY_SECONDS.observe(time.perf_counter() - before, self.name, method)
+        if size is not None:
+            REPOSITORY_RESULT_SIZE.observe(size(result), self.name, method)
+        return result
+
+
+class InstrumentedUserRepository(UserRepository):
+    """Records the count, latency and errors of every call to ``repository``."""
+
+    def __init__(self, repository: UserRepository) -> None:
+        self.repository = repository
+        self._recorder = _Recorder(type(repository).__name__)
+
+    async def get(self, id: UUID) -> User:
+        return await self._recorder.record("get", self.repository.get(id))
+
+    async def save(self, user: User) -> UUID:
+        return await self._recorder.record("save", self.repository.save(user))
+
+    async def list(self) -> builtins.list[User]:
+        return await self._recorder.record("list", self.repository.list(), len)
+
+    async def get_by_email(self, email: str) -> User | None:
+        return await self._recorder.record(
+            "get_by_email", self.repository.get_by_email(email)
+        )
+
+    async def save_many(self, users: Iterable[User]) -> builtins.list[UUID]:
+        return await self._recorder.record(
+            "save_many", self.repository.save_many(builtins.list(users)), len
+        )
+
+
+class InstrumentedAppointmentRepository(AppointmentRepository):
+    """Records the count, latency, errors and result sizes of every call to
+    ``repository``. ``stream`` is the port's, so each of its pages is recorded
+    as a ``query``."""
+
+    def __init__(self, repository: AppointmentRepository) -> None:
+        self.repository = repository
+        self._recorder = _Recorder(type(repository).__name__)
+
+    async def get(self, id: UUID) -> Appointment:
+        return await self._recorder.record("get", self.repository.get(id))
+
+    async def save(self, appointment: Appointment) -> UUID:
+        return await self._recorder.record("save", self.repository.save(appointment))
+
+    async def list(self) -> builtins.list[Appointment]:
+        return await self._recorder.record("list", self.repository.list(), len)
+
+    async def query(
+        self,
+        *,
+        therapist_id: UUID | None = None,
+        patient_id: UUID | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        after: AppointmentKey | None = None,
+        limit: int | None = None,
+    ) -> builtins.list[Appointment]:
+        return await self._recorder.record(
+            "query",
+            self.repository.query(
+                therapist_id=therapist_id,
+                patient_id=patient_id,
+                start=start,
+                end=end,
+                after=after,
+                limit=limit,
+            ),
+            len,
+        )
+
+    async def find_overlapping(
+        self,
+        therapist_ids: Collection[UUID],
+        patient_ids: Collection[UUID],
+        start: datetime,
+        end: datetime,
+    ) -> builtins.list[Appointment]:
+        return await self._recorder.record(
+            "find_overlapping",
+            self.repository.find_overlapping(therapist_ids, patient_ids, start, end),
+            len,
+        )
+
+    async def save_many(
+        self, appointments: Iterable[Appointment]
+    ) -> builtins.list[UUID]:
+        return await self._recorder.record(
+            "save_many", self.repository.save_many(builtins.list(appointments)), len
+        )
+
+    async def delete(self, id: UUID) -> None:
+        await self._recorder.record("delete", self.repository.delete(id))
@@ -0,0 +1,454 @@
+import asyncio
+import builtins
+import json
+import os
+import struct
+import time
+import zlib
+from contextlib import suppress
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, BinaryIO, Callable, Collection, Iterable, Iterator
+from uuid import UUID
+
+from app.domain import (
+    Appointment,
+    AppointmentKey,
+    AppointmentRepository,
+    Series,
+    SeriesRepository,
+    User,
+    UserRepository,
+)
+from app.exceptions import CorruptJournalError, EmailAlreadyUsedError
+from app.metrics import JOURNAL_BATCH_SIZE, JOURNAL_COMMIT_SECONDS, JOURNAL_FSYNCS
+
+from .encoding import (
+    appointment_from_row,
+    appointment_to_row,
+    series_from_row,
+    series_to_row,
+    user_from_row,
+    user_to_row,
+    uuid_from_int,
+)
+
+HEADER = struct.Struct("<II")
+
+# The current state, read on the event loop; the records themselves may be
+# produced lazily, as they are only iterated on a worker thread.
+type Records = Callable[[], Awaitable[Iterable[bytes]]]
+type Apply = Callable[[], Awaitable[object]]
+
+
+class Journal:
+    """An append-only log of records, synced to disk by group commit.
+
+    Each record is framed by its length and CRC32. ``append`` returns once
+    the record is synced, then handed to its ``apply`` callback, which never
+    runs if the write fails. Records appended while a commit is being written,
+    or within ``max_delay`` seconds of the first one waiting, up to
+    ``max_batch`` of them, share a single write and ``fsync``. Under load the
+    commits in flight form the batches on their own, so waiting only pays
+    off when saves arrive close together but not quite at once.
+
+    ``compact`` writes the current state as a snapshot next to the log, then
+    empties the log. ``replay`` yields the snapshot's records, then the log's.
+    A crash can tear the last record written; replay drops it and cuts the
+    log back to the last whole record, but damage anywhere else is reported.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_delay: float = 0.0,
+        max_batch: int = 1024,
+        compact_after: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.path = Path(path)
+        self.snapshot_path = self.path.with_name(self.path.name + ".snapshot")
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.compact_after = compact_after
+        self.size = 0
+        self.fsyncs = 0
+        self._file: BinaryIO | None = None
+        self._pending: list[
+            tuple[bytes, float, asyncio.Future[None], Apply | None]
+        ] = []
+        self._full = asyncio.Event()
+        self._committing: asyncio.Task[None] | None = None
+        self._compacting: asyncio.Task[None] | None = None
+        self._writing = asyncio.Lock()
+
+    def replay(self) -> Iterator[bytes]:
+        if self.snapshot_path.exists():
+            yield from _records(self.snapshot_path.read_bytes(), self.snapshot_path)
+        data = self.path.read_bytes() if self.path.exists() else b""
+        self.size = 0
+        for record in _records(data, self.path):
+            self.size += HEADER.size + len(record)
+            yield record
+        self._open()
+
+    async def append(self, record: bytes, apply: Apply | None = None) -> None:
+        if self._file is None:
+            for _ in self.replay():
+                pass
+        committed = asyncio.get_running_loop().create_future()
+        frame = HEADER.pack(len(record), zlib.crc32(record)) + record
+        self._pending.append((frame, time.perf_counter(), committed, apply))
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        if self._committing is None or self._committing.done():
+            self._committing = asyncio.create_task(self._commit())
+        await committed
+
+    def compact_if_large(self, records: Records) -> None:
+        """Start ``compact`` in the background once the log has outgrown
+        ``compact_after`` bytes, unless it is already running."""
+        if self.size < self.compact_after:
+            return
+        if self._compacting is None or self._compacting.done():
+            self._compacting = asyncio.create_task(self.compact(records))
+
+    async def compact(self, records: Records) -> None:
+        """Fold the log into a snapshot of ``records``, the current state.
+
+        Commits wait meanwhile, and apply their records before letting it
+        run, so every record in the log is reflected in ``records``. Only
+        awaiting ``records`` runs on the event loop: the iterable it returns
+        is encoded and written on a worker thread.
+        """
+        async with self._writing:
+            await asyncio.to_thread(self._fold, await records())
+            self.size = 0
+
+    async def close(self) -> None:
+        while self._committing is not None and not self._committing.done():
+            await self._committing
+        if self._compacting is not None:
+            await self._compacting
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def _commit(self) -> None:
+        while self._pending:
+            if self.max_delay and len(self._pending) < self.max_batch:
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            if len(self._pending) < self.max_batch:
+                self._full.clear()
+            data = b"".join(frame for frame, _, _, _ in batch)
+            try:
+                async with self._writing:
+                    await asyncio.to_thread(self._write, data)
+                    self.size += len(data)
+                    self.fsyncs += 1
+                    JOURNAL_FSYNCS.inc(self.path.name)
+                    failures = [await _failure(apply) for _, _, _, apply in batch]
+            except Exception as error:
+                for _, _, committed, _ in batch:
+                    if not committed.done():
+                        committed.set_exception(error)
+                continue
+
+            now = time.perf_counter()
+            JOURNAL_BATCH_SIZE.observe(len(batch), self.path.name)
+            for (_, appended_at, committed, _), failure in zip(batch, failures):
+                JOURNAL_COMMIT_SECONDS.observe(now - appended_at, self.path.name)
+                if committed.done():
+                    continue
+                if failure is None:
+                    committed.set_result(None)
+                else:
+                    committed.set_exception(failure)
+
+    def _open(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "ab")
+        self._file.truncate(self.size)
+
+    def _write(self, data: bytes) -> None:
+        assert self._file is not None
+        try:
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError:
+            self._file.truncate(self.size)
+            raise
+
+    def _fold(self, records: Iterable[bytes]) -> None:
+        assert self._file is not None
+        temporary = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(temporary, "wb") as file:
+            for record in records:
+                file.write(HEADER.pack(len(record), zlib.crc32(record)) + record)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.snapshot_path)
+        self._file.truncate(0)
+        os.fsync(self._file.fileno())
+
+
+async def _failure(apply: Apply | None) -> Exception | None:
+    """Run ``apply``, returning what it raised rather than raising it."""
+    if apply is None:
+        return None
+    try:
+        await apply()
+    except Exception as error:
+        return error
+    return None
+
+
+def _records(data: bytes, path: Path) -> Iterator[bytes]:
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        length, checksum = HEADER.unpack_from(data, offset)
+        end = offset + HEADER.size + length
+        if end > len(data):
+            if _holds_a_frame(data, offset + HEADER.size):
+                raise CorruptJournalError(f"{path} is damaged at byte {offset}")
+            return
+        record = data[offset + HEADER.size : end]
+        if zlib.crc32(record) != checksum:
+            if end == len(data):
+                return
+            raise CorruptJournalError(f"{path} is damaged at byte {offset}")
+        yield record
+        offset = end
+
+
+def _holds_a_frame(data: bytes, start: int) -> bool:
+    """Whether a whole, non-empty frame with a matching CRC starts anywhere
+    from ``start`` on. None follows a torn last frame, whereas one usually
+    follows a frame whose length field is damaged."""
+    for offset in range(start, len(data) - HEADER.size + 1):
+        length, checksum = HEADER.unpack_from(data, offset)
+        end = offset + HEADER.size + length
+        if 0 < length and end <= len(data):
+            if zlib.crc32(data[offset + HEADER.size : end]) == checksum:
+                return True
+    return False
+
+
+class _Journaled:
+    """Writes each batch of saved models to ``journal`` as one JSON record,
+    applying it to the wrapped repository only once it is synced."""
+
+    def __init__(self, journal: Journal) -> None:
+        self.journal = journal
+
+    async def _log(self, record: Any, state: Records, apply: Apply) -> None:
+        await self.journal.append(json.dumps(record).encode(), apply)
+        self.journal.compact_if_large(state)
+
+    def _replayed(self) -> Iterator[Any]:
+        for record in self.journal.replay():
+            yield from json.loads(record)
+
+
+class JournaledUserRepository(_Journaled, UserRepository):
+    """Makes every save to ``repository`` durable in ``journal`` before it
+    is applied and returns; a ``save_many`` is one record. Emails are checked
+    before the record is written, so a failed write changes nothing and a
+    written one is always applied. Call ``replay`` first to load what the
+    journal holds."""
+
+    def __init__(self, repository: UserRepository, journal: Journal) -> None:
+        super().__init__(journal)
+        self.repository = repository
+        # Emails of saves logged but not applied yet, with their user and how
+        # many such saves there are, so no other user can take them meanwhile.
+        self._unapplied: dict[str, tuple[UUID, int]] = {}
+
+    async def replay(self) -> None:
+        for row in self._replayed():
+            await self.repository.save(user_from_row(row))
+
+    async def get(self, id: UUID) -> User:
+        return await self.repository.get(id)
+
+    async def save(self, user: User) -> UUID:
+        await self._write([user], lambda: self.repository.save(user))
+        return user.id
+
+    async def save_many(self, users: Iterable[User]) -> builtins.list[UUID]:
+        users = builtins.list(users)
+        await self._write(users, lambda: self.repository.save_many(users))
+        return [a_user.id for a_user in users]
+
+    async def list(self) -> builtins.list[User]:
+        return await self.repository.list()
+
+    async def get_by_email(self, email: str) -> User | None:
+        return await self.repository.get_by_email(email)
+
+    async def _write(self, users: builtins.list[User], apply: Apply) -> None:
+        """Log ``users`` then ``apply`` their save, once sure their emails are
+        free: the save must not fail after the record is written."""
+        emails = [(User.normalize_email(a_user.email), a_user.id) for a_user in users]
+        self._reserve(emails)
+        try:
+            for email, id in emails:
+                owner = await self.repository.get_by_email(email)
+                if owner is not None and owner.id != id:
+                    raise EmailAlreadyUsedError
+            await self._log(
+                [user_to_row(a_user) for a_user in users], self._state, apply
+            )
+        finally:
+            self._release(emails)
+
+    def _reserve(self, emails: builtins.list[tuple[str, UUID]]) -> None:
+        for position, (email, id) in enumerate(emails):
+            owner, count = self._unapplied.get(email, (id, 0))
+            if owner != id:
+                self._release(emails[:position])
+                raise EmailAlreadyUsedError
+            self._unapplied[email] = (id, count + 1)
+
+    def _release(self, emails: builtins.list[tuple[str, UUID]]) -> None:
+        for email, id in emails:
+            count = self._unapplied[email][1] - 1
+            if count:
+                self._unapplied[email] = (id, count)
+            else:
+                del self._unapplied[email]
+
+    async def _state(self) -> Iterable[bytes]:
+        users = await self.repository.list()
+        return (json.dumps([user_to_row(a_user)]).encode() for a_user in users)
+
+
+class JournaledAppointmentRepository(_Journaled, AppointmentRepository):
+    """Makes every save and delete on ``repository`` durable in ``journal``
+    before it is applied and returns; a ``save_many`` is one record, so it is
+    replayed whole or not at all, and a delete is a ``{"deleted": id}``
+    record. Call ``replay`` first to load what the journal holds."""
+
+    def __init__(self, repository: AppointmentRepository, journal: Journal) -> None:
+        super().__init__(journal)
+        self.repository = repository
+
+    async def replay(self) -> None:
+        saved: builtins.list[Appointment] = []
+        for record in self.journal.replay():
+            decoded = json.loads(record)
+            if isinstance(decoded, dict):
+                await self.repository.save_many(saved)
+                saved = []
+                with suppress(KeyError):
+                    await self.repository.delete(uuid_from_int(decoded["deleted"]))
+            else:
+                saved.extend(map(appointment_from_row, decoded))
+        await self.repository.save_many(saved)
+
+    async def get(self, id: UUID) -> Appointment:
+        return await self.repository.get(id)
+
+    async def save(self, appointment: Appointment) -> UUID:
+        await self._log(
+            [appointment_to_row(appointment)],
+            self._state,
+            lambda: self.repository.save(appointment),
+        )
+        return appointment.id
+
+    async def save_many(
+        self, appointments: Iterable[Appointment]
+    ) -> builtins.list[UUID]:
+        appointments = builtins.list(appointments)
+        await self._log(
+            [appointment_to_row(an_appointment) for an_appointment in appointments],
+            self._state,
+            lambda: self.repository.save_many(appointments),
+        )
+        return [an_appointment.id for an_appointment in appointments]
+
+    async def list(self) -> builtins.list[Appointment]:
+        return await self.repository.list()
+
+    async def delete(self, id: UUID) -> None:
+        await self.repository.get(id)
+        await self._log(
+            dict(deleted=id.int), self._state, lambda: self.repository.delete(id)
+        )
+
+    async def query(
+        self,
+        *,
+        therapist_id: UUID | None = None,
+        patient_id: UUID | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        after: AppointmentKey | None = None,
+        limit: int | None = None,
+    ) -> builtins.list[Appointment]:
+        return await self.repository.query(
+            therapist_id=therapist_id,
+            patient_id=patient_id,
+            start=start,
+            end=end,
+            after=after,
+            limit=limit,
+        )
+
+    async def find_overlapping(
+        self,
+        therapist_ids: Collection[UUID],
+        patient_ids: Collection[UUID],
+        start: datetime,
+        end: datetime,
+    ) -> builtins.list[Appointment]:
+        return await self.repository.find_overlapping(
+            therapist_ids, patient_ids, start, end
+        )
+
+    async def _state(self) -> Iterable[bytes]:
+        appointments = await self.repository.list()
+        return (
+            json.dumps([appointment_to_row(an_appointment)]).encode()
+            for an_appointment in appointments
+        )
+
+
+class JournaledSeriesRepository(_Journaled, SeriesRepository):
+    """Makes every save to ``repository`` durable in ``journal`` before it
+    is applied and returns. Call ``replay`` first to load what the journal
+    holds."""
+
+    def __init__(self, repository: SeriesRepository, journal: Journal) -> None:
+        super().__init__(journal)
+        self.repository = repository
+
+    async def replay(self) -> None:
+        for row in self._replayed():
+            await self.repository.save(series_from_row(row))
+
+    async def get(self, id: UUID) -> Series:
+        return await self.repository.get(id)
+
+    async def save(self, series: Series) -> UUID:
+        await self._log(
+            [series_to_row(series)], self._state, lambda: self.repository.save(series)
+        )
+        return series.id
+
+    async def list(self) -> builtins.list[Series]:
+        return await self.repository.list()
+
+    async def find(
+        self, therapist_ids: Collection[UUID], patient_ids: Collection[UUID]
+    ) -> builtins.list[Series]:
+        return await self.repository.find(therapist_ids, patient_ids)
+
+    async def _state(self) -> Iterable[bytes]:
+        series = await self.repository.list()
+        return (json.dumps([series_to_row(a_series)]).encode() for a_series in series)
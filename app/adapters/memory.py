@@ -0,0 +1,176 @@
+import builtins
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+from typing import Collection, Iterable
+from uuid import UUID
+
+from app.domain import (
+    Appointment,
+    AppointmentKey,
+    AppointmentRepository,
+    Series,
+    SeriesRepository,
+    User,
+    UserRepository,
+)
+from app.domain.intervals import IntervalIndex
+from app.exceptions import EmailAlreadyUsedError
+
+
+class InMemoryUserRepository(UserRepository):
+
+    def __init__(self) -> None:
+        self._users: dict[UUID, User] = {}
+        self._by_email: dict[str, UUID] = {}
+
+    async def get(self, id: UUID) -> User:
+        return self._users[id]
+
+    async def save(self, user: User) -> UUID:
+        email = User.normalize_email(user.email)
+        owner = self._by_email.get(email)
+        if owner is not None and owner != user.id:
+            raise EmailAlreadyUsedError
+
+        previous = self._users.get(user.id)
+        if previous is not None:
+            del self._by_email[User.normalize_email(previous.email)]
+        self._users[user.id] = user
+        self._by_email[email] = user.id
+        return user.id
+
+    async def list(self) -> list[User]:
+        return list(self._users.values())
+
+    async def get_by_email(self, email: str) -> User | None:
+        id = self._by_email.get(User.normalize_email(email))
+        return None if id is None else self._users[id]
+
+    async def save_many(self, users: Iterable[User]) -> builtins.list[UUID]:
+        """Save all of ``users`` or, if any email is taken, none of them."""
+        users = builtins.list(users)
+        owners: dict[str, UUID] = {}
+        for a_user in users:
+            email = User.normalize_email(a_user.email)
+            owner = owners.setdefault(email, self._by_email.get(email, a_user.id))
+            if owner != a_user.id:
+                raise EmailAlreadyUsedError
+        return [await self.save(a_user) for a_user in users]
+
+
+class InMemoryAppointmentRepository(AppointmentRepository):
+
+    def __init__(self) -> None:
+        self._appointments: dict[UUID, Appointment] = {}
+        self._by_start = IntervalIndex()
+        self._by_therapist: defaultdict[UUID, IntervalIndex] = defaultdict(
+            IntervalIndex
+        )
+        self._by_patient: defaultdict[UUID, IntervalIndex] = defaultdict(IntervalIndex)
+
+    async def get(self, id: UUID) -> Appointment:
+        return self._appointments[id]
+
+    async def save(self, appointment: Appointment) -> UUID:
+        previous = self._appointments.get(appointment.id)
+        if previous is not None:
+            self._by_start.discard(previous.id)
+            self._by_therapist[previous.therapist_id].discard(previous.id)
+            self._by_patient[previous.patient_id].discard(previous.id)
+
+        self._appointments[appointment.id] = appointment
+        start, end = appointment.start_at, appointment.end_at
+        self._by_start.add(appointment.id, start, end)
+        self._by_therapist[appointment.therapist_id].add(appointment.id, start, end)
+        self._by_patient[appointment.patient_id].add(appointment.id, start, end)
+        return appointment.id
+
+    async def list(self) -> list[Appointment]:
+        return list(self._appointments.values())
+
+    async def delete(self, id: UUID) -> None:
+        appointment = self._appointments.pop(id)
+        self._by_start.discard(id)
+        self._by_therapist[appointment.therapist_id].discard(id)
+        self._by_patient[appointment.patient_id].discard(id)
+
+    async def query(
+        self,
+        *,
+        therapist_id: UUID | None = None,
+        patient_id: UUID | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        after: AppointmentKey | None = None,
+        limit: int | None = None,
+    ) -> builtins.list[Appointment]:
+        candidates = [self._by_start]
+        if therapist_id is not None:
+            candidates.append(self._by_therapist.get(therapist_id, IntervalIndex()))
+        if patient_id is not None:
+            candidates.append(self._by_patient.get(patient_id, IntervalIndex()))
+        index = min(candidates, key=len)
+
+        appointments = (
+            self._appointments[id] for id in index.starting_between(start, end, after)
+        )
+        matches = (
+            an_appointment
+            for an_appointment in appointments
+            if (therapist_id is None or an_appointment.therapist_id == therapist_id)
+            and (patient_id is None or an_appointment.patient_id == patient_id)
+        )
+        return list(islice(matches, limit))
+
+    async def find_overlapping(
+        self,
+        therapist_ids: Collection[UUID],
+        patient_ids: Collection[UUID],
+        start: datetime,
+        end: datetime,
+    ) -> builtins.list[Appointment]:
+        indexes = [self._by_therapist.get(id) for id in therapist_ids]
+        indexes += [self._by_patient.get(id) for id in patient_ids]
+        ids: dict[UUID, None] = {}
+        for index in indexes:
+            if index is not None:
+                ids.update(dict.fromkeys(index.overlapping(start, end)))
+        return [self._appointments[id] for id in ids]
+
+
+class InMemorySeriesRepository(SeriesRepository):
+
+    def __init__(self) -> None:
+        self._series: dict[UUID, Series] = {}
+        self._by_person: defaultdict[UUID, set[UUID]] = defaultdict(set)
+
+    async def get(self, id: UUID) -> Series:
+        return self._series[id]
+
+    async def save(self, series: Series) -> UUID:
+        previous = self._series.get(series.id)
+        if previous is not None:
+            self._by_person[previous.therapist_id].discard(previous.id)
+            self._by_person[previous.patient_id].discard(previous.id)
+        self._series[series.id] = series
+        self._by_person[series.therapist_id].add(series.id)
+        self._by_person[series.patient_id].add(series.id)
+        return series.id
+
+    async def list(self) -> builtins.list[Series]:
+        return list(self._series.values())
+
+    async def find(
+        self, therapist_ids: Collection[UUID], patient_ids: Collection[UUID]
+    ) -> builtins.list[Series]:
+        ids: set[UUID] = set()
+        for id in {*therapist_ids, *patient_ids}:
+            ids |= self._by_person.get(id, set())
+        found = (self._series[id] for id in ids)
+        return [
+            a_series
+            for a_series in found
+            if a_series.therapist_id in therapist_ids
+            or a_series.patient_id in patient_ids
+        ]
@@ -0,0 +1,223 @@
+import asyncio
+import builtins
+import hashlib
+from bisect import bisect, insort
+from collections import defaultdict
+from datetime import datetime
+from heapq import heapify, heappop, heapreplace, merge
+from itertools import islice
+from typing import AsyncIterator, Collection, Iterable, Mapping
+from uuid import UUID
+
+from app.domain import Appointment, AppointmentKey, AppointmentRepository
+
+
+def _point(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest())
+
+
+class ShardedAppointmentRepository(AppointmentRepository):
+    """Spreads appointments over ``shards`` by therapist.
+
+    Therapists are placed on a consistent hash ring where each shard owns
+    ``points`` positions, so adding a shard only moves the therapists landing
+    on its positions, about 1/N of them, and leaves the others where they are.
+    Queries and overlap checks for given therapists go to their shards only;
+    those by patient or unfiltered run on every shard at once and the results
+    are merged in ``(start_at, id)`` order.
+
+    The shard of every appointment is also kept by id, so ``get`` and
+    ``delete`` go straight to it and an appointment moved to a therapist on
+    another shard leaves the old one. Shards must start empty, or be indexed
+    with ``reindex`` before use.
+    """
+
+    def __init__(
+        self, shards: Mapping[str, AppointmentRepository], points: int = 128
+    ) -> None:
+        self.points = points
+        self.shards: dict[str, AppointmentRepository] = {}
+        self._ring: builtins.list[tuple[int, str]] = []
+        self._shard_of_id: dict[int, AppointmentRepository] = {}
+        for name, a_shard in shards.items():
+            self._place(name, a_shard)
+
+    def shard_for(self, therapist_id: UUID) -> AppointmentRepository:
+        position = bisect(self._ring, (_point(therapist_id.bytes), ""))
+        return self.shards[self._ring[position % len(self._ring)][1]]
+
+    async def reindex(self) -> None:
+        """Record the shard of every appointment the shards already hold."""
+        stored = await asyncio.gather(*(x.list() for x in self.shards.values()))
+        for a_shard, appointments in zip(self.shards.values(), stored):
+            for an_appointment in appointments:
+                self._shard_of_id[an_appointment.id.int] = a_shard
+
+    async def add_shard(self, name: str, shard: AppointmentRepository) -> int:
+        """Put ``shard`` on the ring and move it the appointments of the
+        therapists it now owns; returns how many were moved.
+
+        Writes to the moving therapists must wait until this returns.
+        """
+        others = builtins.list(self.shards.values())
+        self._place(name, shard)
+        moved: builtins.list[Appointment] = []
+        for stored in await asyncio.gather(*(x.list() for x in others)):
+            moved.extend(
+                an_appointment
+                for an_appointment in stored
+                if self.shard_for(an_appointment.therapist_id) is shard
+            )
+        await self.save_many(moved)
+        return len(moved)
+
+    def _place(self, name: str, shard: AppointmentRepository) -> None:
+        if name in self.shards:
+            raise ValueError(f"There is already a shard named {name!r}")
+        self.shards[name] = shard
+        for i in range(self.points):
+            insort(self._ring, (_point(f"{name}#{i}".encode()), name))
+
+    async def get(self, id: UUID) -> Appointment:
+        shard = self._shard_of_id.get(id.int)
+        if shard is None:
+            raise KeyError(id)
+        return await shard.get(id)
+
+    async def save(self, appointment: Appointment) -> UUID:
+        await self.save_many([appointment])
+        return appointment.id
+
+    async def save_many(
+        self, appointments: Iterable[Appointment]
+    ) -> builtins.list[UUID]:
+        appointments = builtins.list(appointments)
+        by_shard: defaultdict[AppointmentRepository, builtins.list[Appointment]] = (
+            defaultdict(list)
+        )
+        moved: builtins.list[tuple[AppointmentRepository, UUID]] = []
+        for an_appointment in appointments:
+            shard = self.shard_for(an_appointment.therapist_id)
+            by_shard[shard].append(an_appointment)
+            previous = self._shard_of_id.get(an_appointment.id.int)
+            if previous is not None and previous is not shard:
+                moved.append((previous, an_appointment.id))
+        await asyncio.gather(
+            *(a_shard.save_many(saved) for a_shard, saved in by_shard.items())
+        )
+        await asyncio.gather(*(a_shard.delete(id) for a_shard, id in moved))
+        for a_shard, saved in by_shard.items():
+            for an_appointment in saved:
+                self._shard_of_id[an_appointment.id.int] = a_shard
+        return [an_appointment.id for an_appointment in appointments]
+
+    async def list(self) -> builtins.list[Appointment]:
+        stored = await asyncio.gather(*(x.list() for x in self.shards.values()))
+        return [an_appointment for some in stored for an_appointment in some]
+
+    async def delete(self, id: UUID) -> None:
+        shard = self._shard_of_id.get(id.int)
+        if shard is None:
+            raise KeyError(id)
+        await shard.delete(id)
+        del self._shard_of_id[id.int]
+
+    async def query(
+        self,
+        *,
+        therapist_id: UUID | None = None,
+        patient_id: UUID | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        after: AppointmentKey | None = None,
+        limit: int | None = None,
+    ) -> builtins.list[Appointment]:
+        shards = (
+            [self.shard_for(therapist_id)]
+            if therapist_id is not None
+            else self.shards.values()
+        )
+        pages = await asyncio.gather(
+            *(
+                a_shard.query(
+                    therapist_id=therapist_id,
+                    patient_id=patient_id,
+                    start=start,
+                    end=end,
+                    after=after,
+                    limit=limit,
+                )
+                for a_shard in shards
+            )
+        )
+        if len(pages) == 1:
+            return pages[0]
+        return builtins.list(
+            islice(merge(*pages, key=lambda appointment: appointment.key), limit)
+        )
+
+    async def stream(
+        self,
+        *,
+        therapist_id: UUID | None = None,
+        patient_id: UUID | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[Appointment]:
+        """Merge the streams of the shards, each paging on its own, so at most
+        one page per shard is held at a time."""
+        shards = (
+            [self.shard_for(therapist_id)]
+            if therapist_id is not None
+            else builtins.list(self.shards.values())
+        )
+        streams = [
+            a_shard.stream(
+                therapist_id=therapist_id,
+                patient_id=patient_id,
+                start=start,
+                end=end,
+                batch_size=batch_size,
+            )
+            for a_shard in shards
+        ]
+        firsts = await asyncio.gather(*(anext(x, None) for x in streams))
+        heap = [
+            (an_appointment.key, position, an_appointment)
+            for position, an_appointment in enumerate(firsts)
+            if an_appointment is not None
+        ]
+        heapify(heap)
+        while heap:
+            _, position, an_appointment = heap[0]
+            yield an_appointment
+            following = await anext(streams[position], None)
+            if following is None:
+                heappop(heap)
+            else:
+                heapreplace(heap, (following.key, position, following))
+
+    async def find_overlapping(
+        self,
+        therapist_ids: Collection[UUID],
+        patient_ids: Collection[UUID],
+        start: datetime,
+        end: datetime,
+    ) -> builtins.list[Appointment]:
+        """Ask the shards of ``therapist_ids`` for their therapists' only, and
+        every shard when there are patients to check too."""
+        therapists_by_shard: dict[AppointmentRepository, set[UUID]] = (
+            {a_shard: set() for a_shard in self.shards.values()} if patient_ids else {}
+        )
+        for a_therapist in therapist_ids:
+            therapists_by_shard.setdefault(self.shard_for(a_therapist), set()).add(
+                a_therapist
+            )
+        found = await asyncio.gather(
+            *(
+                a_shard.find_overlapping(therapists, patient_ids, start, end)
+                for a_shard, therapists in therapists_by_shard.items()
+            )
+        )
+        return [an_appointment for some in found for an_appointment in some]
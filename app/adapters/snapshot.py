@@ -0,0 +1,120 @@
+"""Binary snapshots of the in-memory stores, loaded through ``mmap``.
+
+A snapshot file is laid out as::
+
+    MAGIC | header length (u64, little endian) | JSON header | columns
+
+The header holds the row count, the dtype and offset of every appointment
+column, the interned titles, and the users and series, which are few. Each
+column is raw array bytes at a 64-byte aligned offset from the end of the
+header, so loading maps the file copy-on-write and views the columns in
+place: pages are only read from disk when touched and a write to a loaded
+row never reaches the file.
+
+Needs the ``columnar`` extra (``numpy``).
+"""
+
+import asyncio
+import json
+import mmap
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.exceptions import InvalidSnapshotError
+
+from .columnar import ColumnarAppointmentRepository
+from .encoding import series_from_row, series_to_row, user_from_row, user_to_row
+from .memory import InMemorySeriesRepository, InMemoryUserRepository
+
+MAGIC = b"KINSNAP\x01"
+ALIGNMENT = 64
+
+
+@dataclass
+class Snapshot:
+
+    appointments: ColumnarAppointmentRepository = field(
+        default_factory=ColumnarAppointmentRepository
+    )
+    users: InMemoryUserRepository = field(default_factory=InMemoryUserRepository)
+    series: InMemorySeriesRepository = field(default_factory=InMemorySeriesRepository)
+
+
+async def dump(path: str | Path, snapshot: Snapshot) -> None:
+    """Write ``snapshot`` to ``path`` atomically: to a temporary file first,
+    synced, then renamed over ``path``."""
+    header = dict(
+        rows=len(snapshot.appointments),
+        titles=snapshot.appointments.titles,
+        users=[user_to_row(a_user) for a_user in await snapshot.users.list()],
+        series=[series_to_row(a_series) for a_series in await snapshot.series.list()],
+    )
+    await asyncio.to_thread(_write, Path(path), header, snapshot.appointments.columns)
+
+
+async def load(path: str | Path) -> Snapshot:
+    columns, header = await asyncio.to_thread(_read, Path(path))
+    snapshot = Snapshot(
+        ColumnarAppointmentRepository.from_columns(columns, header["titles"])
+    )
+    for row in header["users"]:
+        await snapshot.users.save(user_from_row(row))
+    for row in header["series"]:
+        await snapshot.series.save(series_from_row(row))
+    return snapshot
+
+
+def _write(
+    path: Path, header: dict[str, Any], columns: dict[str, NDArray[Any]]
+) -> None:
+    offset = 0
+    offsets: dict[str, int] = {}
+    for name, column in columns.items():
+        offsets[name] = offset
+        offset = _aligned(offset + column.nbytes)
+    layout = {
+        name: dict(dtype=column.dtype.str, offset=offsets[name])
+        for name, column in columns.items()
+    }
+    encoded = json.dumps(header | dict(columns=layout)).encode()
+
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "wb") as file:
+        file.write(MAGIC + len(encoded).to_bytes(8, "little") + encoded)
+        base = _aligned(file.tell())
+        for name, column in columns.items():
+            file.write(bytes(base + offsets[name] - file.tell()))
+            file.write(np.ascontiguousarray(column).data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def _read(path: Path) -> tuple[dict[str, NDArray[Any]], dict[str, Any]]:
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    if mapped[: len(MAGIC)] != MAGIC:
+        raise InvalidSnapshotError
+    length = int.from_bytes(mapped[len(MAGIC) : len(MAGIC) + 8], "little")
+    start = len(MAGIC) + 8
+    header = json.loads(mapped[start : start + length])
+    base = _aligned(start + length)
+    columns = {
+        name: np.frombuffer(
+            mapped,
+            dtype=np.dtype(spec["dtype"]),
+            count=header["rows"],
+            offset=base + spec["offset"],
+        )
+        for name, spec in header.pop("columns").items()
+    }
+    return columns, header
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,491 @@
+import asyncio
+import builtins
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Collection, Iterable
+from uuid import UUID
+
+from app.domain import (
+    Appointment,
+    AppointmentKey,
+    AppointmentRepository,
+    Frequency,
+    Series,
+    SeriesRepository,
+    User,
+    UserRepository,
+)
+from app.exceptions import EmailAlreadyUsedError
+
+from .encoding import MICROSECOND, from_timestamp, to_timestamp, uuid_from_bytes
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id BLOB PRIMARY KEY,
+    firstname TEXT NOT NULL,
+    lastname TEXT NOT NULL,
+    email TEXT NOT NULL,
+    email_key TEXT NOT NULL,
+    password_hash BLOB NOT NULL,
+    salt TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS users_email ON users (email_key);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    id BLOB PRIMARY KEY,
+    title TEXT NOT NULL,
+    start_at INTEGER NOT NULL,
+    end_at INTEGER NOT NULL,
+    patient_id BLOB NOT NULL,
+    therapist_id BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS appointments_therapist
+    ON appointments (therapist_id, start_at);
+CREATE INDEX IF NOT EXISTS appointments_patient
+    ON appointments (patient_id, start_at);
+CREATE INDEX IF NOT EXISTS appointments_start ON appointments (start_at);
+CREATE INDEX IF NOT EXISTS appointments_duration
+    ON appointments (end_at - start_at);
+
+CREATE TABLE IF NOT EXISTS series (
+    id BLOB PRIMARY KEY,
+    title TEXT NOT NULL,
+    start_at INTEGER NOT NULL,
+    duration INTEGER NOT NULL,
+    patient_id BLOB NOT NULL,
+    therapist_id BLOB NOT NULL,
+    frequency TEXT NOT NULL,
+    interval INTEGER NOT NULL,
+    until INTEGER,
+    count INTEGER,
+    exceptions TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS series_therapist ON series (therapist_id);
+CREATE INDEX IF NOT EXISTS series_patient ON series (patient_id);
+"""
+
+
+class SQLiteDatabase:
+    """A SQLite file in WAL mode shared by the repositories below.
+
+    WAL lets readers run while a write is in progress, so reads take one of
+    ``readers`` pooled connections while writes are serialized on a single
+    writer connection. Every call runs in a worker thread. Statements are
+    fixed strings, so each connection's statement cache keeps them prepared.
+    """
+
+    def __init__(self, path: str | Path, readers: int = 4) -> None:
+        self.path = str(path)
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        self._write_lock = asyncio.Lock()
+        self._readers: asyncio.Queue[sqlite3.Connection] = asyncio.Queue()
+        for _ in range(readers):
+            self._readers.put_nowait(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=256,
+        )
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+
+    async def read[T](self, function: Callable[[sqlite3.Connection], T]) -> T:
+        connection = await self._readers.get()
+        try:
+            return await asyncio.to_thread(function, connection)
+        finally:
+            self._readers.put_nowait(connection)
+
+    async def write[T](self, function: Callable[[sqlite3.Connection], T]) -> T:
+        async with self._write_lock:
+            return await asyncio.to_thread(self._transaction, function)
+
+    def _transaction[T](self, function: Callable[[sqlite3.Connection], T]) -> T:
+        self._writer.execute("BEGIN IMMEDIATE")
+        try:
+            result = function(self._writer)
+        except BaseException:
+            self._writer.execute("ROLLBACK")
+            raise
+        self._writer.execute("COMMIT")
+        return result
+
+    def close(self) -> None:
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+        self._writer.close()
+
+
+class SQLiteUserRepository(UserRepository):
+    COLUMNS = "id, firstname, lastname, email, password_hash, salt"
+    SELECT_BY_ID = f"SELECT {COLUMNS} FROM users WHERE id = ?"
+    SELECT_BY_EMAIL = f"SELECT {COLUMNS} FROM users WHERE email_key = ?"
+    SELECT_ALL = f"SELECT {COLUMNS} FROM users"
+    UPSERT = (
+        "INSERT INTO users (id, firstname, lastname, email, email_key,"
+        " password_hash, salt) VALUES (?, ?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT (id) DO UPDATE SET firstname = excluded.firstname,"
+        " lastname = excluded.lastname, email = excluded.email,"
+        " email_key = excluded.email_key, password_hash = excluded.password_hash,"
+        " salt = excluded.salt"
+    )
+
+    def __init__(self, database: SQLiteDatabase) -> None:
+        self.database = database
+
+    async def get(self, id: UUID) -> User:
+        row = await self.database.read(
+            lambda connection: connection.execute(
+                self.SELECT_BY_ID, (id.bytes,)
+            ).fetchone()
+        )
+        if row is None:
+            raise KeyError(id)
+        return self._to_user(row)
+
+    async def save(self, user: User) -> UUID:
+        parameters = (
+            user.id.bytes,
+            user.firstname,
+            user.lastname,
+            user.email,
+            User.normalize_email(user.email),
+            user.password_hash,
+            user.salt,
+        )
+        try:
+            await self.database.write(
+                lambda connection: connection.execute(self.UPSERT, parameters)
+            )
+        except sqlite3.IntegrityError as error:
+            raise EmailAlreadyUsedError from error
+        return user.id
+
+    async def save_many(self, users: Iterable[User]) -> builtins.list[UUID]:
+        """Save all of ``users`` in one transaction or, if any email is taken,
+        none of them."""
+        users = builtins.list(users)
+        rows = [
+            (
+                a_user.id.bytes,
+                a_user.firstname,
+                a_user.lastname,
+                a_user.email,
+                User.normalize_email(a_user.email),
+                a_user.password_hash,
+                a_user.salt,
+            )
+            for a_user in users
+        ]
+        try:
+            await self.database.write(
+                lambda connection: connection.executemany(self.UPSERT, rows)
+            )
+        except sqlite3.IntegrityError as error:
+            raise EmailAlreadyUsedError from error
+        return [a_user.id for a_user in users]
+
+    async def list(self) -> list[User]:
+        rows = await self.database.read(
+            lambda connection: connection.execute(self.SELECT_ALL).fetchall()
+        )
+        return [self._to_user(row) for row in rows]
+
+    async def get_by_email(self, email: str) -> User | None:
+        key = User.normalize_email(email)
+        row = await self.database.read(
+            lambda connection: connection.execute(
+                self.SELECT_BY_EMAIL, (key,)
+            ).fetchone()
+        )
+        return None if row is None else self._to_user(row)
+
+    @staticmethod
+    def _to_user(row: tuple[Any, ...]) -> User:
+        id, firstname, lastname, email, password_hash, salt = row
+        return User.hydrate(
+            id=uuid_from_bytes(id),
+            firstname=firstname,
+            lastname=lastname,
+            email=email,
+            password_hash=password_hash,
+            salt=salt,
+        )
+
+
+class SQLiteAppointmentRepository(AppointmentRepository):
+    COLUMNS = "id, title, start_at, end_at, patient_id, therapist_id"
+    SELECT_BY_ID = f"SELECT {COLUMNS} FROM appointments WHERE id = ?"
+    DELETE = "DELETE FROM appointments WHERE id = ?"
+    UPSERT = (
+        "INSERT INTO appointments (id, title, start_at, end_at, patient_id,"
+        " therapist_id) VALUES (?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT (id) DO UPDATE SET title = excluded.title,"
+        " start_at = excluded.start_at, end_at = excluded.end_at,"
+        " patient_id = excluded.patient_id, therapist_id = excluded.therapist_id"
+    )
+    LONGEST = "SELECT MAX(end_at - start_at) FROM appointments"
+    SELECT_OVERLAPPING = (
+        f"SELECT {COLUMNS} FROM appointments WHERE {{column}} IN ({{ids}})"
+        " AND start_at BETWEEN ? AND ? AND end_at >= ?"
+    )
+
+    def __init__(self, database: SQLiteDatabase) -> None:
+        self.database = database
+
+    async def get(self, id: UUID) -> Appointment:
+        row = await self.database.read(
+            lambda connection: connection.execute(
+                self.SELECT_BY_ID, (id.bytes,)
+            ).fetchone()
+        )
+        if row is None:
+            raise KeyError(id)
+        return self._to_appointment(row)
+
+    async def save(self, appointment: Appointment) -> UUID:
+        parameters = self._to_row(appointment)
+        await self.database.write(
+            lambda connection: connection.execute(self.UPSERT, parameters)
+        )
+        return appointment.id
+
+    async def save_many(
+        self, appointments: Iterable[Appointment]
+    ) -> builtins.list[UUID]:
+        appointments = builtins.list(appointments)
+        rows = [self._to_row(an_appointment) for an_appointment in appointments]
+        await self.database.write(
+            lambda connection: connection.executemany(self.UPSERT, rows)
+        )
+        return [an_appointment.id for an_appointment in appointments]
+
+    async def list(self) -> builtins.list[Appointment]:
+        return await self.query()
+
+    async def delete(self, id: UUID) -> None:
+        deleted = await self.database.write(
+            lambda connection: connection.execute(self.DELETE, (id.bytes,)).rowcount
+        )
+        if not deleted:
+            raise KeyError(id)
+
+    async def query(
+        self,
+        *,
+        therapist_id: UUID | None = None,
+        patient_id: UUID | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        after: AppointmentKey | None = None,
+        limit: int | None = None,
+    ) -> builtins.list[Appointment]:
+        clauses: builtins.list[str] = []
+        parameters: builtins.list[bytes | int] = []
+        if therapist_id is not None:
+            clauses.append("therapist_id = ?")
+            parameters.append(therapist_id.bytes)
+        if patient_id is not None:
+            clauses.append("patient_id = ?")
+            parameters.append(patient_id.bytes)
+        if start is not None:
+            clauses.append("start_at >= ?")
+            parameters.append(to_timestamp(start))
+        if end is not None:
+            clauses.append("start_at < ?")
+            parameters.append(to_timestamp(end))
+        if after is not None:
+            clauses.append("(start_at, id) > (?, ?)")
+            parameters.extend((to_timestamp(after[0]), after[1].bytes))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        statement = f"SELECT {self.COLUMNS} FROM appointments{where}"
+        statement += " ORDER BY start_at, id"
+        if limit is not None:
+            statement += " LIMIT ?"
+            parameters.append(limit)
+
+        rows = await self.database.read(
+            lambda connection: connection.execute(statement, parameters).fetchall()
+        )
+        return [self._to_appointment(row) for row in rows]
+
+    async def find_overlapping(
+        self,
+        therapist_ids: Collection[UUID],
+        patient_ids: Collection[UUID],
+        start: datetime,
+        end: datetime,
+    ) -> builtins.list[Appointment]:
+        groups = [
+            (column, [id.bytes for id in some_ids])
+            for column, some_ids in (
+                ("therapist_id", therapist_ids),
+                ("patient_id", patient_ids),
+            )
+            if some_ids
+        ]
+        if not groups:
+            return []
+        statement = " UNION ".join(
+            self.SELECT_OVERLAPPING.format(column=column, ids=", ".join("?" * len(ids)))
+            for column, ids in groups
+        )
+
+        def select(connection: sqlite3.Connection) -> builtins.list[Any]:
+            longest = connection.execute(self.LONGEST).fetchone()[0] or 0
+            window = (
+                to_timestamp(start) - longest,
+                to_timestamp(end),
+                to_timestamp(start),
+            )
+            parameters = [value for _, ids in groups for value in (*ids, *window)]
+            return connection.execute(statement, parameters).fetchall()
+
+        rows = await self.database.read(select)
+        return [self._to_appointment(row) for row in rows]
+
+    @staticmethod
+    def _to_row(appointment: Appointment) -> tuple[bytes | str | int, ...]:
+        return (
+            appointment.id.bytes,
+            appointment.title,
+            to_timestamp(appointment.start_at),
+            to_timestamp(appointment.end_at),
+            appointment.patient_id.bytes,
+            appointment.therapist_id.bytes,
+        )
+
+    @staticmethod
+    def _to_appointment(row: tuple[Any, ...]) -> Appointment:
+        id, title, start_at, end_at, patient_id, therapist_id = row
+        return Appointment.hydrate(
+            id=uuid_from_bytes(id),
+            title=title,
+            start_at=from_timestamp(start_at),
+            duration=(end_at - start_at) * MICROSECOND,
+            patient_id=uuid_from_bytes(patient_id),
+            therapist_id=uuid_from_bytes(therapist_id),
+        )
+
+
+class SQLiteSeriesRepository(SeriesRepository):
+    COLUMNS = (
+        "id, title, start_at, duration, patient_id, therapist_id, frequency,"
+        " interval, until, count, exceptions"
+    )
+    UPSERT = (
+        f"INSERT INTO series ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        " ON CONFLICT (id) DO UPDATE SET title = excluded.title,"
+        " start_at = excluded.start_at, duration = excluded.duration,"
+        " patient_id = excluded.patient_id, therapist_id = excluded.therapist_id,"
+        " frequency = excluded.frequency, interval = excluded.interval,"
+        " until = excluded.until, count = excluded.count,"
+        " exceptions = excluded.exceptions"
+    )
+    SELECT_BY_PERSON = f"SELECT {COLUMNS} FROM series WHERE {{column}} IN ({{ids}})"
+
+    def __init__(self, database: SQLiteDatabase) -> None:
+        self.database = database
+
+    async def get(self, id: UUID) -> Series:
+        row = await self.database.read(
+            lambda connection: connection.execute(
+                f"SELECT {self.COLUMNS} FROM series WHERE id = ?", (id.bytes,)
+            ).fetchone()
+        )
+        if row is None:
+            raise KeyError(id)
+        return self._to_series(row)
+
+    async def save(self, series: Series) -> UUID:
+        parameters = self._to_row(series)
+        await self.database.write(
+            lambda connection: connection.execute(self.UPSERT, parameters)
+        )
+        return series.id
+
+    async def list(self) -> builtins.list[Series]:
+        rows = await self.database.read(
+            lambda connection: connection.execute(
+                f"SELECT {self.COLUMNS} FROM series"
+            ).fetchall()
+        )
+        return [self._to_series(row) for row in rows]
+
+    async def find(
+        self, therapist_ids: Collection[UUID], patient_ids: Collection[UUID]
+    ) -> builtins.list[Series]:
+        groups = [
+            (column, [id.bytes for id in some_ids])
+            for column, some_ids in (
+                ("therapist_id", therapist_ids),
+                ("patient_id", patient_ids),
+            )
+            if some_ids
+        ]
+        if not groups:
+            return []
+        statement = " UNION ".join(
+            self.SELECT_BY_PERSON.format(column=column, ids=", ".join("?" * len(ids)))
+            for column, ids in groups
+        )
+        parameters = [value for _, ids in groups for value in ids]
+        rows = await self.database.read(
+            lambda connection: connection.execute(statement, parameters).fetchall()
+        )
+        return [self._to_series(row) for row in rows]
+
+    @staticmethod
+    def _to_row(series: Series) -> tuple[bytes | str | int | None, ...]:
+        return (
+            series.id.bytes,
+            series.title,
+            to_timestamp(series.start_at),
+            series.duration // MICROSECOND,
+            series.patient_id.bytes,
+            series.therapist_id.bytes,
+            series.frequency.value,
+            series.interval,
+            None if series.until is None else to_timestamp(series.until),
+            series.count,
+            json.dumps(
+                sorted(to_timestamp(an_exception) for an_exception in series.exceptions)
+            ),
+        )
+
+    @staticmethod
+    def _to_series(row: tuple[Any, ...]) -> Series:
+        (
+            id,
+            title,
+            start_at,
+            duration,
+            patient_id,
+            therapist_id,
+            frequency,
+            interval,
+            until,
+            count,
+            exceptions,
+        ) = row
+        return Series.hydrate(
+            id=uuid_from_bytes(id),
+            title=title,
+            start_at=from_timestamp(start_at),
+            duration=duration * MICROSECOND,
+            patient_id=uuid_from_bytes(patient_id),
+            therapist_id=uuid_from_bytes(therapist_id),
+            frequency=Frequency(frequency),
+            interval=interval,
+            until=None if until is None else from_timestamp(until),
+            count=count,
+            exceptions=frozenset(map(from_timestamp, json.loads(exceptions))),
+        )
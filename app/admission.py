@@ -0,0 +1,103 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Hashable
+
+from app.exceptions import TooManyLoginAttemptsError
+from app.metrics import LOGIN_REJECTIONS
+
+
+class TokenBuckets:
+    """One token bucket per key, refilled at ``rate`` tokens per second up to
+    ``burst``, with the ``size`` most recently used keys remembered.
+
+    A forgotten key starts again from a full bucket, which is also where any
+    bucket left alone for ``burst / rate`` seconds would be, so evicting the
+    least recently used keys only ever forgives the quietest of them.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        size: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.size = size
+        self.clock = clock
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: Hashable) -> float:
+        """Take a token for ``key``: 0 if there was one, else how many seconds
+        until there will be, in which case nothing is taken."""
+        now = self.clock()
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens < 1:
+            wait = (1 - tokens) / self.rate
+        else:
+            tokens, wait = tokens - 1, 0.0
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.size:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def forget(self, key: Hashable) -> None:
+        self._buckets.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class LoginAdmission:
+    """Decides, before any password is hashed, whether a login may proceed.
+
+    Each attempt takes a token from its email's bucket and from its client's,
+    and at most ``max_in_flight`` attempts run at once. An attempt over any
+    limit raises ``TooManyLoginAttemptsError`` with the seconds to wait, so it
+    is turned away at once rather than queued behind the hashing threads.
+    """
+
+    def __init__(
+        self,
+        per_email: TokenBuckets | None = None,
+        per_client: TokenBuckets | None = None,
+        max_in_flight: int | None = None,
+    ) -> None:
+        self.per_email = (
+            per_email if per_email is not None else TokenBuckets(rate=1 / 60, burst=5)
+        )
+        self.per_client = (
+            per_client if per_client is not None else TokenBuckets(rate=1, burst=20)
+        )
+        self.max_in_flight = max_in_flight or 4 * (os.cpu_count() or 1)
+        self.in_flight = 0
+
+    @asynccontextmanager
+    async def admit(self, email: str, client: str | None) -> AsyncIterator[None]:
+        if self.in_flight >= self.max_in_flight:
+            self._reject("busy", 1)
+        if client is not None and (wait := self.per_client.take(client)):
+            self._reject("client", wait)
+        if wait := self.per_email.take(email):
+            self._reject("email", wait)
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def succeeded(self, email: str) -> None:
+        """Forgive the earlier attempts on ``email`` once its owner got in."""
+        self.per_email.forget(email)
+
+    @staticmethod
+    def _reject(reason: str, wait: float) -> None:
+        LOGIN_REJECTIONS.inc(reason)
+        raise TooManyLoginAttemptsError(retry_after=math.ceil(wait))
@@ -0,0 +1,94 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+from joserfc import jwk, jwt
+from joserfc.errors import JoseError
+
+from app.exceptions import InvalidTokenError
+from app.metrics import JWT_SECONDS
+
+
+class KeyRing:
+    """Keys used to sign and verify access tokens, selected by ``kid``.
+
+    The first key signs new tokens; the others are only accepted for
+    verification, so a key can be rotated without logging everybody out.
+    """
+
+    ENVIRONMENT_VARIABLE = "KIN_JWT_KEYS"
+
+    def __init__(self, keys: dict[str, str]) -> None:
+        if not keys:
+            raise ValueError("A key ring needs at least one key")
+        octet_keys = [
+            jwk.OctKey.import_key(secret, {"kid": kid}) for kid, secret in keys.items()
+        ]
+        self.signing_key: jwk.OctKey = octet_keys[0]
+        self.keys = jwk.KeySet(list(octet_keys))
+
+    @classmethod
+    def from_environment(cls) -> "KeyRing":
+        """Read ``kid=secret`` pairs, comma separated, from ``KIN_JWT_KEYS``.
+
+        Without it an ephemeral key is generated: tokens then stop verifying
+        when the process restarts.
+        """
+        value = os.environ.get(cls.ENVIRONMENT_VARIABLE)
+        if not value:
+            return cls({"ephemeral": os.urandom(32).hex()})
+        pairs = (item.split("=", 1) for item in value.split(",") if item.strip())
+        return cls({kid.strip(): secret.strip() for kid, secret in pairs})
+
+
+class TokenVerifier:
+    """Verifies bearer tokens, remembering the claims of recent ones.
+
+    A cached entry is reused until ``ttl`` seconds have passed or the token's
+    own ``exp`` is reached, whichever comes first, and at most ``cache_size``
+    tokens are kept, least recently used first out.
+    """
+
+    def __init__(
+        self,
+        keyring: KeyRing,
+        algorithms: list[str] | None = None,
+        cache_size: int = 1024,
+        ttl: float = 60.0,
+        leeway: int = 0,
+    ) -> None:
+        self.keyring = keyring
+        self.algorithms = algorithms or ["HS256"]
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.leeway = leeway
+        self._cache: OrderedDict[str, tuple[dict[str, Any], float]] = OrderedDict()
+
+    def verify(self, token: str) -> dict[str, Any]:
+        now = time.time()
+        cached = self._cache.get(token)
+        if cached is not None:
+            claims, valid_until = cached
+            if now < valid_until:
+                self._cache.move_to_end(token)
+                return claims
+            del self._cache[token]
+
+        try:
+            with JWT_SECONDS.time("decode"):
+                decoded = jwt.decode(
+                    token, self.keyring.keys, algorithms=self.algorithms
+                )
+                jwt.JWTClaimsRegistry(leeway=self.leeway).validate(decoded.claims)
+        except (JoseError, ValueError) as error:
+            raise InvalidTokenError(str(error) or None) from error
+
+        claims = decoded.claims
+        valid_until = now + self.ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            valid_until = min(valid_until, claims["exp"] + self.leeway)
+        self._cache[token] = (claims, valid_until)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return claims
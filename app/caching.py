@@ -0,0 +1,80 @@
+import secrets
+from collections import OrderedDict
+from typing import Hashable, Iterable
+from uuid import UUID
+
+from app.domain import Appointment, Series
+from app.metrics import AGENDA_CACHE_LOOKUPS
+
+type Stamp = tuple[int, ...]
+
+
+class AgendaCache:
+    """Results of recent agenda queries, checked against version counters.
+
+    Every therapist and patient has a version, and so does the whole agenda;
+    ``bump`` increments them for saved appointments and series. A result is
+    stored with the versions it was read under, its stamp, and is only served
+    while they still match: a query for a therapist depends on that
+    therapist's version, one for a patient on the patient's, an unfiltered
+    one on the agenda's.
+    At most ``size`` results are kept, least recently used first out.
+
+    Stamps must be taken before reading and versions bumped after writing,
+    so a read racing a write is stored under a stamp that is already stale.
+
+    Versions start again from zero with every cache, so ``etag`` prefixes
+    them with ``epoch``, random per cache, to keep tags from one process
+    from matching another's.
+    """
+
+    def __init__(self, size: int = 4096) -> None:
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[Stamp, list[Appointment]]] = (
+            OrderedDict()
+        )
+        self._versions: dict[UUID, int] = {}
+        self._version = 0
+        self.epoch = secrets.token_hex(4)
+
+    def stamp(self, therapist_id: UUID | None, patient_id: UUID | None) -> Stamp:
+        if therapist_id is None and patient_id is None:
+            return (self._version,)
+        return tuple(
+            self._versions.get(id, 0) for id in (therapist_id, patient_id) if id
+        )
+
+    def etag(self, therapist_id: UUID | None, patient_id: UUID | None) -> str:
+        """An entity tag for the agenda ``stamp`` covers, changing with it."""
+        stamp = self.stamp(therapist_id, patient_id)
+        return f'"{self.epoch}-{".".join(map(str, stamp))}"'
+
+    def get(self, key: Hashable, stamp: Stamp) -> list[Appointment] | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            AGENDA_CACHE_LOOKUPS.inc("hit")
+            return list(entry[1])
+        self.misses += 1
+        AGENDA_CACHE_LOOKUPS.inc("miss")
+        return None
+
+    def put(self, key: Hashable, stamp: Stamp, appointments: list[Appointment]) -> None:
+        if self.size <= 0:
+            return
+        self._entries[key] = (stamp, list(appointments))
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def bump(self, appointments: Iterable[Appointment | Series]) -> None:
+        for an_appointment in appointments:
+            for id in (an_appointment.therapist_id, an_appointment.patient_id):
+                self._versions[id] = self._versions.get(id, 0) + 1
+        self._version += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,5 +1,26 @@
-from .appointments import Appointment
-from .ports import AppointmentRepository, UserRepository
+from .appointments import Appointment, AppointmentKey
+from .availability import TimeSlot
+from .bookings import BookingRequest, BookingResult, BookingStatus
+from .imports import ImportResult, ImportStatus, UserImportRow
+from .ports import AppointmentRepository, SeriesRepository, UserRepository
+from .recurrence import Frequency, Series, SeriesRequest
 from .users import User
 
-__all__ = ["Appointment", "User", "UserRepository", "AppointmentRepository"]
+__all__ = [
+    "Appointment",
+    "AppointmentKey",
+    "BookingRequest",
+    "BookingResult",
+    "BookingStatus",
+    "Frequency",
+    "ImportResult",
+    "ImportStatus",
+    "Series",
+    "SeriesRequest",
+    "TimeSlot",
+    "User",
+    "UserImportRow",
+    "UserRepository",
+    "AppointmentRepository",
+    "SeriesRepository",
+]
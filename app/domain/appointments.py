@@ -1,10 +1,18 @@
 from datetime import datetime, timedelta
+from uuid import UUID
 
 from pydantic import UUID4, Field, field_validator
 
-from app.exceptions import InvalidDateAndTimeError, OverlappingAppointmentError
+from app.exceptions import (
+    InvalidDateAndTimeError,
+    OverlappingAppointmentError,
+    TimeZoneGivenError,
+)
 
 from .base_model import KinModel
+from .intervals import overlaps
+
+type AppointmentKey = tuple[datetime, UUID]
 
 
 class Appointment(KinModel):
@@ -17,18 +25,29 @@ class Appointment(KinModel):
     @field_validator("start_at")
     @classmethod
     def validate_start_at(cls, value: datetime) -> datetime:
+        if value.tzinfo is not None:
+            raise TimeZoneGivenError
         if value < datetime.now():
             raise InvalidDateAndTimeError
         return value
 
+    @property
+    def end_at(self) -> datetime:
+        return self.start_at + self.duration
+
+    @property
+    def key(self) -> AppointmentKey:
+        """Position in the (start_at, id) order used for listings and cursors."""
+        return self.start_at, self.id
+
     def is_not_overlapping_with(self, another_appointment: "Appointment") -> None:
         if (
-            (
-                self.patient_id == another_appointment.patient_id
-                or self.therapist_id == another_appointment.therapist_id
-            )
-            and another_appointment.start_at
-            <= self.start_at
-            <= another_appointment.start_at + another_appointment.duration
+            self.patient_id == another_appointment.patient_id
+            or self.therapist_id == another_appointment.therapist_id
+        ) and overlaps(
+            self.start_at,
+            self.end_at,
+            another_appointment.start_at,
+            another_appointment.end_at,
         ):
             raise OverlappingAppointmentError
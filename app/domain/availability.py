@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator
+
+from pydantic import BaseModel
+
+from .intervals import overlaps
+
+
+class TimeSlot(BaseModel):
+
+    start_at: datetime
+    end_at: datetime
+
+
+def merge_intervals(
+    intervals: Iterable[tuple[datetime, datetime]],
+) -> list[tuple[datetime, datetime]]:
+    """Union of closed intervals, sorted; touching intervals are joined."""
+    merged: list[tuple[datetime, datetime]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_slots(
+    busy: Iterable[tuple[datetime, datetime]],
+    windows: Iterable[tuple[datetime, datetime]],
+    duration: timedelta,
+    step: timedelta,
+    not_before: datetime | None = None,
+) -> Iterator[TimeSlot]:
+    """Slots of ``duration`` laid every ``step`` from each window's start that
+    fit in the window and meet no busy interval.
+
+    "Meet" follows ``Appointment.is_not_overlapping_with``: intervals are
+    closed, so a slot starting exactly when a busy interval ends is not free.
+    ``windows`` must be sorted and disjoint.
+    """
+    merged = merge_intervals(busy)
+    position = 0
+    for window_start, window_end in windows:
+        start = window_start
+        while start + duration <= window_end:
+            end = start + duration
+            while position < len(merged) and merged[position][1] < start:
+                position += 1
+            if (not_before is None or start >= not_before) and not (
+                position < len(merged) and overlaps(start, end, *merged[position])
+            ):
+                yield TimeSlot(start_at=start, end_at=end)
+            start += step
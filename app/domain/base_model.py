@@ -1,5 +1,24 @@
+from typing import Any, Self
+
 from pydantic import UUID4, BaseModel
 
 
 class KinModel(BaseModel):
     id: UUID4
+
+    @classmethod
+    def hydrate(cls, **fields: Any) -> Self:
+        """Rebuild a model a repository stored earlier, without validating it.
+
+        Every field must be given, already with its final type: neither
+        parsing, defaults nor business rules apply, so an appointment that has
+        since taken place can be loaded again. New models go through the
+        regular constructor. This is what ``model_construct`` does, minus the
+        default handling that makes it slower than validating.
+        """
+        model = cls.__new__(cls)
+        object.__setattr__(model, "__dict__", fields)
+        object.__setattr__(model, "__pydantic_fields_set__", set(fields))
+        object.__setattr__(model, "__pydantic_extra__", None)
+        object.__setattr__(model, "__pydantic_private__", None)
+        return model
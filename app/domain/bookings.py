@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+from enum import StrEnum
+
+from pydantic import UUID4, BaseModel, Field
+
+MAX_BOOKING_DURATION = timedelta(days=1)
+
+
+class BookingRequest(BaseModel):
+
+    title: str
+    start_at: datetime
+    duration: timedelta = Field(
+        default_factory=lambda: timedelta(minutes=30),
+        gt=timedelta(0),
+        le=MAX_BOOKING_DURATION,
+    )
+    patient_id: UUID4
+    therapist_id: UUID4
+
+
+class BookingStatus(StrEnum):
+
+    ACCEPTED = "accepted"
+    CONFLICT = "conflict"
+    INVALID = "invalid"
+
+
+class BookingResult(BaseModel):
+
+    status: BookingStatus
+    appointment_id: UUID4 | None = None
+    conflicting_id: UUID4 | None = None
+    detail: str | None = None
@@ -0,0 +1,26 @@
+from enum import StrEnum
+
+from pydantic import UUID4, BaseModel, EmailStr
+
+
+class UserImportRow(BaseModel):
+
+    firstname: str
+    lastname: str
+    email: EmailStr
+    password: str
+
+
+class ImportStatus(StrEnum):
+
+    CREATED = "created"
+    DUPLICATE = "duplicate"
+    INVALID = "invalid"
+
+
+class ImportResult(BaseModel):
+
+    row: int
+    status: ImportStatus
+    user_id: UUID4 | None = None
+    detail: str | None = None
@@ -0,0 +1,75 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from typing import Iterator
+from uuid import UUID
+
+
+def overlaps(
+    start: datetime, end: datetime, other_start: datetime, other_end: datetime
+) -> bool:
+    """Closed-interval intersection: touching bounds count as an overlap."""
+    return start <= other_end and other_start <= end
+
+
+class IntervalIndex:
+    """Intervals sorted by start time, searchable by overlap.
+
+    A lookup bisects on start times, widened by the longest interval ever
+    stored, so it only visits the entries that can reach the queried window.
+    """
+
+    def __init__(self) -> None:
+        self._starts: list[tuple[datetime, UUID]] = []
+        self._intervals: dict[UUID, tuple[datetime, datetime]] = {}
+        self._longest = timedelta(0)
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def __contains__(self, id: UUID) -> bool:
+        return id in self._intervals
+
+    def add(self, id: UUID, start: datetime, end: datetime) -> None:
+        self.discard(id)
+        insort(self._starts, (start, id))
+        self._intervals[id] = (start, end)
+        self._longest = max(self._longest, end - start)
+
+    def discard(self, id: UUID) -> None:
+        interval = self._intervals.pop(id, None)
+        if interval is None:
+            return
+        position = bisect_left(self._starts, (interval[0], id))
+        del self._starts[position]
+
+    def starting_between(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        after: tuple[datetime, UUID] | None = None,
+    ) -> Iterator[UUID]:
+        """Ids whose interval starts in [start, end), in (start, id) order.
+
+        ``after`` skips every entry up to and including that (start, id) pair.
+        """
+        low = 0 if start is None else bisect_left(self._starts, start, key=_start_of)
+        if after is not None:
+            low = max(low, bisect_right(self._starts, after))
+        high = (
+            len(self._starts)
+            if end is None
+            else bisect_left(self._starts, end, key=_start_of)
+        )
+        for position in range(low, high):
+            yield self._starts[position][1]
+
+    def overlapping(self, start: datetime, end: datetime) -> Iterator[UUID]:
+        low = bisect_left(self._starts, start - self._longest, key=_start_of)
+        high = bisect_right(self._starts, end, key=_start_of)
+        for other_start, id in self._starts[low:high]:
+            if overlaps(start, end, other_start, self._intervals[id][1]):
+                yield id
+
+
+def _start_of(entry: tuple[datetime, UUID]) -> datetime:
+    return entry[0]
@@ -1,7 +1,11 @@
+import builtins
 from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, Collection, Iterable
 from uuid import UUID
 
-from .appointments import Appointment
+from .appointments import Appointment, AppointmentKey
+from .recurrence import Series
 from .users import User
 
 
@@ -19,6 +23,15 @@ class UserRepository(ABC):
     async def list(self) -> list[User]:
         raise NotImplementedError
 
+    @abstractmethod
+    async def get_by_email(self, email: str) -> User | None:
+        """Look a user up by email, compared after ``User.normalize_email``."""
+        raise NotImplementedError
+
+    async def save_many(self, users: Iterable[User]) -> builtins.list[UUID]:
+        """Save several users in one call; adapters may batch the writes."""
+        return [await self.save(a_user) for a_user in users]
+
 
 class AppointmentRepository(ABC):
 
@@ -33,3 +46,92 @@ class AppointmentRepository(ABC):
     @abstractmethod
     async def list(self) -> list[Appointment]:
         raise NotImplementedError
+
+    @abstractmethod
+    async def query(
+        self,
+        *,
+        therapist_id: UUID | None = None,
+        patient_id: UUID | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        after: AppointmentKey | None = None,
+        limit: int | None = None,
+    ) -> builtins.list[Appointment]:
+        """Appointments matching every given filter, ordered by (start_at, id).
+
+        ``start``/``end`` bound ``start_at`` as the half-open range [start, end).
+        ``after`` and ``limit`` select a keyset page: at most ``limit``
+        appointments whose ``key`` is strictly greater than ``after``.
+        """
+        raise NotImplementedError
+
+    async def stream(
+        self,
+        *,
+        therapist_id: UUID | None = None,
+        patient_id: UUID | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[Appointment]:
+        """Yield every match of ``query`` one keyset page at a time."""
+        after: AppointmentKey | None = None
+        while True:
+            batch = await self.query(
+                therapist_id=therapist_id,
+                patient_id=patient_id,
+                start=start,
+                end=end,
+                after=after,
+                limit=batch_size,
+            )
+            for an_appointment in batch:
+                yield an_appointment
+            if len(batch) < batch_size:
+                return
+            after = batch[-1].key
+
+    @abstractmethod
+    async def find_overlapping(
+        self,
+        therapist_ids: Collection[UUID],
+        patient_ids: Collection[UUID],
+        start: datetime,
+        end: datetime,
+    ) -> builtins.list[Appointment]:
+        """Appointments of any given therapist or patient meeting [start, end]."""
+        raise NotImplementedError
+
+    async def save_many(
+        self, appointments: Iterable[Appointment]
+    ) -> builtins.list[UUID]:
+        """Save several appointments in one call; adapters may batch the writes."""
+        return [await self.save(an_appointment) for an_appointment in appointments]
+
+    @abstractmethod
+    async def delete(self, id: UUID) -> None:
+        """Remove the appointment; ``KeyError`` if there is none."""
+        raise NotImplementedError
+
+
+class SeriesRepository(ABC):
+
+    @abstractmethod
+    async def get(self, id: UUID) -> Series:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save(self, series: Series) -> UUID:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def list(self) -> list[Series]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def find(
+        self, therapist_ids: Collection[UUID], patient_ids: Collection[UUID]
+    ) -> builtins.list[Series]:
+        """Series of any of the given therapists or patients."""
+        raise NotImplementedError
@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta
+from enum import StrEnum
+from hashlib import blake2b
+from itertools import count as count_from
+from math import lcm
+from typing import Iterator, Self
+from uuid import UUID
+
+from pydantic import UUID4, BaseModel, Field, field_validator, model_validator
+
+from app.exceptions import (
+    InvalidDateAndTimeError,
+    InvalidRecurrenceError,
+    TimeZoneGivenError,
+)
+
+from .appointments import Appointment
+from .base_model import KinModel
+from .intervals import overlaps
+
+MICROSECOND = timedelta(microseconds=1)
+
+
+class Frequency(StrEnum):
+
+    DAILY = "daily"
+    WEEKLY = "weekly"
+
+
+STEPS = {Frequency.DAILY: timedelta(days=1), Frequency.WEEKLY: timedelta(weeks=1)}
+
+
+class SeriesRequest(BaseModel):
+    """A recurring booking, in the spirit of an iCalendar RRULE.
+
+    Occurrences start every ``interval`` days or weeks from ``start_at``, until
+    ``count`` of them have been generated or ``until`` is passed, whichever
+    comes first; without either the series never ends. ``exceptions`` lists
+    the start times of occurrences that are skipped: as with EXDATE they
+    still count towards ``count``.
+    """
+
+    title: str
+    start_at: datetime
+    duration: timedelta = Field(default_factory=lambda: timedelta(minutes=30))
+    patient_id: UUID4
+    therapist_id: UUID4
+    frequency: Frequency = Frequency.WEEKLY
+    interval: int = Field(default=1, ge=1)
+    until: datetime | None = None
+    count: int | None = Field(default=None, ge=1)
+    exceptions: frozenset[datetime] = frozenset()
+
+
+class Series(SeriesRequest, KinModel):
+    """A stored recurring booking, whose occurrences are only ever computed.
+
+    Occurrence ``k`` starts at ``start_at + k * period``. Occurrences are
+    ``Appointment``s with an id derived from the series id and ``k``, so the
+    same occurrence always has the same id.
+    """
+
+    @field_validator("start_at", "until")
+    @classmethod
+    def validate_local_time(cls, value: datetime | None) -> datetime | None:
+        if value is not None and value.tzinfo is not None:
+            raise TimeZoneGivenError
+        return value
+
+    @field_validator("exceptions")
+    @classmethod
+    def validate_local_exceptions(
+        cls, value: frozenset[datetime]
+    ) -> frozenset[datetime]:
+        if any(an_exception.tzinfo is not None for an_exception in value):
+            raise TimeZoneGivenError
+        return value
+
+    @field_validator("start_at")
+    @classmethod
+    def validate_start_at(cls, value: datetime) -> datetime:
+        if value < datetime.now():
+            raise InvalidDateAndTimeError
+        return value
+
+    @model_validator(mode="after")
+    def validate_period(self) -> Self:
+        last = self.last_index
+        if not timedelta(0) < self.duration < self.period or (
+            last is not None and last < 0
+        ):
+            raise InvalidRecurrenceError
+        return self
+
+    @property
+    def period(self) -> timedelta:
+        return STEPS[self.frequency] * self.interval
+
+    @property
+    def last_index(self) -> int | None:
+        """Index of the last occurrence, ``None`` if the series never ends."""
+        last = None if self.count is None else self.count - 1
+        if self.until is not None:
+            by_date = (self.until - self.start_at) // self.period
+            last = by_date if last is None else min(last, by_date)
+        return last
+
+    @property
+    def end_at(self) -> datetime | None:
+        """End of the last occurrence, ``None`` if the series never ends."""
+        last = self.last_index
+        if last is None:
+            return None
+        return self.start_at + self.period * last + self.duration
+
+    def occurrence(self, index: int) -> Appointment:
+        digest = blake2b(self.id.bytes + index.to_bytes(8), digest_size=16).digest()
+        return Appointment.hydrate(
+            id=UUID(bytes=digest, version=4),
+            title=self.title,
+            start_at=self.start_at + self.period * index,
+            duration=self.duration,
+            patient_id=self.patient_id,
+            therapist_id=self.therapist_id,
+        )
+
+    def occurrences(
+        self, start: datetime | None = None, end: datetime | None = None
+    ) -> Iterator[Appointment]:
+        """Yield, in order, the occurrences starting in [start, end)."""
+        first = 0
+        if start is not None and start > self.start_at:
+            first = -((self.start_at - start) // self.period)
+        last = self.last_index
+        if end is not None:
+            before_end = (end - MICROSECOND - self.start_at) // self.period
+            last = before_end if last is None else min(last, before_end)
+        indexes = count_from(first) if last is None else range(first, last + 1)
+        for index in indexes:
+            if self.start_at + self.period * index not in self.exceptions:
+                yield self.occurrence(index)
+
+    def overlapping(self, start: datetime, end: datetime) -> Iterator[Appointment]:
+        """Yield the occurrences meeting the closed interval [start, end]."""
+        return self.occurrences(start - self.duration, end + MICROSECOND)
+
+    def shares_people_with(self, other: "Series") -> bool:
+        return (
+            self.therapist_id == other.therapist_id
+            or self.patient_id == other.patient_id
+        )
+
+    def first_conflict_with(self, other: "Series") -> Appointment | None:
+        """An occurrence of ``self`` overlapping one of ``other``, if any.
+
+        Once both series have started, which occurrences overlap repeats every
+        least common multiple of their periods. Each exception can only spoil
+        the repetitions it falls in, so walking one repetition more than
+        twice the number of exceptions settles it, however long the series.
+        """
+        if not self.shares_people_with(other):
+            return None
+        repeats_every = MICROSECOND * lcm(
+            self.period // MICROSECOND, other.period // MICROSECOND
+        )
+        spoiled = 2 * (len(self.exceptions) + len(other.exceptions))
+        start = max(self.start_at, other.start_at)
+        end = start + repeats_every * (spoiled + 2)
+        for ends in (self.end_at, other.end_at):
+            if ends is not None:
+                end = min(end, ends)
+
+        mine = self.overlapping(start, end)
+        theirs = other.overlapping(start, end)
+        an_occurrence, another = next(mine, None), next(theirs, None)
+        while an_occurrence is not None and another is not None:
+            if overlaps(
+                an_occurrence.start_at,
+                an_occurrence.end_at,
+                another.start_at,
+                another.end_at,
+            ):
+                return an_occurrence
+            if an_occurrence.end_at < another.end_at:
+                an_occurrence = next(mine, None)
+            else:
+                another = next(theirs, None)
+        return None
@@ -1,4 +1,3 @@
-from hashlib import sha3_512
 from secrets import choice
 from string import ascii_letters, digits
 
@@ -14,12 +13,11 @@ class User(KinModel):
     password_hash: bytes
     salt: str
 
+    @staticmethod
+    def normalize_email(email: str) -> str:
+        return email.strip().lower()
+
     @staticmethod
     async def generate_salt() -> str:
         alphabet = ascii_letters + digits
         return "".join([choice(alphabet) for _ in range(32)])
-
-    @staticmethod
-    async def hash_password(salted_password: str) -> bytes:
-        hashed_salted_password: bytes = sha3_512(salted_password.encode()).digest()
-        return hashed_salted_password
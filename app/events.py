@@ -0,0 +1,126 @@
+import asyncio
+from collections import defaultdict, deque
+from typing import AsyncIterator, Iterable
+from uuid import UUID
+
+
+class Event:
+    """A schedule change, kept as the server-sent event frame clients get.
+
+    The frame is built once and shared by every subscriber it is sent to.
+    """
+
+    __slots__ = ("id", "people", "frame")
+
+    def __init__(self, id: int, kind: str, people: tuple[UUID, ...], data: bytes):
+        self.id = id
+        self.people = people
+        self.frame = b"id: %d\nevent: %s\ndata: %s\n\n" % (id, kind.encode(), data)
+
+
+class Subscription:
+    """The events of one therapist or patient, as an async iterator of frames.
+
+    At most ``size`` frames wait to be read. A subscriber falling further
+    behind is dropped: it gets what it has queued, then its iteration ends,
+    and it can reconnect with the last id it saw to resume from the history.
+    """
+
+    __slots__ = ("person_id", "size", "closed", "_frames", "_waiter")
+
+    def __init__(self, person_id: UUID, size: int) -> None:
+        self.person_id = person_id
+        self.size = size
+        self.closed = False
+        self._frames: deque[bytes] = deque()
+        self._waiter: asyncio.Future[None] | None = None
+
+    def push(self, frame: bytes) -> None:
+        if self.closed:
+            return
+        if len(self._frames) >= self.size:
+            self.close()
+            return
+        self._frames.append(frame)
+        self._wake()
+
+    def close(self) -> None:
+        self.closed = True
+        self._wake()
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self
+
+    async def __anext__(self) -> bytes:
+        while not self._frames:
+            if self.closed:
+                raise StopAsyncIteration
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._frames.popleft()
+
+    def _wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+class ChangeBus:
+    """Fans schedule changes out to the subscribers of the people involved.
+
+    Events are numbered from 1 and the last ``history`` of them are kept, so
+    a subscriber reconnecting with the id of the last event it saw gets the
+    ones it missed. When they are no longer all kept, or the id comes from
+    before a restart, it gets a ``reset`` event instead: its view is stale
+    and must be fetched again.
+    """
+
+    RESET = "reset"
+
+    def __init__(self, history: int = 10_000, queue_size: int = 256) -> None:
+        self.queue_size = queue_size
+        self.last_id = 0
+        self._history: deque[Event] = deque(maxlen=history)
+        self._subscribers: defaultdict[UUID, set[Subscription]] = defaultdict(set)
+
+    def publish(self, kind: str, people: Iterable[UUID], data: bytes) -> Event:
+        self.last_id += 1
+        event = Event(self.last_id, kind, tuple(people), data)
+        self._history.append(event)
+        for a_person in event.people:
+            for a_subscription in self._subscribers.get(a_person, ()):
+                a_subscription.push(event.frame)
+        return event
+
+    def subscribe(self, person_id: UUID, last_id: int | None = None) -> Subscription:
+        subscription = Subscription(person_id, self.queue_size)
+        if last_id is not None and last_id != self.last_id:
+            oldest = self._history[0].id if self._history else self.last_id + 1
+            if not oldest - 1 <= last_id < self.last_id:
+                subscription.push(Event(self.last_id, self.RESET, (), b"{}").frame)
+            else:
+                for an_event in self._history:
+                    if an_event.id > last_id and person_id in an_event.people:
+                        subscription.push(an_event.frame)
+        self._subscribers[person_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.close()
+        subscribers = self._subscribers.get(subscription.person_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.person_id]
+
+    def close(self) -> None:
+        """End every subscription, so open streams finish on shutdown."""
+        for subscribers in list(self._subscribers.values()):
+            for a_subscription in list(subscribers):
+                self.unsubscribe(a_subscription)
+
+    @property
+    def subscribers(self) -> int:
+        return sum(map(len, self._subscribers.values()))
@@ -13,13 +13,45 @@ class InvalidDateAndTimeError(AppointmentError):
     MSG = "Date and Time invalid: you need to set up an appointment somewhere from now and the future."
 
 
+class TimeZoneGivenError(InvalidDateAndTimeError):
+    MSG = "Date and Time invalid: appointments are set in local time, without a time zone."
+
+
 class OverlappingAppointmentError(AppointmentError):
     MSG = "Invalid appointment: the appointment demands provided overlap."
 
 
+class InvalidRecurrenceError(AppointmentError):
+    MSG = "Invalid series: occurrences must last less than the time between them and the series must have at least one."
+
+
 class UserDontExistsError(BaseError):
     MSG = "The given email adress is unknown to us"
 
 
+class EmailAlreadyUsedError(BaseError):
+    MSG = "An account already exists for the given email adress"
+
+
 class WrongPasswordError(BaseError):
     MSG = "The given password is wrong"
+
+
+class TooManyLoginAttemptsError(BaseError):
+    MSG = "Too many login attempts, please try again later"
+
+    def __init__(self, message: str | None = None, retry_after: int = 1) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InvalidSnapshotError(BaseError):
+    MSG = "The file is not a snapshot this version can read"
+
+
+class CorruptJournalError(BaseError):
+    MSG = "The journal is damaged before its last record"
+
+
+class InvalidTokenError(BaseError):
+    MSG = "The given access token is invalid or expired"
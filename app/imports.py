@@ -0,0 +1,74 @@
+"""Rows of an upload, read as the body arrives.
+
+Uploads are CSV with a header line, or NDJSON, with one row per line either
+way. Only the line being read is held in memory. A line that cannot be
+parsed becomes a ``ValueError`` in place of its row, so the rows after it
+are still read and the row numbers still match the upload's. So does a line
+longer than ``MAX_LINE_LENGTH`` bytes, whose remaining bytes are skipped as
+they arrive rather than held.
+"""
+
+import csv
+import json
+from typing import Any, AsyncIterable, AsyncIterator
+
+MAX_LINE_LENGTH = 64 * 1024
+
+type Row = dict[str, Any] | ValueError
+
+
+async def lines(
+    chunks: AsyncIterable[bytes], max_length: int = MAX_LINE_LENGTH
+) -> AsyncIterator[str | ValueError]:
+    """The non-blank lines of a UTF-8 byte stream, without line endings, a
+    ``ValueError`` standing for each line longer than ``max_length``."""
+    pending = b""
+    skipping = False
+    async for a_chunk in chunks:
+        pending += a_chunk
+        *complete, pending = pending.split(b"\n")
+        for a_line in complete:
+            if skipping:
+                skipping = False
+            elif len(a_line) > max_length:
+                yield ValueError(f"Line longer than {max_length} bytes")
+            elif a_line.strip():
+                yield a_line.decode("utf-8", "replace").rstrip("\r")
+        if len(pending) > max_length:
+            if not skipping:
+                yield ValueError(f"Line longer than {max_length} bytes")
+            skipping = True
+            pending = b""
+    if pending.strip() and not skipping:
+        yield pending.decode("utf-8", "replace").rstrip("\r")
+
+
+async def csv_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[Row]:
+    header: list[str] | None = None
+    async for a_line in lines(chunks):
+        if isinstance(a_line, ValueError):
+            yield a_line
+            if header is None:
+                # Without its header no row of the upload can be read.
+                return
+            continue
+        fields = next(csv.reader([a_line]))
+        if header is None:
+            header = [a_field.strip() for a_field in fields]
+        elif len(fields) != len(header):
+            yield ValueError(f"Expected {len(header)} fields, got {len(fields)}")
+        else:
+            yield dict(zip(header, fields))
+
+
+async def ndjson_rows(chunks: AsyncIterable[bytes]) -> AsyncIterator[Row]:
+    async for a_line in lines(chunks):
+        if isinstance(a_line, ValueError):
+            yield a_line
+            continue
+        try:
+            row = json.loads(a_line)
+        except ValueError:
+            yield ValueError("Invalid JSON")
+            continue
+        yield row if isinstance(row, dict) else ValueError("Expected a JSON object")
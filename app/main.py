@@ -1,20 +1,117 @@
-from typing import Annotated, AsyncGenerator
+import asyncio
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from datetime import date, datetime, time, timedelta
+from typing import Annotated, Any, AsyncGenerator, AsyncIterator, Callable
 from uuid import UUID
 
-from fastapi import Depends, FastAPI, Form
+from fastapi import (
+    Depends,
+    FastAPI,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    status,
+)
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
-from pydantic import UUID4, BaseModel
+from pydantic import UUID4, BaseModel, Field
+from starlette.requests import ClientDisconnect
+from starlette.types import Receive, Scope, Send
 
-from app.domain import Appointment
+from app.adapters.instrumented import (
+    InstrumentedAppointmentRepository,
+    InstrumentedUserRepository,
+)
+from app.auth import KeyRing, TokenVerifier
+from app.domain import (
+    Appointment,
+    AppointmentKey,
+    BookingRequest,
+    BookingResult,
+    Series,
+    SeriesRequest,
+    TimeSlot,
+)
+from app.exceptions import (
+    AppointmentError,
+    EmailAlreadyUsedError,
+    InvalidTokenError,
+    OverlappingAppointmentError,
+    TooManyLoginAttemptsError,
+)
+from app.imports import csv_rows, ndjson_rows
+from app.metrics import REGISTRY, MetricsMiddleware
 from app.service import AppointmentController
 from app.service import UserService as UserController
+from app.wiring import RepositoryFactory, from_environment
 
-app = FastAPI()
+
+def lifespan(
+    repositories: RepositoryFactory | None = None,
+) -> Callable[[FastAPI], AbstractAsyncContextManager[None]]:
+    """Build the services on startup and release their resources on shutdown.
+
+    Repositories come from ``repositories``, by default the factory chosen by
+    ``app.wiring.from_environment`` when the application starts.
+    """
+
+    @asynccontextmanager
+    async def run(app: FastAPI) -> AsyncIterator[None]:
+        keyring = KeyRing.from_environment()
+        async with (repositories or from_environment())() as stores:
+            app.state.appointment_service = AppointmentController(
+                InstrumentedAppointmentRepository(stores.appointments),
+                series=stores.series,
+            )
+            app.state.user_service = UserController(
+                InstrumentedUserRepository(stores.users), keyring=keyring
+            )
+            app.state.token_verifier = TokenVerifier(keyring)
+            try:
+                yield
+            finally:
+                app.state.appointment_service.events.close()
+                app.state.user_service.hasher.close()
+
+    return run
+
+
+app = FastAPI(lifespan=lifespan())
+app.add_middleware(MetricsMiddleware)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 10_000
+MAX_AVAILABILITY_DAYS = 92
+EVENTS_KEEPALIVE_SECONDS = 15.0
+IMPORT_FORMATS = {"text/csv": csv_rows, "application/x-ndjson": ndjson_rows}
+
+
+class AppointmentFilters(BaseModel):
+    therapist_id: UUID | None = None
+    patient_id: UUID | None = None
+    day: date | None = None
+
 
 class AppointmentsResponse(BaseModel):
     appointments: list[Appointment]
+    next_cursor: str | None = None
+
+
+class BookingBatch(BaseModel):
+    appointments: list[BookingRequest] = Field(max_length=MAX_BATCH_SIZE)
+
+
+class BookingBatchResponse(BaseModel):
+    results: list[BookingResult]
+
+
+class AvailabilityResponse(BaseModel):
+    slots: list[TimeSlot]
 
 
 class LoginData(BaseModel):
@@ -33,43 +130,305 @@ class SignupResponse(BaseModel):
     user_id: UUID4
 
 
-appointment_service = AppointmentController()
-user_service = UserController()
+async def get_appointment_service(
+    request: Request,
+) -> AsyncGenerator[AppointmentController, None]:
+    yield request.app.state.appointment_service
+
+
+async def get_user_service(request: Request) -> AsyncGenerator[UserController]:
+    yield request.app.state.user_service
+
 
+async def get_token_verifier(request: Request) -> AsyncGenerator[TokenVerifier]:
+    yield request.app.state.token_verifier
 
-async def get_appointment_service() -> AsyncGenerator[AppointmentController, None]:
-    yield appointment_service
 
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    verifier: Annotated[TokenVerifier, Depends(get_token_verifier)],
+) -> dict[str, Any]:
+    try:
+        return verifier.verify(token)
+    except InvalidTokenError as error:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=error.message,
+            headers={"WWW-Authenticate": "Bearer"},
+        ) from error
 
-async def get_user_service() -> AsyncGenerator[UserController]:
-    yield user_service
+
+async def get_appointment_filters(
+    therapist_id: UUID | None = None,
+    patient_id: UUID | None = None,
+    day: date | None = None,
+) -> AppointmentFilters:
+    return AppointmentFilters(therapist_id=therapist_id, patient_id=patient_id, day=day)
 
 
 AppointmentService = Annotated[AppointmentController, Depends(get_appointment_service)]
 UserService = Annotated[UserController, Depends(get_user_service)]
+CurrentUser = Annotated[dict[str, Any], Depends(get_current_user)]
+Filters = Annotated[AppointmentFilters, Depends(get_appointment_filters)]
+
+
+def encode_cursor(key: AppointmentKey) -> str:
+    start_at, id = key
+    return urlsafe_b64encode(f"{start_at.isoformat()}|{id}".encode()).decode()
 
 
-@app.get("/appointments")
+def decode_cursor(cursor: str) -> AppointmentKey:
+    try:
+        start_at, id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(start_at), UUID(id)
+    except ValueError as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from error
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of ``etag`` with each tag of an If-None-Match header."""
+    return any(
+        a_tag.strip().removeprefix("W/") in (etag, "*")
+        for a_tag in if_none_match.split(",")
+    )
+
+
+@app.get(
+    "/appointments",
+    response_model=AppointmentsResponse,
+    response_model_exclude_none=True,
+)
 async def get_all_appointments(
-    service: AppointmentService, token: Annotated[str, Depends(oauth2_scheme)]
-) -> AppointmentsResponse:
-    return AppointmentsResponse(appointments=await service.get_all_appointments())
+    service: AppointmentService,
+    current_user: CurrentUser,
+    filters: Filters,
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
+    """List a page of appointments, tagged with the versions of the agenda it
+    comes from. A request still holding the current tag gets a 304 before
+    anything is read or encoded."""
+    etag = service.cache.etag(filters.therapist_id, filters.patient_id)
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+    appointments = await service.get_all_appointments(
+        patient_id=filters.patient_id,
+        therapist_id=filters.therapist_id,
+        day=filters.day,
+        after=decode_cursor(cursor) if cursor else None,
+        limit=limit + 1,
+    )
+    next_cursor = None
+    if len(appointments) > limit:
+        appointments = appointments[:limit]
+        next_cursor = encode_cursor(appointments[-1].key)
+    return Response(
+        service.encoder.encode_page(appointments, next_cursor),
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
+
+
+@app.get("/appointments/stream")
+async def stream_appointments(
+    service: AppointmentService,
+    current_user: CurrentUser,
+    filters: Filters,
+) -> StreamingResponse:
+    async def lines() -> AsyncIterator[bytes]:
+        async for an_appointment in service.stream_appointments(
+            patient_id=filters.patient_id,
+            therapist_id=filters.therapist_id,
+            day=filters.day,
+        ):
+            yield service.encoder.dump(an_appointment) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/appointments/events")
+async def appointment_events(
+    service: AppointmentService,
+    current_user: CurrentUser,
+    therapist_id: UUID | None = None,
+    patient_id: UUID | None = None,
+    last_event_id: Annotated[int | None, Header()] = None,
+) -> StreamingResponse:
+    """Stream the changes to one therapist's or patient's appointments as
+    server-sent events, resuming after ``Last-Event-ID`` when given."""
+    if (therapist_id is None) == (patient_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give either therapist_id or patient_id",
+        )
+    person_id = therapist_id if therapist_id is not None else patient_id
+    assert person_id is not None
+    subscription = service.events.subscribe(person_id, last_event_id)
+
+    async def frames() -> AsyncIterator[bytes]:
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(
+                        anext(subscription), EVENTS_KEEPALIVE_SECONDS
+                    )
+                except TimeoutError:
+                    yield b": keepalive\n\n"
+                except StopAsyncIteration:
+                    return
+        finally:
+            service.events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.delete("/appointments/{appointment_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_appointment(
+    appointment_id: UUID, service: AppointmentService, current_user: CurrentUser
+) -> None:
+    try:
+        await service.cancel_appointment(appointment_id)
+    except KeyError as error:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Appointment not found"
+        ) from error
+
+
+@app.post("/appointments/batch", response_model_exclude_none=True)
+async def create_appointments(
+    batch: BookingBatch, service: AppointmentService, current_user: CurrentUser
+) -> BookingBatchResponse:
+    results = await service.create_appointments(batch.appointments)
+    return BookingBatchResponse(results=results)
+
+
+@app.post("/appointments/series")
+async def create_series(
+    request: SeriesRequest, service: AppointmentService, current_user: CurrentUser
+) -> Series:
+    try:
+        return await service.create_series(request)
+    except OverlappingAppointmentError as error:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=error.message
+        ) from error
+    except AppointmentError as error:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=error.message
+        ) from error
+
+
+@app.get("/therapists/{therapist_id}/availability")
+async def get_availability(
+    therapist_id: UUID,
+    first_day: date,
+    last_day: date,
+    service: AppointmentService,
+    current_user: CurrentUser,
+    duration_minutes: Annotated[int, Query(ge=5, le=24 * 60)] = 30,
+    opens_at: time = time(9),
+    closes_at: time = time(17),
+) -> AvailabilityResponse:
+    if not 0 <= (last_day - first_day).days < MAX_AVAILABILITY_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The range must span 1 to {MAX_AVAILABILITY_DAYS} days",
+        )
+    try:
+        slots = await service.find_free_slots(
+            therapist_id,
+            first_day,
+            last_day,
+            duration=timedelta(minutes=duration_minutes),
+            opens_at=opens_at,
+            closes_at=closes_at,
+        )
+    except AppointmentError as error:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=error.message
+        ) from error
+    return AvailabilityResponse(slots=slots)
 
 
 @app.post("/signup")
 async def signup(data: SignupData, service: UserService) -> SignupResponse:
-    user_id: UUID = await service.create_user(
-        data.firstname, data.lastname, data.email, data.password
-    )
+    try:
+        user_id: UUID = await service.create_user(
+            data.firstname, data.lastname, data.email, data.password
+        )
+    except EmailAlreadyUsedError as error:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=error.message
+        ) from error
     return SignupResponse(user_id=user_id)
 
 
+class UploadStreamingResponse(StreamingResponse):
+    """A streaming response sent while the request body is still being read.
+
+    ``StreamingResponse`` watches for the client leaving by reading request
+    messages itself, which would take body chunks from under the reader; a
+    body reader sees the client leave anyway, as ``ClientDisconnect``.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+
+
+@app.post("/users/import")
+async def import_users(
+    request: Request, service: UserService, current_user: CurrentUser
+) -> StreamingResponse:
+    """Sign up the users of a CSV or NDJSON upload, with a header line for CSV
+    and the fields of ``/signup`` either way. Each row's result is streamed
+    back as an NDJSON line as soon as the row's batch is saved."""
+    media_type = request.headers.get("content-type", "").split(";")[0].strip()
+    parse = IMPORT_FORMATS.get(media_type)
+    if parse is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Upload one of {', '.join(IMPORT_FORMATS)}",
+        )
+
+    async def results() -> AsyncIterator[bytes]:
+        try:
+            async for a_result in service.import_users(parse(request.stream())):
+                yield a_result.model_dump_json(exclude_none=True).encode() + b"\n"
+        except ClientDisconnect:
+            return
+
+    return UploadStreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @app.post("/login")
 async def login(
     username: Annotated[str, Form()],
     password: Annotated[str, Form()],
     service: UserService,
+    request: Request,
 ) -> dict[str, str]:
-    access_token: str = await service.authenticate_user(username, password)
+    client = request.client.host if request.client else None
+    try:
+        access_token: str = await service.authenticate_user(username, password, client)
+    except TooManyLoginAttemptsError as error:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=error.message,
+            headers={"Retry-After": str(error.retry_after)},
+        ) from error
     payload: dict[str, str] = dict(access_token=access_token, token_type="bearer")
     return payload
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type=REGISTRY.CONTENT_TYPE)
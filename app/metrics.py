@@ -0,0 +1,273 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Iterator, Sequence
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+SIZE_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], *extra: str) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A monotonic count per combination of label values.
+
+    The text format wants a family named like its samples, so a counter is
+    exposed as ``<name>_total``, described and typed under that name.
+    """
+
+    TYPE = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.family = f"{name}_total"
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self) -> Iterator[str]:
+        for label_values, value in self._values.items():
+            yield f"{self.family}{_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    """Observations sorted into cumulative ``le`` buckets, per label values.
+
+    Each series keeps one count per bucket plus the overflow, the sum and the
+    total count; buckets are only summed up when rendered.
+    """
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.family = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 3)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        before = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - before, *label_values)
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return int(series[-1]) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        for label_values, series in self._series.items():
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                cumulative += int(count)
+                bucket = _labels(self.labels, label_values, f'le="{bound}"')
+                yield f"{self.name}_bucket{bucket} {cumulative}"
+            yield f"{self.name}_sum{labels} {series[-2]}"
+            yield f"{self.name}_count{labels} {int(series[-1])}"
+
+
+class Registry:
+    """Metrics rendered together in the Prometheus text format.
+
+    Metrics are updated without locking, so they must be observed from the
+    event loop thread.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram] = {}
+
+    def register[M: (Counter, Histogram)](self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f"A metric named {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for a_metric in self._metrics.values():
+            lines.append(f"# HELP {a_metric.family} {a_metric.documentation}")
+            lines.append(f"# TYPE {a_metric.family} {a_metric.TYPE}")
+            lines.extend(a_metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram(
+        "kin_http_request_seconds",
+        "Time to answer an HTTP request, body included.",
+        ("method", "route", "status"),
+    )
+)
+REPOSITORY_SECONDS = REGISTRY.register(
+    Histogram(
+        "kin_repository_call_seconds",
+        "Time spent in a repository method.",
+        ("repository", "method"),
+    )
+)
+REPOSITORY_RESULT_SIZE = REGISTRY.register(
+    Histogram(
+        "kin_repository_result_size",
+        "Number of models read or written by a repository call.",
+        ("repository", "method"),
+        buckets=SIZE_BUCKETS,
+    )
+)
+REPOSITORY_ERRORS = REGISTRY.register(
+    Counter(
+        "kin_repository_errors",
+        "Repository calls that raised, by exception type.",
+        ("repository", "method", "error"),
+    )
+)
+PASSWORD_SECONDS = REGISTRY.register(
+    Histogram(
+        "kin_password_seconds",
+        "Time to hash or verify a password, once a hashing slot is free.",
+        ("operation",),
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    )
+)
+PASSWORD_WAIT_SECONDS = REGISTRY.register(
+    Histogram(
+        "kin_password_wait_seconds",
+        "Time spent waiting for a free hashing slot.",
+    )
+)
+LOGIN_REJECTIONS = REGISTRY.register(
+    Counter(
+        "kin_login_rejections",
+        "Login attempts turned away before hashing, by the limit they hit.",
+        ("reason",),
+    )
+)
+JOURNAL_FSYNCS = REGISTRY.register(
+    Counter(
+        "kin_journal_fsyncs",
+        "Group commits written and synced to a journal.",
+        ("journal",),
+    )
+)
+JOURNAL_COMMIT_SECONDS = REGISTRY.register(
+    Histogram(
+        "kin_journal_commit_seconds",
+        "Time from appending a record to a journal until it is synced.",
+        ("journal",),
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+    )
+)
+JOURNAL_BATCH_SIZE = REGISTRY.register(
+    Histogram(
+        "kin_journal_batch_size",
+        "Records written by one group commit.",
+        ("journal",),
+        buckets=SIZE_BUCKETS,
+    )
+)
+AGENDA_CACHE_LOOKUPS = REGISTRY.register(
+    Counter(
+        "kin_agenda_cache_lookups",
+        "Agenda queries answered from the cache (hit) or the repository (miss).",
+        ("result",),
+    )
+)
+JWT_SECONDS = REGISTRY.register(
+    Histogram(
+        "kin_jwt_seconds",
+        "Time to sign a token or to decode one missing from the cache.",
+        ("operation",),
+    )
+)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request into ``kin_http_request_seconds``.
+
+    Requests are labelled by the path template of the route that handled
+    them, not by the raw path, so path parameters do not create new series.
+    """
+
+    def __init__(self, app: ASGIApp, histogram: Histogram = REQUEST_SECONDS) -> None:
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        before = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            self.histogram.observe(
+                time.perf_counter() - before,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            )
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from base64 import b64encode
+from concurrent.futures import Executor, ThreadPoolExecutor
+from hashlib import scrypt, sha3_512
+from hmac import compare_digest
+from typing import Callable, Sequence
+
+from app.metrics import PASSWORD_SECONDS, PASSWORD_WAIT_SECONDS
+
+
+class PasswordScheme(ABC):
+    """One way of turning a salted password into the stored ``password_hash``."""
+
+    @abstractmethod
+    def hash(self, password: str, salt: str) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def verify(self, password: str, salt: str, stored: bytes) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def identifies(self, stored: bytes) -> bool:
+        """Whether ``stored`` was produced by this scheme."""
+        raise NotImplementedError
+
+    def is_current(self, stored: bytes) -> bool:
+        """Whether ``stored`` uses this scheme with its present parameters."""
+        return self.identifies(stored)
+
+
+class ScryptScheme(PasswordScheme):
+    """Memory-hard scrypt, stored as ``$scrypt$v=1$n=..,r=..,p=..$<b64 digest>``."""
+
+    PREFIX = b"$scrypt$v=1$"
+
+    def __init__(self, n: int = 2**14, r: int = 8, p: int = 1, length: int = 64):
+        self.n, self.r, self.p, self.length = n, r, p, length
+
+    def hash(self, password: str, salt: str) -> bytes:
+        return self._encode(self.n, self.r, self.p, password, salt)
+
+    def verify(self, password: str, salt: str, stored: bytes) -> bool:
+        n, r, p = self._parameters(stored)
+        return compare_digest(self._encode(n, r, p, password, salt), stored)
+
+    def identifies(self, stored: bytes) -> bool:
+        return stored.startswith(self.PREFIX)
+
+    def is_current(self, stored: bytes) -> bool:
+        return self.identifies(stored) and self._parameters(stored) == (
+            self.n,
+            self.r,
+            self.p,
+        )
+
+    def _encode(self, n: int, r: int, p: int, password: str, salt: str) -> bytes:
+        digest = scrypt(
+            password.encode(),
+            salt=salt.encode(),
+            n=n,
+            r=r,
+            p=p,
+            maxmem=256 * n * r,
+            dklen=self.length,
+        )
+        parameters = f"n={n},r={r},p={p}$".encode()
+        return self.PREFIX + parameters + b64encode(digest)
+
+    def _parameters(self, stored: bytes) -> tuple[int, int, int]:
+        parameters = stored[len(self.PREFIX) :].split(b"$", 1)[0].decode()
+        values = dict(item.split("=") for item in parameters.split(","))
+        return int(values["n"]), int(values["r"]), int(values["p"])
+
+
+class Sha3Scheme(PasswordScheme):
+    """Legacy unversioned ``sha3_512(salt + password)`` raw digests."""
+
+    def hash(self, password: str, salt: str) -> bytes:
+        return sha3_512((salt + password).encode()).digest()
+
+    def verify(self, password: str, salt: str, stored: bytes) -> bool:
+        return compare_digest(self.hash(password, salt), stored)
+
+    def identifies(self, stored: bytes) -> bool:
+        # Raw digests can start with any byte, "$" included: only their length
+        # tells them apart, as every scrypt hash is longer.
+        return len(stored) == sha3_512().digest_size
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords off the event loop.
+
+    New hashes use ``scheme``; hashes from any of the ``legacy`` schemes still
+    verify and are reported by ``needs_rehash``. At most ``max_concurrency``
+    hashes run at once, on ``executor`` or on a private thread pool of that size
+    (scrypt releases the GIL, so threads use every core).
+    """
+
+    def __init__(
+        self,
+        scheme: PasswordScheme | None = None,
+        legacy: Sequence[PasswordScheme] = (Sha3Scheme(),),
+        max_concurrency: int | None = None,
+        executor: Executor | None = None,
+    ) -> None:
+        self.scheme = scheme or ScryptScheme()
+        self.legacy = tuple(legacy)
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            self.max_concurrency, thread_name_prefix="password-hasher"
+        )
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def hash(self, password: str, salt: str) -> bytes:
+        return await self._run("hash", self.scheme.hash, password, salt)
+
+    async def verify(self, password: str, salt: str, stored: bytes) -> bool:
+        for a_scheme in (self.scheme, *self.legacy):
+            if a_scheme.identifies(stored):
+                return await self._run(
+                    "verify", a_scheme.verify, password, salt, stored
+                )
+        return False
+
+    def needs_rehash(self, stored: bytes) -> bool:
+        return not self.scheme.is_current(stored)
+
+    def close(self) -> None:
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def _run[T](
+        self, operation: str, function: Callable[..., T], *args: object
+    ) -> T:
+        queued_at = time.perf_counter()
+        async with self._slots:
+            started_at = time.perf_counter()
+            PASSWORD_WAIT_SECONDS.observe(started_at - queued_at)
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._executor, function, *args)
+            finally:
+                PASSWORD_SECONDS.observe(time.perf_counter() - started_at, operation)
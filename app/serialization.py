@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from typing import Iterable, Sequence
+from uuid import UUID
+
+from pydantic import TypeAdapter
+
+from app.domain import Appointment
+
+_to_json = TypeAdapter(Appointment).serializer.to_json
+_list_to_json = TypeAdapter(list[Appointment]).serializer.to_json
+
+
+def _split(array: bytes) -> list[bytes]:
+    """The items of a non-empty JSON array of appointments.
+
+    Appointments are flat objects starting with their id, and a quote inside
+    a string is always escaped, so ``},{"`` only ever separates two items.
+    """
+    items = []
+    start = 1
+    while (end := array.find(b'},{"', start)) >= 0:
+        items.append(array[start : end + 1])
+        start = end + 2
+    items.append(array[start:-1])
+    return items
+
+
+class AppointmentEncoder:
+    """Turns appointments into JSON bytes, remembering each one's encoding.
+
+    Appointments coming out of a repository are already valid, so they are
+    dumped straight to JSON without the validation FastAPI would run on a
+    response model, those missing from a page all in one call. The bytes
+    are kept per id, for at most ``cache_size`` appointments with the oldest
+    entry evicted first, and must be dropped with ``invalidate`` whenever an
+    appointment is saved. ``dump`` skips the cache, for exports that would
+    otherwise evict every entry worth keeping.
+    """
+
+    def __init__(self, cache_size: int = 100_000) -> None:
+        self.cache_size = cache_size
+        # Keyed by the integer value of the id: hashing a UUID runs Python
+        # code, hashing an int does not.
+        self._cache: OrderedDict[int, bytes] = OrderedDict()
+
+    def encode(self, appointment: Appointment) -> bytes:
+        key = appointment.id.int
+        encoded = self._cache.get(key)
+        if encoded is None:
+            encoded = _to_json(appointment)
+            self._cache[key] = encoded
+            self._evict()
+        return encoded
+
+    def encode_many(self, appointments: Sequence[Appointment]) -> list[bytes]:
+        """The encodings of ``appointments``, in order, those not cached yet
+        dumped together in a single call."""
+        keys = [an_appointment.id.int for an_appointment in appointments]
+        missing = [
+            position for position, key in enumerate(keys) if key not in self._cache
+        ]
+        if missing:
+            dumped = _list_to_json([appointments[x] for x in missing])
+            for position, an_encoding in zip(missing, _split(dumped)):
+                self._cache[keys[position]] = an_encoding
+        encoded = [self._cache[key] for key in keys]
+        self._evict()
+        return encoded
+
+    @staticmethod
+    def dump(appointment: Appointment) -> bytes:
+        return _to_json(appointment)
+
+    def encode_page(
+        self, appointments: Iterable[Appointment], next_cursor: str | None = None
+    ) -> bytes:
+        """Encode a listing the way ``AppointmentsResponse`` would, with
+        ``next_cursor`` left out when there is none."""
+        body = b",".join(self.encode_many(list(appointments)))
+        if next_cursor is None:
+            return b'{"appointments":[' + body + b"]}"
+        return b'{"appointments":[%s],"next_cursor":"%s"}' % (
+            body,
+            next_cursor.encode(),
+        )
+
+    def invalidate(self, ids: Iterable[UUID]) -> None:
+        for id in ids:
+            self._cache.pop(id.int, None)
+
+    def _evict(self) -> None:
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._cache)
@@ -1,17 +1,80 @@
-from datetime import date, datetime, timedelta
-from typing import Any
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from heapq import merge
+from itertools import islice
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Sequence
 from uuid import UUID, uuid4
 
 from joserfc import jwk, jwt
+from pydantic import ValidationError
 
-from app.domain import Appointment, AppointmentRepository, User, UserRepository
-from app.exceptions import UserDontExistsError, WrongPasswordError
+from app.admission import LoginAdmission
+from app.auth import KeyRing
+from app.caching import AgendaCache
+from app.domain import (
+    Appointment,
+    AppointmentKey,
+    AppointmentRepository,
+    BookingRequest,
+    BookingResult,
+    BookingStatus,
+    ImportResult,
+    ImportStatus,
+    Series,
+    SeriesRepository,
+    SeriesRequest,
+    TimeSlot,
+    User,
+    UserImportRow,
+    UserRepository,
+)
+from app.domain.availability import free_slots
+from app.domain.intervals import IntervalIndex
+from app.events import ChangeBus
+from app.exceptions import (
+    AppointmentError,
+    EmailAlreadyUsedError,
+    OverlappingAppointmentError,
+    TimeZoneGivenError,
+    UserDontExistsError,
+    WrongPasswordError,
+)
+from app.imports import Row
+from app.locks import StripedLock
+from app.metrics import JWT_SECONDS
+from app.passwords import PasswordHasher
+from app.serialization import AppointmentEncoder
+
+SERIES_HORIZON = timedelta(days=366)
+# The user fields signed into a token, readable by whoever holds it.
+TOKEN_CLAIMS = {"id", "firstname", "lastname", "email"}
+
+type Prepared = list[tuple[ImportResult, User | None]]
 
 
 class AppointmentController:
+    def __init__(
+        self,
+        repository: AppointmentRepository,
+        locks: StripedLock | None = None,
+        encoder: AppointmentEncoder | None = None,
+        cache: AgendaCache | None = None,
+        series: SeriesRepository | None = None,
+        events: ChangeBus | None = None,
+    ) -> None:
+        if series is None:
+            # The in-memory default is only for callers without persistence;
+            # importing it here keeps the service off the adapters package.
+            from app.adapters import InMemorySeriesRepository
 
-    def __init__(self, repository: AppointmentRepository) -> None:
+            series = InMemorySeriesRepository()
         self.repository = repository
+        self.series = series
+        self.locks = locks or StripedLock()
+        self.encoder = encoder or AppointmentEncoder()
+        self.cache = cache if cache is not None else AgendaCache()
+        self.events = events if events is not None else ChangeBus()
 
     async def create_appointment(
         self,
@@ -26,56 +89,414 @@ class AppointmentController:
             start_at=at,
             patient_id=patient.id,
             therapist_id=therapist.id,
+            duration=duration,
         )
 
-        for an_appointment in await self.repository.list():
-            new_appointment.is_not_overlapping_with(an_appointment)
+        async with self.locks.hold(therapist.id, patient.id):
+            for an_appointment in await self.repository.find_overlapping(
+                {therapist.id},
+                {patient.id},
+                new_appointment.start_at,
+                new_appointment.end_at,
+            ):
+                new_appointment.is_not_overlapping_with(an_appointment)
+            for a_series in await self.series.find({therapist.id}, {patient.id}):
+                for an_occurrence in a_series.overlapping(
+                    new_appointment.start_at, new_appointment.end_at
+                ):
+                    new_appointment.is_not_overlapping_with(an_occurrence)
 
-        await self.repository.save(new_appointment)
+            await self.repository.save(new_appointment)
+            self._saved([new_appointment])
         return new_appointment
 
+    async def create_appointments(
+        self, requests: Sequence[BookingRequest]
+    ) -> list[BookingResult]:
+        """Book a batch at once, reporting one result per request, in order.
+
+        Each request is checked against the stored appointments of its
+        therapist and patient through an interval index, then swept by start
+        time, so it is only compared with the accepted request reaching
+        furthest for its therapist and its patient, and finally with the
+        occurrences of their series around it. Accepted appointments are
+        saved with a single ``save_many`` call.
+        """
+        results: list[BookingResult] = [
+            BookingResult(status=BookingStatus.INVALID) for _ in requests
+        ]
+        candidates: list[tuple[int, Appointment]] = []
+        for position, request in enumerate(requests):
+            try:
+                candidates.append(
+                    (position, Appointment(id=uuid4(), **request.model_dump()))
+                )
+            except AppointmentError as error:
+                results[position].detail = error.message
+        if not candidates:
+            return results
+
+        candidates.sort(key=lambda candidate: candidate[1].start_at)
+        therapist_ids = {appointment.therapist_id for _, appointment in candidates}
+        patient_ids = {appointment.patient_id for _, appointment in candidates}
+        async with self.locks.hold(*therapist_ids, *patient_ids):
+            await self._sweep(candidates, therapist_ids, patient_ids, results)
+        return results
+
+    async def _sweep(
+        self,
+        candidates: list[tuple[int, Appointment]],
+        therapist_ids: set[UUID],
+        patient_ids: set[UUID],
+        results: list[BookingResult],
+    ) -> None:
+        stored = await self.repository.find_overlapping(
+            therapist_ids,
+            patient_ids,
+            candidates[0][1].start_at,
+            max(appointment.end_at for _, appointment in candidates),
+        )
+        stored_by_id = {an_appointment.id: an_appointment for an_appointment in stored}
+        stored_by_therapist: defaultdict[UUID, IntervalIndex] = defaultdict(
+            IntervalIndex
+        )
+        stored_by_patient: defaultdict[UUID, IntervalIndex] = defaultdict(IntervalIndex)
+        for an_appointment in stored:
+            for an_index in (
+                stored_by_therapist[an_appointment.therapist_id],
+                stored_by_patient[an_appointment.patient_id],
+            ):
+                an_index.add(
+                    an_appointment.id, an_appointment.start_at, an_appointment.end_at
+                )
+        series_by_person: defaultdict[UUID, list[Series]] = defaultdict(list)
+        for a_series in await self.series.find(therapist_ids, patient_ids):
+            series_by_person[a_series.therapist_id].append(a_series)
+            series_by_person[a_series.patient_id].append(a_series)
+
+        furthest_by_therapist: dict[UUID, Appointment] = {}
+        furthest_by_patient: dict[UUID, Appointment] = {}
+        accepted: list[Appointment] = []
+        for batch_position, appointment in candidates:
+            conflicting = (
+                self._first_stored(
+                    appointment,
+                    stored_by_id,
+                    stored_by_therapist.get(appointment.therapist_id),
+                    stored_by_patient.get(appointment.patient_id),
+                )
+                or self._first_overlapping(
+                    appointment,
+                    furthest_by_therapist.get(appointment.therapist_id),
+                    furthest_by_patient.get(appointment.patient_id),
+                )
+                or self._first_occurrence(
+                    appointment,
+                    series_by_person.get(appointment.therapist_id, []),
+                    series_by_person.get(appointment.patient_id, []),
+                )
+            )
+            if conflicting is not None:
+                results[batch_position] = BookingResult(
+                    status=BookingStatus.CONFLICT, conflicting_id=conflicting.id
+                )
+                continue
+            accepted.append(appointment)
+            results[batch_position] = BookingResult(
+                status=BookingStatus.ACCEPTED, appointment_id=appointment.id
+            )
+            for furthest, key in (
+                (furthest_by_therapist, appointment.therapist_id),
+                (furthest_by_patient, appointment.patient_id),
+            ):
+                if key not in furthest or furthest[key].end_at < appointment.end_at:
+                    furthest[key] = appointment
+
+        if accepted:
+            await self.repository.save_many(accepted)
+            self._saved(accepted)
+
+    async def create_series(self, request: SeriesRequest) -> Series:
+        """Store a recurring booking if none of its occurrences, however far in
+        the future, overlaps an appointment or another series' occurrence.
+
+        Stored appointments are only checked against the occurrences around
+        them, and other series through ``Series.first_conflict_with``, so the
+        occurrences are never all expanded.
+        """
+        new_series = Series(id=uuid4(), **request.model_dump())
+        people = ({new_series.therapist_id}, {new_series.patient_id})
+
+        async with self.locks.hold(new_series.therapist_id, new_series.patient_id):
+            for an_appointment in await self.repository.find_overlapping(
+                *people, new_series.start_at, new_series.end_at or datetime.max
+            ):
+                for an_occurrence in new_series.overlapping(
+                    an_appointment.start_at, an_appointment.end_at
+                ):
+                    an_occurrence.is_not_overlapping_with(an_appointment)
+            for another in await self.series.find(*people):
+                if new_series.first_conflict_with(another) is not None:
+                    raise OverlappingAppointmentError
+
+            await self.series.save(new_series)
+            self.cache.bump([new_series])
+            self.events.publish(
+                "series",
+                (new_series.therapist_id, new_series.patient_id),
+                new_series.model_dump_json().encode(),
+            )
+        return new_series
+
+    async def cancel_appointment(self, id: UUID) -> Appointment:
+        """Delete an appointment; ``KeyError`` if there is none."""
+        appointment = await self.repository.get(id)
+        async with self.locks.hold(appointment.therapist_id, appointment.patient_id):
+            await self.repository.delete(id)
+            self._changed("cancelled", [appointment])
+        return appointment
+
+    def _saved(self, appointments: list[Appointment]) -> None:
+        self._changed("created", appointments)
+
+    def _changed(self, kind: str, appointments: list[Appointment]) -> None:
+        """Forget whatever was derived from the previous state of these, then
+        tell the subscribers of their therapists and patients."""
+        self.encoder.invalidate(an_appointment.id for an_appointment in appointments)
+        self.cache.bump(appointments)
+        for an_appointment in appointments:
+            self.events.publish(
+                kind,
+                (an_appointment.therapist_id, an_appointment.patient_id),
+                self.encoder.encode(an_appointment),
+            )
+
+    @staticmethod
+    def _first_stored(
+        appointment: Appointment,
+        stored: dict[UUID, Appointment],
+        *indexes: IntervalIndex | None,
+    ) -> Appointment | None:
+        for an_index in indexes:
+            if an_index is None:
+                continue
+            for id in an_index.overlapping(appointment.start_at, appointment.end_at):
+                return stored[id]
+        return None
+
+    @staticmethod
+    def _first_overlapping(
+        appointment: Appointment, *others: Appointment | None
+    ) -> Appointment | None:
+        for another in others:
+            if another is None:
+                continue
+            try:
+                appointment.is_not_overlapping_with(another)
+            except OverlappingAppointmentError:
+                return another
+        return None
+
+    @staticmethod
+    def _first_occurrence(
+        appointment: Appointment, *series: Iterable[Series]
+    ) -> Appointment | None:
+        for some_series in series:
+            for a_series in some_series:
+                for an_occurrence in a_series.overlapping(
+                    appointment.start_at, appointment.end_at
+                ):
+                    return an_occurrence
+        return None
+
+    async def find_free_slots(
+        self,
+        therapist_id: UUID,
+        first_day: date,
+        last_day: date,
+        duration: timedelta = timedelta(minutes=30),
+        opens_at: time = time(9),
+        closes_at: time = time(17),
+        step: timedelta | None = None,
+    ) -> list[TimeSlot]:
+        """Bookable slots of the therapist between two days, both included.
+
+        Candidates start every ``step`` (``duration`` by default) from
+        ``opens_at`` each day and must end by ``closes_at``; they are checked
+        against the therapist's merged busy intervals in one pass, occurrences
+        of the therapist's series included. Opening hours are local times:
+        with a time zone they raise ``TimeZoneGivenError``.
+        """
+        if opens_at.tzinfo is not None or closes_at.tzinfo is not None:
+            raise TimeZoneGivenError
+        windows = [
+            (datetime.combine(day, opens_at), datetime.combine(day, closes_at))
+            for day in (
+                first_day + timedelta(days=offset)
+                for offset in range((last_day - first_day).days + 1)
+            )
+        ]
+        if not windows:
+            return []
+        first, last = windows[0][0], windows[-1][1]
+        busy = await self.repository.find_overlapping(
+            {therapist_id}, set(), first, last
+        )
+        for a_series in await self.series.find({therapist_id}, set()):
+            busy.extend(a_series.overlapping(first, last))
+        return list(
+            free_slots(
+                ((appointment.start_at, appointment.end_at) for appointment in busy),
+                windows,
+                duration,
+                step or duration,
+                not_before=datetime.now(),
+            )
+        )
+
     async def get_all_appointments(
         self,
         patient_id: UUID | None = None,
         therapist_id: UUID | None = None,
         day: date | None = None,
+        after: AppointmentKey | None = None,
+        limit: int | None = None,
+    ) -> list[Appointment]:
+        key = (therapist_id, patient_id, day, after, limit)
+        stamp = self.cache.stamp(therapist_id, patient_id)
+        cached = self.cache.get(key, stamp)
+        if cached is not None:
+            return cached
+
+        start, end = self._day_range(day)
+        horizon = None if limit else datetime.now() + SERIES_HORIZON
+        appointments = await self._query(
+            therapist_id, patient_id, start, end, after, limit, horizon
+        )
+        self.cache.put(key, stamp, appointments)
+        return appointments
+
+    async def stream_appointments(
+        self,
+        patient_id: UUID | None = None,
+        therapist_id: UUID | None = None,
+        day: date | None = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[Appointment]:
+        start, end = self._day_range(day)
+        horizon = datetime.now() + SERIES_HORIZON
+        after: AppointmentKey | None = None
+        while True:
+            batch = await self._query(
+                therapist_id, patient_id, start, end, after, batch_size, horizon
+            )
+            for an_appointment in batch:
+                yield an_appointment
+            if len(batch) < batch_size:
+                return
+            after = batch[-1].key
+
+    async def _query(
+        self,
+        therapist_id: UUID | None,
+        patient_id: UUID | None,
+        start: datetime | None,
+        end: datetime | None,
+        after: AppointmentKey | None,
+        limit: int | None,
+        horizon: datetime | None,
     ) -> list[Appointment]:
-        appointments = await self.repository.list()
-        if therapist_id:
-            appointments = list(
-                filter(lambda x: x.therapist_id == therapist_id, appointments)
+        """The repository's page merged with the matching series' occurrences.
+
+        Occurrences are generated lazily and only until the page is full. A
+        series without an end has infinitely many, so listings that must end,
+        those without a limit and streams, stop them at ``horizon``.
+        """
+        appointments = await self.repository.query(
+            therapist_id=therapist_id,
+            patient_id=patient_id,
+            start=start,
+            end=end,
+            after=after,
+            limit=limit,
+        )
+        if therapist_id is None and patient_id is None:
+            series = await self.series.list()
+        else:
+            found = await self.series.find(
+                {therapist_id} if therapist_id else set(),
+                {patient_id} if patient_id else set(),
             )
+            series = [
+                a_series
+                for a_series in found
+                if (therapist_id is None or a_series.therapist_id == therapist_id)
+                and (patient_id is None or a_series.patient_id == patient_id)
+            ]
+        if not series:
+            return appointments
 
-        if patient_id:
-            appointments = list(
-                filter(lambda x: x.patient_id == patient_id, appointments)
+        if after is not None and (start is None or start < after[0]):
+            start = after[0]
+        if horizon is not None and (end is None or horizon < end):
+            end = horizon
+        occurrences = (
+            an_occurrence
+            for an_occurrence in merge(
+                *(a_series.occurrences(start, end) for a_series in series),
+                key=lambda an_occurrence: an_occurrence.key,
             )
-        if day:
-            appointments = list(
-                filter(lambda x: x.start_at.date() == day, appointments)
+            if after is None or an_occurrence.key > after
+        )
+        return list(
+            islice(
+                merge(
+                    appointments,
+                    occurrences,
+                    key=lambda an_appointment: an_appointment.key,
+                ),
+                limit,
             )
+        )
 
-        return appointments
+    @staticmethod
+    def _day_range(day: date | None) -> tuple[datetime | None, datetime | None]:
+        if not day:
+            return None, None
+        start = datetime.combine(day, time.min)
+        return start, start + timedelta(days=1)
 
 
 class UserService:
-
-    def __init__(self, repository: UserRepository) -> None:
-        self.secret_key: jwk.OctKey = jwk.import_key(
-            "shhhhush_say_nothing_this_is_my_secret_key", "oct"
-        )
+    def __init__(
+        self,
+        repository: UserRepository,
+        hasher: PasswordHasher | None = None,
+        keyring: KeyRing | None = None,
+        token_lifetime: timedelta = timedelta(hours=1),
+        admission: LoginAdmission | None = None,
+    ) -> None:
+        self.keyring: KeyRing = keyring or KeyRing.from_environment()
+        self.secret_key: jwk.OctKey = self.keyring.signing_key
         self.encoding_algorithm = "HS256"
+        self.token_lifetime = token_lifetime
         self.repository: UserRepository = repository
+        self.hasher: PasswordHasher = hasher or PasswordHasher()
+        self.admission = admission or LoginAdmission()
 
     async def encode_jwt_token(self, data: dict[str, Any]) -> str:
-        return jwt.encode(dict(alg=self.encoding_algorithm), data, self.secret_key)
+        header = dict(alg=self.encoding_algorithm, kid=self.secret_key.kid)
+        with JWT_SECONDS.time("encode"):
+            return jwt.encode(header, data, self.secret_key)
 
     async def create_user(
         self, firstname: str, lastname: str, email: str, password: str
     ) -> UUID:
+        if await self.repository.get_by_email(email) is not None:
+            raise EmailAlreadyUsedError
+
         salt = await User.generate_salt()
-        salted_password = salt + password
-        password_hash = await User.hash_password(salted_password)
+        password_hash = await self.hasher.hash(password, salt)
 
         new_user = User(
             id=uuid4(),
@@ -88,18 +509,161 @@ class UserService:
         await self.repository.save(new_user)
         return new_user.id
 
-    async def authenticate_user(self, email: str, password: str) -> str:
-        authenticated_user: User | None = None
-        for a_user in await self.repository.list():
-            if a_user.email == email:
-                authenticated_user = a_user
-                break
-        if not authenticated_user:
-            raise UserDontExistsError
-        salted_password = authenticated_user.salt + password
-        hashed_given_password = await User.hash_password(salted_password)
-        if hashed_given_password == authenticated_user.password_hash:
-            return await self.encode_jwt_token(
-                authenticated_user.model_dump(mode="json", exclude={"password_hash"})
+    async def import_users(
+        self, rows: AsyncIterable[Row], batch_size: int = 256
+    ) -> AsyncIterator[ImportResult]:
+        """Create a user per row, yielding one result per row, in row order.
+
+        Rows are taken ``batch_size`` at a time: a batch is validated, checked
+        for emails already used and hashed while the previous one is saved
+        with a single ``save_many``, so only two batches are ever held. At
+        most ``hasher.max_concurrency`` of the import's hashes wait for the
+        hasher at once, so a login or signup meanwhile queues behind one round
+        of them rather than behind the whole import.
+        """
+        unsaved: set[str] = set()
+        slots = asyncio.Semaphore(self.hasher.max_concurrency)
+        pending: asyncio.Task[Prepared] | None = None
+        preparing: asyncio.Task[Prepared] | None = None
+        try:
+            async for batch in _batches(rows, batch_size):
+                preparing = asyncio.create_task(self._prepare(batch, unsaved, slots))
+                if pending is not None:
+                    for a_result in await self._store(await pending, unsaved):
+                        yield a_result
+                pending = preparing
+            if pending is not None:
+                for a_result in await self._store(await pending, unsaved):
+                    yield a_result
+        finally:
+            for a_task in (pending, preparing):
+                if a_task is not None:
+                    a_task.cancel()
+
+    async def _prepare(
+        self,
+        batch: list[tuple[int, Row]],
+        unsaved: set[str],
+        slots: asyncio.Semaphore,
+    ) -> Prepared:
+        """Validate, check and hash the rows of ``batch``, reserving the emails
+        of new users in ``unsaved`` until ``_store`` has saved them."""
+        prepared: Prepared = []
+        new: list[tuple[int, UserImportRow]] = []
+        for number, a_row in batch:
+            result = ImportResult(row=number, status=ImportStatus.INVALID)
+            prepared.append((result, None))
+            row = self._import_row(a_row)
+            if isinstance(row, str):
+                result.detail = row
+                continue
+            email = User.normalize_email(row.email)
+            if (
+                email in unsaved
+                or await self.repository.get_by_email(email) is not None
+            ):
+                result.status = ImportStatus.DUPLICATE
+                continue
+            unsaved.add(email)
+            result.status = ImportStatus.CREATED
+            new.append((len(prepared) - 1, row))
+
+        async def create(row: UserImportRow) -> User:
+            salt = await User.generate_salt()
+            async with slots:
+                password_hash = await self.hasher.hash(row.password, salt)
+            return User(
+                id=uuid4(),
+                firstname=row.firstname,
+                lastname=row.lastname,
+                email=row.email,
+                password_hash=password_hash,
+                salt=salt,
+            )
+
+        users = await asyncio.gather(*(create(row) for _, row in new))
+        for (position, _), a_user in zip(new, users):
+            result = prepared[position][0]
+            result.user_id = a_user.id
+            prepared[position] = (result, a_user)
+        return prepared
+
+    @staticmethod
+    def _import_row(row: Row) -> UserImportRow | str:
+        """The validated row, or why it is invalid."""
+        if isinstance(row, ValueError):
+            return str(row)
+        try:
+            return UserImportRow.model_validate(row)
+        except ValidationError as error:
+            return "; ".join(
+                f"{'.'.join(map(str, x['loc']))}: {x['msg']}" for x in error.errors()
             )
-        raise WrongPasswordError
+
+    async def _store(self, prepared: Prepared, unsaved: set[str]) -> list[ImportResult]:
+        """Save the new users of a prepared batch at once, or one by one if
+        some email was taken meanwhile, reporting those as duplicates."""
+        users = [a_user for _, a_user in prepared if a_user is not None]
+        try:
+            await self.repository.save_many(users)
+        except EmailAlreadyUsedError:
+            for a_result, a_user in prepared:
+                if a_user is None:
+                    continue
+                try:
+                    await self.repository.save(a_user)
+                except EmailAlreadyUsedError:
+                    a_result.status = ImportStatus.DUPLICATE
+                    a_result.user_id = None
+        finally:
+            unsaved.difference_update(
+                User.normalize_email(a_user.email) for a_user in users
+            )
+        return [a_result for a_result, _ in prepared]
+
+    async def authenticate_user(
+        self, email: str, password: str, client: str | None = None
+    ) -> str:
+        """Issue a token for the user, if ``admission`` lets the attempt from
+        ``client`` through; raises ``TooManyLoginAttemptsError`` otherwise."""
+        email = User.normalize_email(email)
+        async with self.admission.admit(email, client):
+            authenticated_user = await self.repository.get_by_email(email)
+            if not authenticated_user:
+                raise UserDontExistsError
+            if not await self.hasher.verify(
+                password, authenticated_user.salt, authenticated_user.password_hash
+            ):
+                raise WrongPasswordError
+            self.admission.succeeded(email)
+
+            if self.hasher.needs_rehash(authenticated_user.password_hash):
+                authenticated_user.password_hash = await self.hasher.hash(
+                    password, authenticated_user.salt
+                )
+                await self.repository.save(authenticated_user)
+
+        issued_at = int(datetime.now().timestamp())
+        claims = authenticated_user.model_dump(mode="json", include=TOKEN_CLAIMS)
+        claims.update(
+            sub=str(authenticated_user.id),
+            iat=issued_at,
+            exp=issued_at + int(self.token_lifetime.total_seconds()),
+        )
+        return await self.encode_jwt_token(claims)
+
+
+async def _batches(
+    rows: AsyncIterable[Row], size: int
+) -> AsyncIterator[list[tuple[int, Row]]]:
+    """Lists of at most ``size`` rows, each numbered from 1."""
+    batch: list[tuple[int, Row]] = []
+    number = 0
+    async for a_row in rows:
+        number += 1
+        batch.append((number, a_row))
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
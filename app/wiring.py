@@ -0,0 +1,154 @@
+import os
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Callable
+
+from app.adapters import (
+    InMemoryAppointmentRepository,
+    InMemorySeriesRepository,
+    InMemoryUserRepository,
+    ShardedAppointmentRepository,
+    SQLiteAppointmentRepository,
+    SQLiteDatabase,
+    SQLiteSeriesRepository,
+    SQLiteUserRepository,
+)
+from app.adapters.journal import (
+    Journal,
+    JournaledAppointmentRepository,
+    JournaledSeriesRepository,
+    JournaledUserRepository,
+)
+from app.domain import AppointmentRepository, SeriesRepository, UserRepository
+
+
+@dataclass
+class Repositories:
+    appointments: AppointmentRepository
+    users: UserRepository
+    series: SeriesRepository
+
+
+type RepositoryFactory = Callable[[], AbstractAsyncContextManager[Repositories]]
+
+
+@asynccontextmanager
+async def in_memory() -> AsyncIterator[Repositories]:
+    yield Repositories(
+        InMemoryAppointmentRepository(),
+        InMemoryUserRepository(),
+        InMemorySeriesRepository(),
+    )
+
+
+def sharded(shards: int) -> RepositoryFactory:
+    """In-memory repositories, with appointments spread over ``shards``
+    repositories by therapist."""
+
+    @asynccontextmanager
+    async def factory() -> AsyncIterator[Repositories]:
+        yield Repositories(
+            ShardedAppointmentRepository(
+                {f"shard-{i}": InMemoryAppointmentRepository() for i in range(shards)}
+            ),
+            InMemoryUserRepository(),
+            InMemorySeriesRepository(),
+        )
+
+    return factory
+
+
+def sqlite(path: str | Path) -> RepositoryFactory:
+    """Repositories sharing the SQLite database at ``path``, closed on exit."""
+
+    @asynccontextmanager
+    async def factory() -> AsyncIterator[Repositories]:
+        database = SQLiteDatabase(path)
+        try:
+            yield Repositories(
+                SQLiteAppointmentRepository(database),
+                SQLiteUserRepository(database),
+                SQLiteSeriesRepository(database),
+            )
+        finally:
+            database.close()
+
+    return factory
+
+
+def snapshot(path: str | Path) -> RepositoryFactory:
+    """In-memory repositories restored from the snapshot at ``path``, if there
+    is one, and dumped back to it on exit.
+
+    Appointments are kept in columns, which load by mapping the file rather
+    than by rebuilding millions of objects. Needs the ``columnar`` extra.
+    """
+
+    @asynccontextmanager
+    async def factory() -> AsyncIterator[Repositories]:
+        from app.adapters.snapshot import Snapshot, dump, load
+
+        stores = await load(path) if os.path.exists(path) else Snapshot()
+        try:
+            yield Repositories(stores.appointments, stores.users, stores.series)
+        finally:
+            await dump(path, stores)
+
+    return factory
+
+
+def journaled(directory: str | Path) -> RepositoryFactory:
+    """In-memory repositories replaying, then appending to, one journal each
+    in ``directory``; the journals are flushed and closed on exit."""
+
+    @asynccontextmanager
+    async def factory() -> AsyncIterator[Repositories]:
+        os.makedirs(directory, exist_ok=True)
+        journals = [
+            Journal(Path(directory) / f"{name}.journal")
+            for name in ("appointments", "users", "series")
+        ]
+        repositories = (
+            JournaledAppointmentRepository(
+                InMemoryAppointmentRepository(), journals[0]
+            ),
+            JournaledUserRepository(InMemoryUserRepository(), journals[1]),
+            JournaledSeriesRepository(InMemorySeriesRepository(), journals[2]),
+        )
+        for a_repository in repositories:
+            await a_repository.replay()
+        try:
+            yield Repositories(*repositories)
+        finally:
+            for a_journal in journals:
+                await a_journal.close()
+
+    return factory
+
+
+def from_environment() -> RepositoryFactory:
+    """SQLite when ``KIN_SQLITE_PATH`` is set, else snapshots when
+    ``KIN_SNAPSHOT_PATH`` is, else journals when ``KIN_JOURNAL_DIR`` is, else
+    in-memory repositories, with appointments sharded when ``KIN_SHARDS`` is
+    set to more than one."""
+    if path := os.environ.get("KIN_SQLITE_PATH"):
+        return sqlite(path)
+    if path := os.environ.get("KIN_SNAPSHOT_PATH"):
+        return snapshot(path)
+    if path := os.environ.get("KIN_JOURNAL_DIR"):
+        return journaled(path)
+    if (shards := _shard_count()) > 1:
+        return sharded(shards)
+    return in_memory
+
+
+def _shard_count() -> int:
+    value = os.environ.get("KIN_SHARDS", "1")
+    try:
+        shards = int(value)
+    except ValueError:
+        shards = 0
+    if shards < 1:
+        raise ValueError(f"KIN_SHARDS must be a positive whole number, not {value!r}")
+    return shards
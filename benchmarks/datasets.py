@@ -0,0 +1,106 @@
+"""Seeded, reproducible users and appointments for the benchmarks.
+
+The same ``seed`` always yields the same ids, names and slots; only the
+calendar is anchored on tomorrow so every generated appointment validates as
+a future one. Appointments never overlap for a therapist nor for a patient.
+"""
+
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Iterator
+from uuid import UUID
+
+from app.domain import Appointment, AppointmentRepository, User, UserRepository
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+SLOT = timedelta(hours=1)
+CHUNK = 10_000
+SAMPLE_SIZE = 1_000
+
+
+@dataclass
+class Dataset:
+
+    therapists: list[User]
+    patients: list[User]
+    start: datetime
+    horizon: datetime
+    sample: list[Appointment] = field(default_factory=list)
+
+
+def seeded_uuid(rng: random.Random) -> UUID:
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+def make_users(rng: random.Random, count: int, role: str) -> list[User]:
+    return [
+        User(
+            id=seeded_uuid(rng),
+            firstname=role.capitalize(),
+            lastname=f"N{i}",
+            email=f"{role}{i}@bench.com",
+            password_hash=rng.randbytes(64),
+            salt=rng.randbytes(16).hex(),
+        )
+        for i in range(count)
+    ]
+
+
+def make_appointments(
+    rng: random.Random,
+    therapists: list[User],
+    patients: list[User],
+    count: int,
+    start: datetime,
+) -> Iterator[Appointment]:
+    """Yield ``count`` appointments filling one-hour slots therapist by therapist.
+
+    The ``i``-th appointment takes slot ``i // len(therapists)``, so the
+    therapists of one slot are all different, and so are its patients as long
+    as there are at least as many patients as therapists.
+    """
+    assert len(patients) >= len(therapists)
+    for i in range(count):
+        yield Appointment(
+            id=seeded_uuid(rng),
+            title="bench",
+            start_at=start + SLOT * (i // len(therapists)),
+            therapist_id=therapists[i % len(therapists)].id,
+            patient_id=patients[i % len(patients)].id,
+        )
+
+
+async def populate(
+    appointments: AppointmentRepository,
+    users: UserRepository,
+    count: int,
+    seed: int = 0,
+) -> Dataset:
+    """Fill both repositories with ``count`` appointments and their users.
+
+    There is one therapist per thousand appointments (at least ten) and one
+    patient per ten. An evenly spread sample of the appointments is kept to
+    pick realistic filters from.
+    """
+    rng = random.Random(seed)
+    therapists = make_users(rng, max(count // 1_000, 10), "therapist")
+    patients = make_users(rng, max(count // 10, len(therapists)), "patient")
+    for a_user in therapists + patients:
+        await users.save(a_user)
+
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start += timedelta(days=1)
+    dataset = Dataset(
+        therapists=therapists,
+        patients=patients,
+        start=start,
+        horizon=start + SLOT * -(-count // len(therapists)),
+    )
+    every = max(count // SAMPLE_SIZE, 1)
+    generated = make_appointments(rng, therapists, patients, count, start)
+    for chunk in range(0, count, CHUNK):
+        batch = [next(generated) for _ in range(min(CHUNK, count - chunk))]
+        dataset.sample += batch[-chunk % every :: every]
+        await appointments.save_many(batch)
+    return dataset
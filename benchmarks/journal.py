@@ -0,0 +1,101 @@
+"""Commit latency and fsync count of journaled saves under concurrent load.
+
+Runs ``--saves`` appointment saves on a journaled in-memory repository,
+``--concurrency`` at a time, once per ``--max-delay`` setting (milliseconds),
+in a temporary directory. Reports saves per second, the number of fsyncs
+and the p50, p95 and p99 time for a save to be durable, in milliseconds.
+
+    uv run python -m benchmarks.journal --saves 20000 --concurrency 256
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from app.adapters import InMemoryAppointmentRepository
+from app.adapters.journal import Journal, JournaledAppointmentRepository
+from app.domain import Appointment
+
+from .datasets import seeded_uuid
+
+
+def percentile(timings: list[float], fraction: float) -> float:
+    return timings[max(int(len(timings) * fraction) - 1, 0)]
+
+
+async def run(
+    saves: int, concurrency: int, max_delay_ms: float, directory: Path
+) -> dict[str, Any]:
+    rng = random.Random(0)
+    start = datetime.now() + timedelta(days=1)
+    appointments = [
+        Appointment(
+            id=seeded_uuid(rng),
+            title="bench",
+            start_at=start + timedelta(minutes=i),
+            therapist_id=seeded_uuid(rng),
+            patient_id=seeded_uuid(rng),
+        )
+        for i in range(saves)
+    ]
+    journal = Journal(
+        directory / f"delay-{max_delay_ms}.journal", max_delay=max_delay_ms / 1000
+    )
+    repository = JournaledAppointmentRepository(
+        InMemoryAppointmentRepository(), journal
+    )
+    await repository.replay()
+
+    timings: list[float] = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def save(appointment: Appointment) -> None:
+        async with slots:
+            before = time.perf_counter()
+            await repository.save(appointment)
+            timings.append((time.perf_counter() - before) * 1000)
+
+    before = time.perf_counter()
+    await asyncio.gather(*(save(an_appointment) for an_appointment in appointments))
+    elapsed = time.perf_counter() - before
+    await journal.close()
+
+    timings.sort()
+    return dict(
+        max_delay_ms=max_delay_ms,
+        saves_per_second=saves / elapsed,
+        fsyncs=journal.fsyncs,
+        saves_per_fsync=saves / journal.fsyncs,
+        p50_ms=statistics.median(timings),
+        p95_ms=percentile(timings, 0.95),
+        p99_ms=percentile(timings, 0.99),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--saves", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument(
+        "--max-delay", type=float, nargs="+", default=[0.0, 0.5, 1.0, 2.0]
+    )
+    arguments = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        results = [
+            asyncio.run(
+                run(arguments.saves, arguments.concurrency, delay, Path(directory))
+            )
+            for delay in arguments.max_delay
+        ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""Load test of the HTTP API, reporting latency percentiles per route.
+
+Sends a weighted ``--mix`` of signup, login, list and book requests for
+``--duration`` seconds, either open loop at ``--rate`` requests per second,
+whatever the latency, or closed loop from ``--concurrency`` clients that each
+send their next request once the last one is answered. At a rate, latency is
+counted from when a request was due rather than when it was sent, so a
+server falling behind shows as latency instead of a lower rate.
+
+The application runs in process behind an ASGI transport by default, going
+through its own lifespan, so the ``KIN_*`` variables choose the repositories.
+There the per-email and per-client login limits are lifted, since every
+request comes from one client, but logins beyond the hashing capacity are
+still shed with a 429. ``--uvicorn`` starts a local server to load over the
+network instead, and ``--url`` loads one already running; those keep every
+login limit as configured.
+
+The report gives, per route and overall, the request count, the throughput,
+the p50, p95, p99 and max latency in microseconds and the errors by status.
+It is JSON, written to ``--output``, and ``--compare`` checks it against an
+earlier one as ``benchmarks.suite`` does.
+
+    uv run python -m benchmarks.load --rate 500 --output before.json
+    uv run python -m benchmarks.load --rate 500 --compare before.json
+    uv run python -m benchmarks.load --concurrency 64 --uvicorn
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import secrets
+import socket
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Coroutine
+from uuid import UUID, uuid4
+
+import httpx
+
+from app import main as api
+from app.admission import LoginAdmission, TokenBuckets
+
+from .datasets import SLOT
+from .journal import percentile
+from .suite import PASSWORD, compare
+
+ROUTES = {
+    "signup": "POST /signup",
+    "login": "POST /login",
+    "list": "GET /appointments",
+    "book": "POST /appointments/batch",
+}
+
+type Send = Callable[[str, float | None], Coroutine[Any, Any, None]]
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """Read ``kind=weight`` pairs, comma separated, such as ``list=8,book=2``."""
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        if kind.strip() not in ROUTES:
+            raise argparse.ArgumentTypeError(
+                f"unknown request {kind.strip()!r}, expected one of {', '.join(ROUTES)}"
+            )
+        try:
+            mix[kind.strip()] = float(weight or 1)
+        except ValueError as error:
+            raise argparse.ArgumentTypeError(f"invalid weight in {item!r}") from error
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs a positive weight")
+    return mix
+
+
+class Workload:
+    """The requests of the mix, made on behalf of ``users`` signed-up users.
+
+    Bookings go to ``therapists`` in turn, one slot further each round, so
+    they never conflict; the therapists are new on every run, so runs
+    against the same server do not conflict either.
+    """
+
+    def __init__(
+        self, client: httpx.AsyncClient, users: int, therapists: int, seed: int
+    ) -> None:
+        self.client = client
+        self.rng = random.Random(seed)
+        self.run = secrets.token_hex(4)
+        self.emails = [f"load-{self.run}-{i}@bench.com" for i in range(users)]
+        self.therapists = [uuid4() for _ in range(therapists)]
+        self.patients: dict[UUID, UUID] = {x: uuid4() for x in self.therapists}
+        self.start = datetime.now().replace(minute=0, second=0, microsecond=0)
+        self.start += timedelta(days=1)
+        self.signups = itertools.count()
+        self.slots = itertools.count()
+
+    async def setup(self) -> None:
+        """Sign the users up and log the first one in for the other routes."""
+        for an_email in self.emails:
+            response = await self.client.post("/signup", json=self._signup(an_email))
+            response.raise_for_status()
+        response = await self.client.post(
+            "/login", data=dict(username=self.emails[0], password=PASSWORD)
+        )
+        response.raise_for_status()
+        token = response.json()["access_token"]
+        self.client.headers["Authorization"] = f"Bearer {token}"
+
+    async def request(self, kind: str) -> httpx.Response:
+        if kind == "signup":
+            email = f"load-{self.run}-new{next(self.signups)}@bench.com"
+            return await self.client.post("/signup", json=self._signup(email))
+        if kind == "login":
+            login = dict(username=self.rng.choice(self.emails), password=PASSWORD)
+            return await self.client.post("/login", data=login)
+        if kind == "list":
+            therapist = self.rng.choice(self.therapists)
+            return await self.client.get(
+                "/appointments", params=dict(therapist_id=str(therapist))
+            )
+        slot = next(self.slots)
+        therapist = self.therapists[slot % len(self.therapists)]
+        booking = dict(
+            title="load",
+            start_at=(self.start + SLOT * (slot // len(self.therapists))).isoformat(),
+            therapist_id=str(therapist),
+            patient_id=str(self.patients[therapist]),
+        )
+        return await self.client.post(
+            "/appointments/batch", json=dict(appointments=[booking])
+        )
+
+    @staticmethod
+    def _signup(email: str) -> dict[str, str]:
+        return dict(email=email, firstname="Load", lastname="User", password=PASSWORD)
+
+
+class Recorder:
+    """Latencies in microseconds and error counts, by route."""
+
+    def __init__(self) -> None:
+        self.latencies: defaultdict[str, list[float]] = defaultdict(list)
+        self.errors: defaultdict[str, Counter[str]] = defaultdict(Counter)
+
+    def record(self, route: str, latency: float, error: str | None) -> None:
+        self.latencies[route].append(latency * 1_000_000)
+        if error is not None:
+            self.errors[route][error] += 1
+
+    def report(self, elapsed: float) -> dict[str, dict[str, Any]]:
+        results = {
+            route: self._summary(timings, self.errors[route], elapsed)
+            for route, timings in sorted(self.latencies.items())
+        }
+        everything = [x for timings in self.latencies.values() for x in timings]
+        errors: Counter[str] = sum(self.errors.values(), Counter())
+        results["total"] = self._summary(everything, errors, elapsed)
+        return results
+
+    @staticmethod
+    def _summary(
+        timings: list[float], errors: Counter[str], elapsed: float
+    ) -> dict[str, Any]:
+        timings = sorted(timings)
+        return dict(
+            requests=len(timings),
+            throughput_rps=len(timings) / elapsed,
+            p50_us=percentile(timings, 0.50),
+            p95_us=percentile(timings, 0.95),
+            p99_us=percentile(timings, 0.99),
+            max_us=timings[-1],
+            errors=dict(sorted(errors.items())),
+        )
+
+
+async def at_rate(
+    send: Send, choose: Callable[[], str], rate: float, duration: float
+) -> None:
+    """Start a request every ``1 / rate`` seconds, without waiting for any."""
+    running: set[asyncio.Task[None]] = set()
+    started = time.perf_counter()
+    for n in range(round(rate * duration)):
+        due = started + n / rate
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(send(choose(), due))
+        running.add(task)
+        task.add_done_callback(running.discard)
+    await asyncio.gather(*running)
+
+
+async def closed_loop(
+    send: Send, choose: Callable[[], str], concurrency: int, duration: float
+) -> None:
+    """Keep ``concurrency`` requests in flight until ``duration`` is over."""
+    deadline = time.perf_counter() + duration
+
+    async def client() -> None:
+        while time.perf_counter() < deadline:
+            await send(choose(), None)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+
+@asynccontextmanager
+async def in_process() -> AsyncIterator[httpx.AsyncClient]:
+    async with api.lifespan()(api.app):
+        # Every login comes from the same client, which must not be throttled.
+        admission = api.app.state.user_service.admission
+        api.app.state.user_service.admission = LoginAdmission(
+            per_email=TokenBuckets(rate=1_000_000, burst=1_000_000),
+            per_client=TokenBuckets(rate=1_000_000, burst=1_000_000),
+            max_in_flight=admission.max_in_flight,
+        )
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://load"
+        ) as client:
+            yield client
+
+
+@asynccontextmanager
+async def over_network(url: str) -> AsyncIterator[httpx.AsyncClient]:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        yield client
+
+
+@asynccontextmanager
+async def uvicorn_server() -> AsyncIterator[str]:
+    """Start ``app.main:app`` under uvicorn on a free local port."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = await asyncio.create_subprocess_exec(
+        sys.executable,
+        *("-m", "uvicorn", "app.main:app"),
+        *("--port", str(port), "--log-level", "warning"),
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=url) as client:
+            for _ in range(300):
+                if server.returncode is not None:
+                    raise RuntimeError("uvicorn exited before serving")
+                try:
+                    await client.get("/metrics")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not start serving in 30 s")
+        yield url
+    finally:
+        server.terminate()
+        await server.wait()
+
+
+async def run(arguments: argparse.Namespace) -> dict[str, Any]:
+    async with AsyncExitStack() as stack:
+        if arguments.url:
+            target = arguments.url
+        elif arguments.uvicorn:
+            target = await stack.enter_async_context(uvicorn_server())
+        else:
+            target = "in-process"
+        client = await stack.enter_async_context(
+            in_process() if target == "in-process" else over_network(target)
+        )
+        workload = Workload(
+            client, arguments.users, arguments.therapists, arguments.seed
+        )
+        await workload.setup()
+
+        recorder = Recorder()
+
+        async def send(kind: str, due: float | None) -> None:
+            before = time.perf_counter() if due is None else due
+            error = None
+            try:
+                response = await workload.request(kind)
+                if response.is_error:
+                    error = str(response.status_code)
+            except httpx.HTTPError as exception:
+                error = type(exception).__name__
+            recorder.record(ROUTES[kind], time.perf_counter() - before, error)
+
+        kinds: list[str] = list(arguments.mix)
+        weights: list[float] = list(arguments.mix.values())
+        rng = random.Random(arguments.seed)
+
+        def choose() -> str:
+            return rng.choices(kinds, weights)[0]
+
+        started = time.perf_counter()
+        if arguments.concurrency:
+            await closed_loop(send, choose, arguments.concurrency, arguments.duration)
+        else:
+            await at_rate(send, choose, arguments.rate, arguments.duration)
+        elapsed = time.perf_counter() - started
+
+    return dict(
+        meta=dict(
+            target=target,
+            rate=None if arguments.concurrency else arguments.rate,
+            concurrency=arguments.concurrency,
+            duration=arguments.duration,
+            mix=arguments.mix,
+            seed=arguments.seed,
+            python=platform.python_version(),
+            machine=platform.machine(),
+            cores=os.cpu_count() or 1,
+            date=datetime.now().isoformat(timespec="seconds"),
+        ),
+        results=recorder.report(elapsed),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--mix", type=parse_mix, default=parse_mix("list=8,book=2,login=1,signup=1")
+    )
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--rate", type=float, default=200.0, help="requests per second")
+    load.add_argument("--concurrency", type=int, help="clients in a closed loop")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    server = parser.add_mutually_exclusive_group()
+    server.add_argument("--url", help="load the server at this base URL")
+    server.add_argument(
+        "--uvicorn", action="store_true", help="start a local uvicorn to load"
+    )
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--therapists", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, metavar="BASELINE")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    arguments = parser.parse_args()
+
+    current = asyncio.run(run(arguments))
+    report = json.dumps(current, indent=2)
+    if arguments.output:
+        arguments.output.write_text(report + "\n")
+    else:
+        print(report)
+
+    if arguments.compare:
+        baseline = json.loads(arguments.compare.read_text())
+        regressions = compare(baseline, current, arguments.tolerance)
+        for a_regression in regressions:
+            print(f"REGRESSION {a_regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Login throughput versus appointment-listing latency.
+
+Runs ``--logins`` concurrent ``authenticate_user`` calls with the hasher capped
+at ``--concurrency`` while another task keeps listing a therapist's day, and
+reports logins per second alongside the listing latency seen meanwhile.
+
+    uv run python -m benchmarks.login_throughput --concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from app.adapters import InMemoryAppointmentRepository, InMemoryUserRepository
+from app.admission import LoginAdmission, TokenBuckets
+from app.domain import Appointment
+from app.passwords import PasswordHasher
+from app.service import AppointmentController, UserService
+
+
+async def run(logins: int, users: int, concurrency: int) -> dict[str, float]:
+    # Admit every login at once: this measures the hasher, not the throttling.
+    user_service = UserService(
+        InMemoryUserRepository(),
+        PasswordHasher(max_concurrency=concurrency),
+        admission=LoginAdmission(
+            per_email=TokenBuckets(rate=1, burst=logins), max_in_flight=logins
+        ),
+    )
+    emails = [f"user{i}@bench.com" for i in range(users)]
+    for email in emails:
+        await user_service.create_user("Bench", "User", email, "password")
+
+    appointments = InMemoryAppointmentRepository()
+    therapist_id = uuid4()
+    start = datetime.now() + timedelta(days=1)
+    for i in range(1000):
+        await appointments.save(
+            Appointment(
+                id=uuid4(),
+                title="bench",
+                start_at=start + timedelta(hours=i),
+                therapist_id=therapist_id,
+                patient_id=uuid4(),
+            )
+        )
+    controller = AppointmentController(appointments)
+
+    listing_latencies: list[float] = []
+    done = asyncio.Event()
+
+    async def list_agenda() -> None:
+        while not done.is_set():
+            before = time.perf_counter()
+            await controller.get_all_appointments(
+                therapist_id=therapist_id, day=start.date()
+            )
+            listing_latencies.append(time.perf_counter() - before)
+            await asyncio.sleep(0.001)
+
+    lister = asyncio.create_task(list_agenda())
+    before = time.perf_counter()
+    await asyncio.gather(
+        *(
+            user_service.authenticate_user(emails[i % users], "password")
+            for i in range(logins)
+        )
+    )
+    elapsed = time.perf_counter() - before
+    done.set()
+    await lister
+    user_service.hasher.close()
+
+    listing_latencies.sort()
+    return dict(
+        concurrency=concurrency,
+        cores=os.cpu_count() or 1,
+        logins_per_second=logins / elapsed,
+        logins_per_second_per_worker=logins / elapsed / concurrency,
+        listing_p50_ms=statistics.median(listing_latencies) * 1000,
+        listing_max_ms=listing_latencies[-1] * 1000,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 1)
+    arguments = parser.parse_args()
+    result = asyncio.run(run(arguments.logins, arguments.users, arguments.concurrency))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Overhead of the instrumentation, to check it can stay on.
+
+Times a histogram observation on its own, a therapist's daily agenda query
+on ``--appointments`` appointments with and without the instrumented
+repository wrapper, and a trivial FastAPI route with and without the metrics
+middleware. Reports medians in microseconds and the added cost.
+
+    uv run python -m benchmarks.metrics --appointments 100000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+import httpx
+from fastapi import FastAPI
+
+from app.adapters import InMemoryAppointmentRepository, InMemoryUserRepository
+from app.adapters.instrumented import InstrumentedAppointmentRepository
+from app.domain import AppointmentRepository
+from app.metrics import Histogram, MetricsMiddleware
+
+from .datasets import populate
+
+
+async def compare(
+    plain: Callable[[], Awaitable[object]],
+    instrumented: Callable[[], Awaitable[object]],
+    repeat: int,
+) -> dict[str, float]:
+    """Median of each call, interleaving them, each going first every other
+    round, so both see the same warm-up, caches and background noise."""
+    calls: list[tuple[Callable[[], Awaitable[object]], list[float]]] = [
+        (plain, []),
+        (instrumented, []),
+    ]
+    timings: list[list[float]] = [spent for _, spent in calls]
+    for _ in range(repeat):
+        for call, spent in calls:
+            before = time.perf_counter()
+            await call()
+            spent.append((time.perf_counter() - before) * 1_000_000)
+        calls.reverse()
+    plain_us, instrumented_us = map(statistics.median, timings)
+    return dict(
+        plain_us=plain_us,
+        instrumented_us=instrumented_us,
+        added_us=instrumented_us - plain_us,
+        added_percent=(instrumented_us / plain_us - 1) * 100,
+    )
+
+
+async def run(count: int, repeat: int) -> dict[str, dict[str, float]]:
+    histogram = Histogram("bench_seconds", "Bench.", ("label",))
+    before = time.perf_counter()
+    for _ in range(100_000):
+        histogram.observe(0.001, "a")
+    observe_us = (time.perf_counter() - before) * 10
+
+    repository = InMemoryAppointmentRepository()
+    dataset = await populate(repository, InMemoryUserRepository(), count)
+    instrumented = InstrumentedAppointmentRepository(repository)
+
+    def agenda(on: AppointmentRepository) -> Callable[[], Awaitable[object]]:
+        rng = random.Random(0)
+
+        async def call() -> object:
+            picked = rng.choice(dataset.sample)
+            day = picked.start_at.replace(hour=0)
+            return await on.query(
+                therapist_id=picked.therapist_id,
+                start=day,
+                end=day + timedelta(days=1),
+            )
+
+        return call
+
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping() -> dict[str, str]:
+        return dict(status="ok")
+
+    plain_client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench"
+    )
+    instrumented_client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=MetricsMiddleware(app, histogram)),
+        base_url="http://bench",
+    )
+    async with plain_client, instrumented_client:
+        http_route = await compare(
+            lambda: plain_client.get("/ping"),
+            lambda: instrumented_client.get("/ping"),
+            repeat,
+        )
+
+    return dict(
+        histogram_observe=dict(instrumented_us=observe_us),
+        repository_query=await compare(
+            agenda(repository), agenda(instrumented), repeat
+        ),
+        http_route=http_route,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=2_000)
+    arguments = parser.parse_args()
+    result = asyncio.run(run(arguments.appointments, arguments.repeat))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
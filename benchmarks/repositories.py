@@ -0,0 +1,211 @@
+"""Latency of the repository adapters side by side.
+
+Fills each repository with ``--appointments`` appointments spread over
+``--therapists`` therapists and ``--users`` users, then times the calls the
+services make, reporting the median and p95 per call in microseconds. The
+in-memory backends also report the bytes they hold per appointment.
+
+    uv run --extra columnar python -m benchmarks.repositories --appointments 100000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable
+from uuid import UUID, uuid4
+
+from app.adapters import (
+    InMemoryAppointmentRepository,
+    InMemoryUserRepository,
+    SQLiteAppointmentRepository,
+    SQLiteDatabase,
+    SQLiteUserRepository,
+)
+from app.domain import Appointment, AppointmentRepository, User, UserRepository
+
+CHUNK = 10_000
+
+
+async def measure(
+    call: Callable[[], Awaitable[object]], repeat: int
+) -> dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        before = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - before) * 1_000_000)
+    timings.sort()
+    return dict(
+        p50_us=statistics.median(timings),
+        p95_us=timings[int(len(timings) * 0.95) - 1],
+    )
+
+
+async def fill(
+    appointments: AppointmentRepository,
+    users: UserRepository,
+    appointment_count: int,
+    therapist_count: int,
+    user_count: int,
+) -> tuple[list[UUID], list[str], datetime]:
+    therapists = [uuid4() for _ in range(therapist_count)]
+    start = datetime.now().replace(minute=0, second=0, microsecond=0)
+    start += timedelta(days=1)
+    for chunk in range(0, appointment_count, CHUNK):
+        await appointments.save_many(
+            Appointment(
+                id=uuid4(),
+                title="bench",
+                start_at=start + timedelta(hours=i // therapist_count),
+                therapist_id=therapists[i % therapist_count],
+                patient_id=uuid4(),
+            )
+            for i in range(chunk, min(chunk + CHUNK, appointment_count))
+        )
+    emails = [f"user{i}@bench.com" for i in range(user_count)]
+    for email in emails:
+        await users.save(
+            User(
+                id=uuid4(),
+                firstname="Bench",
+                lastname="User",
+                email=email,
+                password_hash=b"hash",
+                salt="salt",
+            )
+        )
+    return therapists, emails, start
+
+
+async def bench(
+    name: str,
+    appointments: AppointmentRepository,
+    users: UserRepository,
+    arguments: argparse.Namespace,
+) -> dict[str, dict[str, float]]:
+    therapists, emails, start = await fill(
+        appointments,
+        users,
+        arguments.appointments,
+        arguments.therapists,
+        arguments.users,
+    )
+    hours = arguments.appointments // arguments.therapists
+    random.seed(7)
+
+    def a_day() -> datetime:
+        return start + timedelta(hours=random.randrange(hours))
+
+    async def daily_agenda() -> None:
+        day = a_day().replace(hour=0)
+        await appointments.query(
+            therapist_id=random.choice(therapists),
+            start=day,
+            end=day + timedelta(days=1),
+        )
+
+    async def overlap_check() -> None:
+        at = a_day()
+        await appointments.find_overlapping(
+            {random.choice(therapists)}, {uuid4()}, at, at + timedelta(minutes=30)
+        )
+
+    async def email_lookup() -> None:
+        await users.get_by_email(random.choice(emails))
+
+    async def save() -> None:
+        await appointments.save(
+            Appointment(
+                id=uuid4(),
+                title="bench",
+                start_at=a_day(),
+                therapist_id=uuid4(),
+                patient_id=uuid4(),
+            )
+        )
+
+    results = {}
+    for call in (daily_agenda, overlap_check, email_lookup, save):
+        results[call.__name__] = await measure(call, arguments.repeat)
+    print(f"{name}: done", flush=True)
+    return results
+
+
+async def bytes_per_appointment(
+    repository: Callable[[], AppointmentRepository], count: int
+) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    filled = repository()
+    await fill(filled, InMemoryUserRepository(), count, 10, 0)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+async def run(arguments: argparse.Namespace) -> dict[str, dict[str, dict[str, float]]]:
+    results = {}
+    if "memory" in arguments.backends:
+        results["memory"] = await bench(
+            "memory",
+            InMemoryAppointmentRepository(),
+            InMemoryUserRepository(),
+            arguments,
+        )
+        results["memory"]["footprint"] = dict(
+            bytes_per_appointment=await bytes_per_appointment(
+                InMemoryAppointmentRepository, arguments.footprint_sample
+            )
+        )
+    if "sqlite" in arguments.backends:
+        with tempfile.TemporaryDirectory() as directory:
+            database = SQLiteDatabase(Path(directory) / "bench.sqlite3")
+            results["sqlite"] = await bench(
+                "sqlite",
+                SQLiteAppointmentRepository(database),
+                SQLiteUserRepository(database),
+                arguments,
+            )
+            database.close()
+    if "columnar" in arguments.backends:
+        from app.adapters.columnar import ColumnarAppointmentRepository
+
+        results["columnar"] = await bench(
+            "columnar",
+            ColumnarAppointmentRepository(),
+            InMemoryUserRepository(),
+            arguments,
+        )
+        results["columnar"]["footprint"] = dict(
+            bytes_per_appointment=await bytes_per_appointment(
+                ColumnarAppointmentRepository, arguments.footprint_sample
+            )
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=10_000)
+    parser.add_argument("--therapists", type=int, default=50)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--footprint-sample", type=int, default=20_000)
+    parser.add_argument(
+        "--backends",
+        type=lambda value: value.split(","),
+        default=["memory", "sqlite", "columnar"],
+        help="comma separated subset of memory,sqlite,columnar",
+    )
+    print(json.dumps(asyncio.run(run(parser.parse_args())), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Cost of turning a listing of ``--appointments`` appointments into JSON.
+
+Compares the path FastAPI takes for a route returning ``AppointmentsResponse``
+(validate the model against the response field, then dump it) with
+``AppointmentEncoder``, both on a cold cache and once every appointment's
+bytes are cached. Reports the median and p95 in milliseconds.
+
+    uv run python -m benchmarks.serialization --appointments 10000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+from uuid import uuid4
+
+from fastapi.routing import APIRoute, serialize_response
+
+from app import main as api
+from app.domain import Appointment
+from app.serialization import AppointmentEncoder
+
+
+def measure(call: Callable[[], object], repeat: int) -> dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        before = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - before) * 1000)
+    timings.sort()
+    return dict(
+        p50_ms=statistics.median(timings),
+        p95_ms=timings[max(int(len(timings) * 0.95) - 1, 0)],
+    )
+
+
+def run(count: int, repeat: int) -> dict[str, dict[str, float]]:
+    start = datetime.now() + timedelta(days=1)
+    appointments = [
+        Appointment(
+            id=uuid4(),
+            title="bench",
+            start_at=start + timedelta(hours=i),
+            therapist_id=uuid4(),
+            patient_id=uuid4(),
+        )
+        for i in range(count)
+    ]
+    (route,) = (
+        a_route
+        for a_route in api.app.routes
+        if isinstance(a_route, APIRoute) and a_route.path == "/appointments"
+    )
+
+    def response_model() -> None:
+        asyncio.run(
+            serialize_response(
+                field=route.response_field,
+                response_content=api.AppointmentsResponse(appointments=appointments),
+                exclude_none=True,
+                dump_json=True,
+            )
+        )
+
+    def encoder_cold() -> None:
+        AppointmentEncoder().encode_page(appointments)
+
+    warm = AppointmentEncoder()
+    warm.encode_page(appointments)
+
+    def encoder_warm() -> None:
+        warm.encode_page(appointments)
+
+    return {
+        call.__name__: measure(call, repeat)
+        for call in (response_model, encoder_cold, encoder_warm)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    arguments = parser.parse_args()
+    print(json.dumps(run(arguments.appointments, arguments.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
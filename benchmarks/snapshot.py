@@ -0,0 +1,72 @@
+"""Warm start from a snapshot versus rebuilding the store.
+
+Fills a columnar store with ``--appointments`` seeded appointments, dumps it,
+then times loading the snapshot and answering a first therapist agenda query
+from it, against rebuilding the same store from the appointment objects
+(what a restart without a snapshot would do at best, having read them from
+somewhere already). Reports seconds and the snapshot size.
+
+    uv run python -m benchmarks.snapshot --appointments 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from app.adapters import InMemoryUserRepository
+from app.adapters.columnar import ColumnarAppointmentRepository
+from app.adapters.snapshot import Snapshot, dump, load
+
+from .datasets import populate
+
+
+async def run(count: int) -> dict[str, float]:
+    snapshot = Snapshot()
+    dataset = await populate(snapshot.appointments, InMemoryUserRepository(), count)
+    picked = dataset.sample[0]
+    appointments = await snapshot.appointments.list()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "kin.snapshot"
+        before = time.perf_counter()
+        await dump(path, snapshot)
+        dump_seconds = time.perf_counter() - before
+
+        before = time.perf_counter()
+        loaded = await load(path)
+        load_seconds = time.perf_counter() - before
+        day = picked.start_at.replace(hour=0)
+        found = await loaded.appointments.query(
+            therapist_id=picked.therapist_id, start=day, end=day + timedelta(days=1)
+        )
+        first_query_seconds = time.perf_counter() - before - load_seconds
+        assert picked in found
+
+        before = time.perf_counter()
+        rebuilt = ColumnarAppointmentRepository()
+        await rebuilt.save_many(appointments)
+        rebuild_seconds = time.perf_counter() - before
+
+        return dict(
+            appointments=count,
+            snapshot_mb=path.stat().st_size / 1e6,
+            dump_seconds=dump_seconds,
+            load_seconds=load_seconds,
+            first_query_seconds=first_query_seconds,
+            rebuild_seconds=rebuild_seconds,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=1_000_000)
+    arguments = parser.parse_args()
+    print(json.dumps(asyncio.run(run(arguments.appointments)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""Service and HTTP latency at a given scale, with regression checks.
+
+Fills the repositories with a seeded dataset of ``--scale`` appointments, then
+times the controllers and the FastAPI routes, the latter through an
+in-process ASGI client so no network is involved. Each result holds the
+median and p95 in microseconds and is written as JSON to ``--output``.
+
+With ``--compare`` the run is checked against a stored result file instead:
+every median slower than the baseline by more than ``--tolerance`` is
+reported and the command exits with status 1.
+
+    uv run python -m benchmarks.suite --scale 100k --output baseline.json
+    uv run python -m benchmarks.suite --scale 100k --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncGenerator, Awaitable, Callable
+
+import httpx
+
+from app import main as api
+from app.adapters import (
+    InMemoryAppointmentRepository,
+    InMemoryUserRepository,
+    SQLiteAppointmentRepository,
+    SQLiteDatabase,
+    SQLiteUserRepository,
+)
+from app.admission import LoginAdmission, TokenBuckets
+from app.auth import KeyRing, TokenVerifier
+from app.caching import AgendaCache
+from app.domain import Appointment, AppointmentRepository, UserRepository
+from app.service import AppointmentController, UserService
+
+from .datasets import SCALES, SLOT, Dataset, populate
+from .repositories import measure
+
+type Results = dict[str, dict[str, float]]
+
+FILTERS = ("therapist", "patient", "day")
+PASSWORD = "bench-password"
+
+
+def filter_combinations() -> list[tuple[str, ...]]:
+    return [
+        tuple(name for name, used in zip(FILTERS, mask) if used)
+        for mask in itertools.product((False, True), repeat=len(FILTERS))
+    ]
+
+
+def query_of(picked: Appointment, filters: tuple[str, ...]) -> dict[str, str]:
+    query = dict(
+        therapist_id=str(picked.therapist_id),
+        patient_id=str(picked.patient_id),
+        day=picked.start_at.date().isoformat(),
+    )
+    return {
+        key: value for key, value in query.items() if key.removesuffix("_id") in filters
+    }
+
+
+class Clock:
+    """Hands out future slots past the seeded ones, one per call, so timed
+    bookings never conflict with the dataset nor with each other."""
+
+    def __init__(self, dataset: Dataset) -> None:
+        self.dataset = dataset
+        self.slots = itertools.count()
+
+    def next(self) -> tuple[datetime, int]:
+        slot = next(self.slots)
+        therapists = len(self.dataset.therapists)
+        return self.dataset.horizon + SLOT * (slot // therapists), slot % therapists
+
+
+async def bench_service(
+    controller: AppointmentController,
+    users: UserService,
+    dataset: Dataset,
+    clock: Clock,
+    arguments: argparse.Namespace,
+) -> Results:
+    rng = random.Random(arguments.seed)
+    emails = (f"new{i}@bench.com" for i in itertools.count())
+    await users.create_user("Login", "User", "login@bench.com", PASSWORD)
+
+    async def create_appointment() -> None:
+        at, therapist = clock.next()
+        await controller.create_appointment(
+            at, dataset.patients[therapist], dataset.therapists[therapist]
+        )
+
+    def list_appointments(filters: tuple[str, ...]) -> Callable[[], Awaitable[Any]]:
+        async def call() -> None:
+            picked = rng.choice(dataset.sample)
+            await controller.get_all_appointments(
+                therapist_id=picked.therapist_id if "therapist" in filters else None,
+                patient_id=picked.patient_id if "patient" in filters else None,
+                day=picked.start_at.date() if "day" in filters else None,
+                limit=api.DEFAULT_PAGE_SIZE,
+            )
+
+        return call
+
+    async def create_user() -> None:
+        await users.create_user("Bench", "User", next(emails), PASSWORD)
+
+    async def authenticate_user() -> None:
+        await users.authenticate_user("login@bench.com", PASSWORD)
+
+    results = {
+        "service.create_appointment": await measure(
+            create_appointment, arguments.repeat
+        )
+    }
+    for filters in filter_combinations():
+        name = "+".join(filters) or "none"
+        results[f"service.get_all_appointments[{name}]"] = await measure(
+            list_appointments(filters), arguments.repeat
+        )
+    results["service.create_user"] = await measure(create_user, arguments.hash_repeat)
+    results["service.authenticate_user"] = await measure(
+        authenticate_user, arguments.hash_repeat
+    )
+    return results
+
+
+async def bench_http(
+    controller: AppointmentController,
+    users: UserService,
+    dataset: Dataset,
+    clock: Clock,
+    arguments: argparse.Namespace,
+) -> Results:
+    rng = random.Random(arguments.seed)
+    emails = (f"signup{i}@bench.com" for i in itertools.count())
+
+    async def appointment_service() -> AsyncGenerator[AppointmentController]:
+        yield controller
+
+    async def user_service() -> AsyncGenerator[UserService]:
+        yield users
+
+    async def token_verifier() -> AsyncGenerator[TokenVerifier]:
+        yield verifier
+
+    verifier = TokenVerifier(users.keyring)
+    api.app.dependency_overrides.update(
+        {
+            api.get_appointment_service: appointment_service,
+            api.get_user_service: user_service,
+            api.get_token_verifier: token_verifier,
+        }
+    )
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        login = dict(username="login@bench.com", password=PASSWORD)
+        token = (await client.post("/login", data=login)).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        async def call(method: str, url: str, **kwargs: Any) -> None:
+            response = await client.request(method, url, **kwargs)
+            response.raise_for_status()
+            await response.aread()
+
+        def list_appointments(filters: tuple[str, ...]) -> Callable[[], Awaitable[Any]]:
+            async def request() -> None:
+                picked = rng.choice(dataset.sample)
+                await call("GET", "/appointments", params=query_of(picked, filters))
+
+            return request
+
+        async def stream_agenda() -> None:
+            picked = rng.choice(dataset.sample)
+            await call(
+                "GET",
+                "/appointments/stream",
+                params=dict(therapist_id=str(picked.therapist_id)),
+            )
+
+        async def availability() -> None:
+            picked = rng.choice(dataset.sample)
+            first_day = picked.start_at.date()
+            await call(
+                "GET",
+                f"/therapists/{picked.therapist_id}/availability",
+                params=dict(
+                    first_day=first_day.isoformat(),
+                    last_day=(first_day + timedelta(days=6)).isoformat(),
+                ),
+            )
+
+        async def book_batch() -> None:
+            requests = []
+            for _ in range(arguments.batch_size):
+                at, therapist = clock.next()
+                requests.append(
+                    dict(
+                        title="bench",
+                        start_at=at.isoformat(),
+                        therapist_id=str(dataset.therapists[therapist].id),
+                        patient_id=str(dataset.patients[therapist].id),
+                    )
+                )
+            await call("POST", "/appointments/batch", json=dict(appointments=requests))
+
+        async def signup() -> None:
+            await call(
+                "POST",
+                "/signup",
+                json=dict(
+                    email=next(emails),
+                    firstname="Bench",
+                    lastname="User",
+                    password=PASSWORD,
+                ),
+            )
+
+        async def login_route() -> None:
+            await call("POST", "/login", data=login)
+
+        results = {}
+        for filters in filter_combinations():
+            name = "+".join(filters) or "none"
+            results[f"http.GET /appointments[{name}]"] = await measure(
+                list_appointments(filters), arguments.repeat
+            )
+        results["http.GET /appointments/stream[therapist]"] = await measure(
+            stream_agenda, arguments.stream_repeat
+        )
+        results["http.GET /therapists/{id}/availability"] = await measure(
+            availability, arguments.repeat
+        )
+        results["http.POST /appointments/batch"] = await measure(
+            book_batch, arguments.repeat
+        )
+        results["http.POST /signup"] = await measure(signup, arguments.hash_repeat)
+        results["http.POST /login"] = await measure(login_route, arguments.hash_repeat)
+    api.app.dependency_overrides.clear()
+    return results
+
+
+async def run(arguments: argparse.Namespace) -> dict[str, Any]:
+    async with AsyncExitStack() as stack:
+        appointments: AppointmentRepository
+        users: UserRepository
+        if arguments.backend == "sqlite":
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+            database = SQLiteDatabase(Path(directory) / "bench.sqlite3")
+            stack.callback(database.close)
+            appointments = SQLiteAppointmentRepository(database)
+            users = SQLiteUserRepository(database)
+        elif arguments.backend == "columnar":
+            from app.adapters.columnar import ColumnarAppointmentRepository
+
+            appointments = ColumnarAppointmentRepository()
+            users = InMemoryUserRepository()
+        else:
+            appointments = InMemoryAppointmentRepository()
+            users = InMemoryUserRepository()
+
+        dataset = await populate(
+            appointments, users, SCALES[arguments.scale], arguments.seed
+        )
+        # Queries pick their filters at random from a small sample, so a
+        # cache would soon serve most of them: measure the repositories.
+        controller = AppointmentController(appointments, cache=AgendaCache(size=0))
+        # Every login comes from the same client, which must not be throttled.
+        user_service = UserService(
+            users,
+            keyring=KeyRing({"bench": os.urandom(32).hex()}),
+            admission=LoginAdmission(per_client=TokenBuckets(rate=1000, burst=1000)),
+        )
+        stack.callback(user_service.hasher.close)
+        clock = Clock(dataset)
+        results = await bench_service(
+            controller, user_service, dataset, clock, arguments
+        )
+        results |= await bench_http(controller, user_service, dataset, clock, arguments)
+
+    return dict(
+        meta=dict(
+            scale=arguments.scale,
+            backend=arguments.backend,
+            seed=arguments.seed,
+            python=platform.python_version(),
+            machine=platform.machine(),
+            cores=os.cpu_count() or 1,
+            date=datetime.now().isoformat(timespec="seconds"),
+        ),
+        results=results,
+    )
+
+
+def compare(
+    baseline: dict[str, Any], current: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Describe every result whose median grew by more than ``tolerance``.
+
+    Results missing from either side are skipped, so adding a benchmark does
+    not break comparisons with older baselines.
+    """
+    regressions = []
+    for name, timings in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        ratio = timings["p50_us"] / before["p50_us"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{name}: p50 {before['p50_us']:.0f}us -> {timings['p50_us']:.0f}us "
+                f"(+{ratio - 1:.0%})"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument(
+        "--backend", choices=("memory", "sqlite", "columnar"), default="memory"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=300)
+    parser.add_argument(
+        "--hash-repeat",
+        type=int,
+        default=20,
+        help="repeat count of the calls hashing a password",
+    )
+    parser.add_argument("--stream-repeat", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path, metavar="BASELINE")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    arguments = parser.parse_args()
+
+    current = asyncio.run(run(arguments))
+    report = json.dumps(current, indent=2)
+    if arguments.output:
+        arguments.output.write_text(report + "\n")
+    else:
+        print(report)
+
+    if arguments.compare:
+        baseline = json.loads(arguments.compare.read_text())
+        if baseline["meta"]["scale"] != current["meta"]["scale"]:
+            print("warning: the baseline was taken at another scale", file=sys.stderr)
+        regressions = compare(baseline, current, arguments.tolerance)
+        for a_regression in regressions:
+            print(f"REGRESSION {a_regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
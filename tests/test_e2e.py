@@ -1,36 +1,55 @@
 import datetime
+import json
 import uuid
+from pathlib import Path
 from typing import Generator
 
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
+from app.adapters import InMemoryAppointmentRepository, InMemoryUserRepository
+from app.admission import LoginAdmission, TokenBuckets
+from app.auth import KeyRing, TokenVerifier
 from app.domain import Appointment
-from app.main import app, get_appointment_service, get_user_service, oauth2_scheme
+from app.exceptions import EmailAlreadyUsedError, TimeZoneGivenError
+from app.main import (
+    app,
+    get_appointment_service,
+    get_current_user,
+    get_token_verifier,
+    get_user_service,
+)
 from app.service import AppointmentController
 from app.service import UserService as UserController
 
 
 @pytest.fixture
 def controlled_appointment_service() -> AppointmentController:
-    return AppointmentController()
+    return AppointmentController(InMemoryAppointmentRepository())
 
 
 @pytest.fixture
-def controlled_user_service() -> UserController:
-    return UserController()
+def keyring() -> KeyRing:
+    return KeyRing({"test": "a_secret_key_only_used_by_the_tests"})
+
+
+@pytest.fixture
+def controlled_user_service(keyring: KeyRing) -> UserController:
+    return UserController(InMemoryUserRepository(), keyring=keyring)
 
 
 @pytest.fixture
 def override_app(
     controlled_appointment_service: AppointmentController,
     controlled_user_service: UserController,
+    keyring: KeyRing,
 ) -> Generator[FastAPI, None, None]:
     app.dependency_overrides[get_appointment_service] = (
         lambda: controlled_appointment_service
     )
     app.dependency_overrides[get_user_service] = lambda: controlled_user_service
+    app.dependency_overrides[get_token_verifier] = lambda: TokenVerifier(keyring)
     try:
         yield app
     finally:
@@ -45,7 +64,7 @@ def client(override_app: FastAPI) -> TestClient:
 
 @pytest.fixture
 def authenticated_client(override_app: FastAPI) -> TestClient:
-    override_app.dependency_overrides[oauth2_scheme] = lambda: "token.token.token"
+    override_app.dependency_overrides[get_current_user] = lambda: {"sub": "test"}
     return TestClient(override_app)
 
 
@@ -58,7 +77,8 @@ class TestAppointments:
         assert response.status_code == 200
         assert response.json() == {"appointments": []}
 
-    def test_get_all_appointments_with_one_appointment(
+    @pytest.mark.asyncio
+    async def test_get_all_appointments_with_one_appointment(
         self,
         authenticated_client: TestClient,
         controlled_appointment_service: AppointmentController,
@@ -70,35 +90,256 @@ class TestAppointments:
             patient_id=uuid.uuid4(),
             therapist_id=uuid.uuid4(),
         )
-        controlled_appointment_service.appointments.append(appointment)
+        await controlled_appointment_service.repository.save(appointment)
         response = authenticated_client.get("/appointments")
         assert response.status_code == 200
         appointments = response.json()["appointments"]
         assert len(appointments) == 1
 
-    def test_get_all_appointments_with_many_appointment(
+    @pytest.mark.asyncio
+    async def test_get_all_appointments_with_many_appointment(
         self,
         authenticated_client: TestClient,
         controlled_appointment_service: AppointmentController,
     ) -> None:
-        appointment: Appointment = Appointment(
-            id=uuid.uuid4(),
-            title="test",
-            start_at=datetime.datetime.now() + datetime.timedelta(days=1),
-            patient_id=uuid.uuid4(),
-            therapist_id=uuid.uuid4(),
-        )
-        controlled_appointment_service.appointments.append(appointment)
-        controlled_appointment_service.appointments.append(appointment)
+        for _ in range(2):
+            appointment: Appointment = Appointment(
+                id=uuid.uuid4(),
+                title="test",
+                start_at=datetime.datetime.now() + datetime.timedelta(days=1),
+                patient_id=uuid.uuid4(),
+                therapist_id=uuid.uuid4(),
+            )
+            await controlled_appointment_service.repository.save(appointment)
         response = authenticated_client.get("/appointments")
         assert response.status_code == 200
         appointments = response.json()["appointments"]
         assert len(appointments) > 1
 
+    @pytest.mark.asyncio
+    async def test_get_appointments_page_by_page(
+        self,
+        authenticated_client: TestClient,
+        controlled_appointment_service: AppointmentController,
+    ) -> None:
+        therapist_id = uuid.uuid4()
+        start = datetime.datetime.now() + datetime.timedelta(days=1)
+        for i in range(5):
+            await controlled_appointment_service.repository.save(
+                Appointment(
+                    id=uuid.uuid4(),
+                    title="test",
+                    start_at=start + datetime.timedelta(hours=i),
+                    patient_id=uuid.uuid4(),
+                    therapist_id=therapist_id,
+                )
+            )
+
+        seen: list[str] = []
+        params: dict[str, str | int] = dict(therapist_id=str(therapist_id), limit=2)
+        while True:
+            response = authenticated_client.get("/appointments", params=params)
+            assert response.status_code == 200
+            body = response.json()
+            seen.extend(x["id"] for x in body["appointments"])
+            if "next_cursor" not in body:
+                break
+            params["cursor"] = body["next_cursor"]
+        assert len(seen) == len(set(seen)) == 5
+
+    def test_unchanged_listings_are_answered_not_modified(
+        self,
+        authenticated_client: TestClient,
+        controlled_appointment_service: AppointmentController,
+    ) -> None:
+        therapist_id = str(uuid.uuid4())
+        params = dict(therapist_id=therapist_id)
+        response = authenticated_client.get("/appointments", params=params)
+        etag = response.headers["ETag"]
+
+        lookups = controlled_appointment_service.cache.misses
+        response = authenticated_client.get(
+            "/appointments", params=params, headers={"If-None-Match": f"W/{etag}"}
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+        assert controlled_appointment_service.cache.misses == lookups
+
+        booking = dict(
+            title="weekly",
+            start_at=(datetime.datetime.now() + datetime.timedelta(days=1)).isoformat(),
+            therapist_id=therapist_id,
+            patient_id=str(uuid.uuid4()),
+        )
+        authenticated_client.post(
+            "/appointments/batch", json={"appointments": [booking]}
+        )
+        response = authenticated_client.get(
+            "/appointments", params=params, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert len(response.json()["appointments"]) == 1
+
+    def test_get_appointments_with_an_invalid_cursor(
+        self, authenticated_client: TestClient
+    ) -> None:
+        response = authenticated_client.get("/appointments", params={"cursor": "nope"})
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_stream_appointments_as_ndjson(
+        self,
+        authenticated_client: TestClient,
+        controlled_appointment_service: AppointmentController,
+    ) -> None:
+        for _ in range(3):
+            await controlled_appointment_service.repository.save(
+                Appointment(
+                    id=uuid.uuid4(),
+                    title="test",
+                    start_at=datetime.datetime.now() + datetime.timedelta(days=1),
+                    patient_id=uuid.uuid4(),
+                    therapist_id=uuid.uuid4(),
+                )
+            )
+        response = authenticated_client.get("/appointments/stream")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = response.text.splitlines()
+        assert len(lines) == 3
+        assert all(json.loads(line)["title"] == "test" for line in lines)
+
+    def test_book_appointments_in_a_batch(
+        self, authenticated_client: TestClient
+    ) -> None:
+        therapist_id, patient_id = str(uuid.uuid4()), str(uuid.uuid4())
+        start = datetime.datetime.now() + datetime.timedelta(days=1)
+        batch = [
+            dict(
+                title="weekly",
+                start_at=(start + datetime.timedelta(minutes=minutes)).isoformat(),
+                therapist_id=therapist_id,
+                patient_id=patient_id,
+            )
+            for minutes in (0, 10, 60)
+        ]
+        response = authenticated_client.post(
+            "/appointments/batch", json={"appointments": batch}
+        )
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [x["status"] for x in results] == ["accepted", "conflict", "accepted"]
+        assert results[1]["conflicting_id"] == results[0]["appointment_id"]
+
+    def test_book_a_weekly_series(self, authenticated_client: TestClient) -> None:
+        therapist_id = str(uuid.uuid4())
+        series = dict(
+            title="weekly",
+            start_at=(datetime.datetime.now() + datetime.timedelta(days=1)).isoformat(),
+            therapist_id=therapist_id,
+            patient_id=str(uuid.uuid4()),
+            count=10,
+        )
+        response = authenticated_client.post("/appointments/series", json=series)
+        assert response.status_code == 200
+        assert response.json()["frequency"] == "weekly"
+
+        clashing = dict(series, patient_id=str(uuid.uuid4()), frequency="daily")
+        response = authenticated_client.post("/appointments/series", json=clashing)
+        assert response.status_code == 409
+        too_long = dict(series, duration="P8D")
+        response = authenticated_client.post("/appointments/series", json=too_long)
+        assert response.status_code == 422
+        in_utc = dict(series, until="2099-01-01T00:00:00Z")
+        response = authenticated_client.post("/appointments/series", json=in_utc)
+        assert response.status_code == 422
+
+        response = authenticated_client.get(
+            "/appointments", params=dict(therapist_id=therapist_id)
+        )
+        assert len(response.json()["appointments"]) == 10
+
+    def test_cancel_an_appointment_and_follow_the_changes(
+        self,
+        authenticated_client: TestClient,
+        controlled_appointment_service: AppointmentController,
+    ) -> None:
+        therapist_id, patient_id = str(uuid.uuid4()), str(uuid.uuid4())
+        start = datetime.datetime.now() + datetime.timedelta(days=1)
+        booking = dict(
+            title="weekly",
+            start_at=start.isoformat(),
+            therapist_id=therapist_id,
+            patient_id=patient_id,
+        )
+        response = authenticated_client.post(
+            "/appointments/batch", json={"appointments": [booking]}
+        )
+        appointment_id = response.json()["results"][0]["appointment_id"]
+        response = authenticated_client.delete(f"/appointments/{appointment_id}")
+        assert response.status_code == 204
+        response = authenticated_client.delete(f"/appointments/{appointment_id}")
+        assert response.status_code == 404
+
+        # A subscriber whose queue overflows is dropped, which ends the stream.
+        controlled_appointment_service.events.queue_size = 1
+        response = authenticated_client.get(
+            "/appointments/events",
+            params=dict(patient_id=patient_id),
+            headers={"Last-Event-ID": "0"},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text.startswith("id: 1\nevent: created\ndata: {")
+
+        response = authenticated_client.get("/appointments/events")
+        assert response.status_code == 400
+
+    def test_get_therapist_availability(
+        self, authenticated_client: TestClient
+    ) -> None:
+        day = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+        response = authenticated_client.get(
+            f"/therapists/{uuid.uuid4()}/availability",
+            params=dict(
+                first_day=day,
+                last_day=day,
+                duration_minutes=60,
+                opens_at="09:00",
+                closes_at="12:00",
+            ),
+        )
+        assert response.status_code == 200
+        slots = response.json()["slots"]
+        assert [x["start_at"][11:16] for x in slots] == ["09:00", "10:00", "11:00"]
+
+    def test_get_availability_with_opening_hours_in_another_time_zone(
+        self, authenticated_client: TestClient
+    ) -> None:
+        day = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+        response = authenticated_client.get(
+            f"/therapists/{uuid.uuid4()}/availability",
+            params=dict(first_day=day, last_day=day, opens_at="09:00Z"),
+        )
+        assert response.status_code == 422
+        assert response.json()["detail"] == TimeZoneGivenError.MSG
+
+    def test_get_availability_over_a_too_long_range(
+        self, authenticated_client: TestClient
+    ) -> None:
+        response = authenticated_client.get(
+            f"/therapists/{uuid.uuid4()}/availability",
+            params=dict(first_day="2030-01-01", last_day="2031-01-01"),
+        )
+        assert response.status_code == 400
+
 
 class TestUser:
 
-    def test_create_user(
+    @pytest.mark.asyncio
+    async def test_create_user(
         self,
         client: TestClient,
         controlled_user_service: UserController,
@@ -108,13 +349,53 @@ class TestUser:
         )
         response = client.post("/signup", json=data)
         assert response.json()["user_id"]
-        assert len(controlled_user_service.users) == 1
-        saved_user = controlled_user_service.users[0]
+        users = await controlled_user_service.repository.list()
+        assert len(users) == 1
+        saved_user = users[0]
         assert saved_user.firstname == data["firstname"]
         assert saved_user.lastname == data["lastname"]
         assert saved_user.email == data["email"]
         assert saved_user.password_hash != data["password"].encode()
 
+    def test_signup_with_an_email_already_used(self, client: TestClient) -> None:
+        data: dict[str, str] = dict(
+            firstname="test", lastname="test", email="test@test.com", password="test"
+        )
+        assert client.post("/signup", json=data).status_code == 200
+        data["email"] = "Test@Test.com"
+        response = client.post("/signup", json=data)
+        assert response.status_code == 409
+        assert response.json()["detail"] == EmailAlreadyUsedError.MSG
+
+    @pytest.mark.asyncio
+    async def test_import_users_streams_a_result_per_row(
+        self,
+        authenticated_client: TestClient,
+        controlled_user_service: UserController,
+    ) -> None:
+        upload = (
+            "firstname,lastname,email,password\n"
+            "Jane,Doe,jane@test.com,secret\n"
+            "Jim,Doe,not-an-email,secret\n"
+        )
+        response = authenticated_client.post(
+            "/users/import", content=upload, headers={"Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        results = [json.loads(line) for line in response.text.splitlines()]
+        assert [(x["row"], x["status"]) for x in results] == [
+            (1, "created"),
+            (2, "invalid"),
+        ]
+        jane = await controlled_user_service.repository.get_by_email("jane@test.com")
+        assert jane is not None and results[0]["user_id"] == str(jane.id)
+
+        response = authenticated_client.post(
+            "/users/import", content="{}", headers={"Content-Type": "text/plain"}
+        )
+        assert response.status_code == 415
+
     @pytest.mark.asyncio
     async def test_login(
         self,
@@ -134,3 +415,112 @@ class TestUser:
         assert response.status_code == 200
         assert isinstance(response.text, str)
         assert len(response.text.split(".")) == 3
+
+
+    @pytest.mark.asyncio
+    async def test_login_is_throttled_per_client(
+        self,
+        client: TestClient,
+        controlled_user_service: UserController,
+    ) -> None:
+        controlled_user_service.admission = LoginAdmission(
+            per_client=TokenBuckets(rate=1 / 60, burst=2)
+        )
+        await controlled_user_service.create_user(
+            "test", "test", "test@test.com", "test"
+        )
+        responses = [
+            client.post("/login", data=dict(username="test@test.com", password="test"))
+            for _ in range(3)
+        ]
+        assert [x.status_code for x in responses] == [200, 200, 429]
+        assert responses[-1].headers["Retry-After"] == "60"
+
+
+class TestAuthentication:
+
+    def test_appointments_require_a_token(self, client: TestClient) -> None:
+        response = client.get("/appointments")
+        assert response.status_code == 401
+
+    def test_appointments_reject_a_forged_token(self, client: TestClient) -> None:
+        response = client.get(
+            "/appointments", headers={"Authorization": "Bearer token.token.token"}
+        )
+        assert response.status_code == 401
+        assert response.headers["WWW-Authenticate"] == "Bearer"
+
+    @pytest.mark.asyncio
+    async def test_appointments_accept_a_login_token(
+        self, client: TestClient, controlled_user_service: UserController
+    ) -> None:
+        await controlled_user_service.create_user(
+            "test", "test", "test@test.com", "test"
+        )
+        response = client.post(
+            "/login", data=dict(username="test@test.com", password="test")
+        )
+        token = response.json()["access_token"]
+        response = client.get(
+            "/appointments", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200
+
+
+class TestMetrics:
+
+    def test_requests_are_counted_by_route_and_status(
+        self, authenticated_client: TestClient
+    ) -> None:
+        therapist_id = uuid.uuid4()
+        for _ in range(2):
+            authenticated_client.get(
+                f"/therapists/{therapist_id}/availability",
+                params=dict(first_day="2030-01-01", last_day="2030-12-31"),
+            )
+
+        response = authenticated_client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert (
+            'kin_http_request_seconds_count{method="GET",'
+            'route="/therapists/{therapist_id}/availability",status="400"}'
+        ) in response.text
+        assert str(therapist_id) not in response.text
+
+
+class TestLifespan:
+
+    def test_a_restart_resumes_from_the_snapshot(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        pytest.importorskip("numpy")
+        monkeypatch.setenv("KIN_SNAPSHOT_PATH", str(tmp_path / "kin.snapshot"))
+        monkeypatch.delenv("KIN_SQLITE_PATH", raising=False)
+        signup = dict(
+            email="test@test.com", firstname="test", lastname="test", password="test"
+        )
+        login = dict(username="test@test.com", password="test")
+        booking = dict(
+            title="weekly",
+            start_at=(datetime.datetime.now() + datetime.timedelta(days=1)).isoformat(),
+            therapist_id=str(uuid.uuid4()),
+            patient_id=str(uuid.uuid4()),
+        )
+
+        with TestClient(app) as client:
+            assert client.post("/signup", json=signup).status_code == 200
+            token = client.post("/login", data=login).json()["access_token"]
+            response = client.post(
+                "/appointments/batch",
+                json={"appointments": [booking]},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            booked = response.json()["results"][0]["appointment_id"]
+
+        with TestClient(app) as client:
+            token = client.post("/login", data=login).json()["access_token"]
+            response = client.get(
+                "/appointments", headers={"Authorization": f"Bearer {token}"}
+            )
+            assert [x["id"] for x in response.json()["appointments"]] == [booked]
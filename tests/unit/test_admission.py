@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from app.adapters import InMemoryUserRepository
+from app.admission import LoginAdmission, TokenBuckets
+from app.exceptions import TooManyLoginAttemptsError, WrongPasswordError
+from app.passwords import PasswordHasher
+from app.service import UserService
+
+
+class FakeClock:
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingHasher(PasswordHasher):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.verified = 0
+
+    async def verify(self, password: str, salt: str, stored: bytes) -> bool:
+        self.verified += 1
+        await asyncio.sleep(0)
+        return await super().verify(password, salt, stored)
+
+
+class TestTokenBuckets:
+
+    def test_burst_then_refill(self) -> None:
+        clock = FakeClock()
+        buckets = TokenBuckets(rate=0.5, burst=2, clock=clock)
+        assert [buckets.take("a") for _ in range(2)] == [0, 0]
+        assert buckets.take("a") == 2
+        assert buckets.take("b") == 0
+
+        clock.now = 1.5
+        assert buckets.take("a") == pytest.approx(0.5)
+        clock.now = 2
+        assert buckets.take("a") == 0
+
+    def test_keys_are_bounded_by_recent_use(self) -> None:
+        clock = FakeClock()
+        buckets = TokenBuckets(rate=1, burst=1, size=2, clock=clock)
+        for key in ("a", "b", "a", "c"):
+            buckets.take(key)
+        assert len(buckets) == 2
+        assert buckets.take("a") > 0
+        assert buckets.take("b") == 0
+
+
+class TestLoginAdmission:
+
+    @pytest.mark.asyncio
+    async def test_throttled_attempts_are_rejected_before_hashing(self) -> None:
+        hasher = CountingHasher()
+        service = UserService(
+            InMemoryUserRepository(),
+            hasher,
+            admission=LoginAdmission(per_email=TokenBuckets(rate=1 / 60, burst=2)),
+        )
+        await service.create_user("John", "Doe", "johndoe@test.com", "test")
+        for _ in range(2):
+            with pytest.raises(WrongPasswordError):
+                await service.authenticate_user("johndoe@test.com", "wrong")
+
+        with pytest.raises(TooManyLoginAttemptsError) as raised:
+            await service.authenticate_user("JohnDoe@test.com", "test")
+        assert raised.value.retry_after == 60
+        assert hasher.verified == 2
+
+    @pytest.mark.asyncio
+    async def test_a_successful_login_forgives_earlier_attempts(self) -> None:
+        service = UserService(
+            InMemoryUserRepository(),
+            admission=LoginAdmission(per_email=TokenBuckets(rate=1 / 60, burst=2)),
+        )
+        await service.create_user("John", "Doe", "johndoe@test.com", "test")
+        for password in ("wrong", "test", "wrong", "test"):
+            try:
+                await service.authenticate_user("johndoe@test.com", password)
+            except WrongPasswordError:
+                pass
+
+    @pytest.mark.asyncio
+    async def test_each_client_has_its_own_bucket(self) -> None:
+        service = UserService(
+            InMemoryUserRepository(),
+            admission=LoginAdmission(per_client=TokenBuckets(rate=1 / 60, burst=1)),
+        )
+        await service.create_user("John", "Doe", "johndoe@test.com", "test")
+        assert await service.authenticate_user("johndoe@test.com", "test", "1.2.3.4")
+        with pytest.raises(TooManyLoginAttemptsError):
+            await service.authenticate_user("johndoe@test.com", "test", "1.2.3.4")
+        assert await service.authenticate_user("johndoe@test.com", "test", "5.6.7.8")
+
+    @pytest.mark.asyncio
+    async def test_attempts_over_the_concurrency_limit_are_rejected(self) -> None:
+        hasher = CountingHasher()
+        service = UserService(
+            InMemoryUserRepository(),
+            hasher,
+            admission=LoginAdmission(max_in_flight=2),
+        )
+        emails = [f"user{i}@test.com" for i in range(4)]
+        for email in emails:
+            await service.create_user("John", "Doe", email, "test")
+
+        results = await asyncio.gather(
+            *(service.authenticate_user(email, "test") for email in emails),
+            return_exceptions=True,
+        )
+        rejected = [x for x in results if isinstance(x, TooManyLoginAttemptsError)]
+        assert len(rejected) == 2
+        assert hasher.verified == 2
+        assert service.admission.in_flight == 0
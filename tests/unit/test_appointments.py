@@ -1,40 +1,57 @@
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Collection, Iterable
 from uuid import UUID, uuid4
 
 import pytest
+from pydantic import ValidationError
 
-from app.domain.appointments import Appointment
-from app.domain.ports import AppointmentRepository
+from app.adapters import InMemoryAppointmentRepository
+from app.caching import AgendaCache
+from app.domain import (
+    Appointment,
+    BookingRequest,
+    BookingStatus,
+    Frequency,
+    SeriesRequest,
+    User,
+)
 from app.exceptions import InvalidDateAndTimeError, OverlappingAppointmentError
 from app.service import AppointmentController
 
 from .conftest import UserFactory
 
 
-class InMemoryAppointmentRepository(AppointmentRepository):
+class YieldingAppointmentRepository(InMemoryAppointmentRepository):
+    """Gives control back to the event loop between the check and the save,
+    like any repository doing real I/O would."""
 
-    def __init__(self) -> None:
-        self._appointments: dict[UUID, Appointment] = {}
+    async def find_overlapping(
+        self,
+        therapist_ids: Collection[UUID],
+        patient_ids: Collection[UUID],
+        start: datetime,
+        end: datetime,
+    ) -> list[Appointment]:
+        found = await super().find_overlapping(therapist_ids, patient_ids, start, end)
+        await asyncio.sleep(0)
+        return found
 
-    async def get(self, id: UUID) -> Appointment:
-        return self._appointments[id]
 
-    async def save(self, appointment: Appointment) -> UUID:
-        id = uuid4()
-        appointment.id = id
-        self._appointments[id] = appointment
-        return id
+class YieldingQueryRepository(InMemoryAppointmentRepository):
+    """Reads the agenda, then lets other tasks run before returning it."""
 
-    async def list(self) -> list[Appointment]:
-        return list(self._appointments.values())
+    async def query(self, **filters: Any) -> list[Appointment]:
+        found = await super().query(**filters)
+        await asyncio.sleep(0.01)
+        return found
 
 
 class TestCreatingAppointments:
-
     @pytest.mark.asyncio
     async def test_create_an_appointment(self, make_users: UserFactory) -> None:
         therapist, patient = make_users(2)
-        controller = AppointmentController()
+        controller = AppointmentController(InMemoryAppointmentRepository())
         at = datetime.now() + timedelta(minutes=1)
         appointments = await controller.create_appointment(at, patient, therapist)
         assert appointments.id
@@ -46,27 +63,266 @@ class TestCreatingAppointments:
     async def test_create_appointment_in_the_past(
         self, make_users: UserFactory
     ) -> None:
-        controller = AppointmentController()
+        controller = AppointmentController(InMemoryAppointmentRepository())
         therapist, patient = make_users(2)
         at = datetime.now() - timedelta(days=1)
         with pytest.raises(InvalidDateAndTimeError):
             await controller.create_appointment(at, patient, therapist)
 
+    def test_hydrating_skips_validation_but_creating_does_not(self) -> None:
+        fields: dict[str, Any] = dict(
+            id=uuid4(),
+            title="past",
+            start_at=datetime.now() - timedelta(days=1),
+            duration=timedelta(minutes=30),
+            patient_id=uuid4(),
+            therapist_id=uuid4(),
+        )
+        hydrated = Appointment.hydrate(**fields)
+        assert hydrated.model_dump() == fields
+        assert hydrated.end_at == fields["start_at"] + timedelta(minutes=30)
+        with pytest.raises(InvalidDateAndTimeError):
+            Appointment(**fields)
+
     @pytest.mark.asyncio
     async def test_appointments_cannot_overlap(self, make_users: UserFactory) -> None:
-        controller = AppointmentController()
+        controller = AppointmentController(InMemoryAppointmentRepository())
         therapist, patient = make_users(2)
         at = datetime.now() + timedelta(minutes=1)
         await controller.create_appointment(at, patient, therapist)
         with pytest.raises(OverlappingAppointmentError):
             await controller.create_appointment(at, patient, therapist)
 
+    @pytest.mark.asyncio
+    async def test_appointment_cannot_cover_another_one(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient, other_patient = make_users(3)
+        at = datetime.now() + timedelta(days=1)
+        await controller.create_appointment(
+            at + timedelta(minutes=30), patient, therapist
+        )
+        with pytest.raises(OverlappingAppointmentError):
+            await controller.create_appointment(
+                at, other_patient, therapist, duration=timedelta(hours=2)
+            )
 
-class TestGetAppointments:
+    @pytest.mark.asyncio
+    async def test_appointments_of_other_people_can_overlap(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist_1, therapist_2, patient_1, patient_2 = make_users(4)
+        at = datetime.now() + timedelta(days=1)
+        await controller.create_appointment(at, patient_1, therapist_1)
+        await controller.create_appointment(at, patient_2, therapist_2)
+        assert len(await controller.repository.list()) == 2
+
+    @pytest.mark.asyncio
+    async def test_patient_cannot_be_booked_twice_at_once(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist_1, therapist_2, patient = make_users(3)
+        at = datetime.now() + timedelta(days=1)
+        await controller.create_appointment(at, patient, therapist_1)
+        with pytest.raises(OverlappingAppointmentError):
+            await controller.create_appointment(
+                at - timedelta(minutes=15), patient, therapist_2
+            )
+
+
+class TestBookingBatches:
+    @staticmethod
+    def request(
+        at: datetime, patient: User, therapist: User, minutes: int = 30
+    ) -> BookingRequest:
+        return BookingRequest(
+            title="batch",
+            start_at=at,
+            duration=timedelta(minutes=minutes),
+            patient_id=patient.id,
+            therapist_id=therapist.id,
+        )
+
+    @pytest.mark.asyncio
+    async def test_batch_is_booked_in_one_save(self, make_users: UserFactory) -> None:
+        repository = InMemoryAppointmentRepository()
+        controller = AppointmentController(repository)
+        therapist, patient = make_users(2)
+        at = datetime.now() + timedelta(days=1)
+        requests = [
+            self.request(at + timedelta(hours=i), patient, therapist)
+            for i in reversed(range(4))
+        ]
+        saved_batches = []
+        save_many = repository.save_many
+
+        async def spy(appointments: Iterable[Appointment]) -> list[UUID]:
+            appointments = list(appointments)
+            saved_batches.append(appointments)
+            return await save_many(appointments)
+
+        repository.save_many = spy  # type: ignore[method-assign]
+        results = await controller.create_appointments(requests)
+
+        assert [x.status for x in results] == [BookingStatus.ACCEPTED] * 4
+        assert len(saved_batches) == 1
+        stored = await repository.list()
+        assert {x.appointment_id for x in results} == {x.id for x in stored}
+        assert [x.start_at for x in await controller.get_all_appointments()] == [
+            r.start_at for r in reversed(requests)
+        ]
 
+    @pytest.mark.asyncio
+    async def test_batch_reports_conflicts_inside_the_batch(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient_1, patient_2 = make_users(3)
+        at = datetime.now() + timedelta(days=1)
+        results = await controller.create_appointments(
+            [
+                self.request(at + timedelta(minutes=15), patient_2, therapist),
+                self.request(at, patient_1, therapist, minutes=120),
+            ]
+        )
+        assert results[1].status == BookingStatus.ACCEPTED
+        assert results[0].status == BookingStatus.CONFLICT
+        assert results[0].conflicting_id == results[1].appointment_id
+
+    @pytest.mark.asyncio
+    async def test_batch_reports_conflicts_with_stored_appointments(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist_1, therapist_2, patient = make_users(3)
+        at = datetime.now() + timedelta(days=1)
+        existing = await controller.create_appointment(
+            at - timedelta(hours=1), patient, therapist_1, duration=timedelta(hours=3)
+        )
+        results = await controller.create_appointments(
+            [
+                self.request(at + timedelta(hours=1), patient, therapist_2),
+                self.request(at + timedelta(hours=3), patient, therapist_2),
+            ]
+        )
+        assert results[0].status == BookingStatus.CONFLICT
+        assert results[0].conflicting_id == existing.id
+        assert results[1].status == BookingStatus.ACCEPTED
+
+    @pytest.mark.asyncio
+    async def test_batch_reports_stored_appointments_starting_inside_a_request(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient_1, patient_2 = make_users(3)
+        at = datetime.now() + timedelta(days=1)
+        existing = await controller.create_appointment(
+            at + timedelta(minutes=30), patient_1, therapist
+        )
+        results = await controller.create_appointments(
+            [self.request(at, patient_2, therapist, minutes=60)]
+        )
+        assert results[0].status == BookingStatus.CONFLICT
+        assert results[0].conflicting_id == existing.id
+        assert await controller.repository.list() == [existing]
+
+    @pytest.mark.asyncio
+    async def test_batch_reports_invalid_requests(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient = make_users(2)
+        results = await controller.create_appointments(
+            [
+                self.request(datetime.now() - timedelta(days=1), patient, therapist),
+                self.request(datetime.now() + timedelta(days=1), patient, therapist),
+            ]
+        )
+        assert results[0].status == BookingStatus.INVALID
+        assert results[0].detail
+        assert results[1].status == BookingStatus.ACCEPTED
+
+    @pytest.mark.parametrize("minutes", [0, -30, 24 * 60 + 1])
+    def test_batch_requests_need_a_duration_within_a_day(
+        self, make_users: UserFactory, minutes: int
+    ) -> None:
+        therapist, patient = make_users(2)
+        at = datetime.now() + timedelta(days=1)
+        with pytest.raises(ValidationError):
+            self.request(at, patient, therapist, minutes=minutes)
+
+    @pytest.mark.asyncio
+    async def test_batch_reports_requests_with_a_time_zone_as_invalid(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient = make_users(2)
+        at = datetime.now() + timedelta(days=1)
+        results = await controller.create_appointments(
+            [
+                self.request(at.astimezone(timezone.utc), patient, therapist),
+                self.request(at + timedelta(hours=1), patient, therapist),
+            ]
+        )
+        assert results[0].status == BookingStatus.INVALID
+        assert results[0].detail and "time zone" in results[0].detail
+        assert results[1].status == BookingStatus.ACCEPTED
+
+
+class TestCancellingAppointments:
+    @pytest.mark.asyncio
+    async def test_a_cancelled_slot_can_be_booked_again(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient = make_users(2)
+        at = datetime.now() + timedelta(days=1)
+        booked = await controller.create_appointment(at, patient, therapist)
+        assert await controller.get_all_appointments(therapist_id=therapist.id) == [
+            booked
+        ]
+
+        assert await controller.cancel_appointment(booked.id) == booked
+        assert await controller.get_all_appointments(therapist_id=therapist.id) == []
+        rebooked = await controller.create_appointment(at, patient, therapist)
+        assert await controller.get_all_appointments(therapist_id=therapist.id) == [
+            rebooked
+        ]
+        with pytest.raises(KeyError):
+            await controller.cancel_appointment(booked.id)
+
+    @pytest.mark.asyncio
+    async def test_changes_reach_the_subscribers_of_the_people_involved(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient, other = make_users(3)
+        of_therapist = controller.events.subscribe(therapist.id)
+        of_patient = controller.events.subscribe(patient.id)
+        of_other = controller.events.subscribe(other.id)
+        at = datetime.now() + timedelta(days=1)
+
+        booked = await controller.create_appointment(at, patient, therapist)
+        await controller.cancel_appointment(booked.id)
+        controller.events.close()
+
+        encoded = controller.encoder.encode(booked)
+        expected = [
+            b"id: 1\nevent: created\ndata: " + encoded + b"\n\n",
+            b"id: 2\nevent: cancelled\ndata: " + encoded + b"\n\n",
+        ]
+        assert [frame async for frame in of_therapist] == expected
+        assert [frame async for frame in of_patient] == expected
+        assert [frame async for frame in of_other] == []
+
+
+class TestGetAppointments:
     @pytest.mark.asyncio
     async def test_appointments_are_saved(self, make_users: UserFactory) -> None:
-        controller = AppointmentController()
+        controller = AppointmentController(InMemoryAppointmentRepository())
         therapist, patient = make_users(2)
         temp = []
 
@@ -74,30 +330,36 @@ class TestGetAppointments:
             at = datetime.now() + timedelta(days=i + 1)
             temp.append(await controller.create_appointment(at, patient, therapist))
 
-        assert len(controller.appointments) == 4
-        assert temp == controller.appointments
+        assert len(await controller.repository.list()) == 4
+        assert temp == await controller.repository.list()
 
     @pytest.mark.asyncio
     async def test_get_all_appointments_when_there_is_none(self) -> None:
-        controller = AppointmentController()
-        assert await controller.get_all_appointments() == controller.appointments
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        assert (
+            await controller.get_all_appointments()
+            == await controller.repository.list()
+        )
 
     @pytest.mark.asyncio
     async def test_get_all_appointments_when_there_is_one(
         self, make_users: UserFactory
     ) -> None:
-        controller = AppointmentController()
+        controller = AppointmentController(InMemoryAppointmentRepository())
         therapist, patient = make_users(2)
         at = datetime.now() + timedelta(minutes=1)
         appointment = await controller.create_appointment(at, patient, therapist)
-        assert await controller.get_all_appointments() == controller.appointments
+        assert (
+            await controller.get_all_appointments()
+            == await controller.repository.list()
+        )
         assert await controller.get_all_appointments() == [appointment]
 
     @pytest.mark.asyncio
     async def test_get_all_appointments_when_there_is_many(
         self, make_users: UserFactory
     ) -> None:
-        controller = AppointmentController()
+        controller = AppointmentController(InMemoryAppointmentRepository())
         therapist, patient = make_users(2)
         at = datetime.now() + timedelta(days=1)
         appointments = []
@@ -107,14 +369,17 @@ class TestGetAppointments:
                     at + timedelta(hours=i), patient, therapist
                 )
             )
-        assert await controller.get_all_appointments() == controller.appointments
+        assert (
+            await controller.get_all_appointments()
+            == await controller.repository.list()
+        )
         assert await controller.get_all_appointments() == appointments
 
     @pytest.mark.asyncio
     async def test_get_appointments_filtered_by_patient_id(
         self, make_users: UserFactory
     ) -> None:
-        controller = AppointmentController()
+        controller = AppointmentController(InMemoryAppointmentRepository())
         therapist_1, therapist_2, patient_1, patient_2 = make_users(4)
         at = datetime.now() + timedelta(days=1)
         for i in range(3):
@@ -134,7 +399,7 @@ class TestGetAppointments:
     async def test_get_appointments_filtered_by_therapist_id(
         self, make_users: UserFactory
     ) -> None:
-        controller = AppointmentController()
+        controller = AppointmentController(InMemoryAppointmentRepository())
         therapist_1, therapist_2, patient_1, patient_2 = make_users(4)
         at = datetime.now() + timedelta(days=1)
         for i in range(3):
@@ -156,7 +421,7 @@ class TestGetAppointments:
     async def test_get_appointments_filtered_by_date(
         self, make_users: UserFactory
     ) -> None:
-        controller = AppointmentController()
+        controller = AppointmentController(InMemoryAppointmentRepository())
         therapist_1, therapist_2, patient_1, patient_2 = make_users(4)
         at = datetime.now() + timedelta(days=1)
         await controller.create_appointment(at, patient_1, therapist_1)
@@ -174,7 +439,7 @@ class TestGetAppointments:
     async def test_get_all_appointments_filtered_by_multiple_filters(
         self, make_users: UserFactory
     ) -> None:
-        controller = AppointmentController()
+        controller = AppointmentController(InMemoryAppointmentRepository())
         therapist_1, therapist_2, patient_1, patient_2 = make_users(4)
         at = datetime.now() + timedelta(days=1)
         await controller.create_appointment(at, patient_1, therapist_2)
@@ -201,3 +466,294 @@ class TestGetAppointments:
         assert len(appointments) == 1
         assert appointments[0].therapist_id == therapist_2.id
         assert appointments[0].patient_id == patient_1.id
+
+
+class TestConcurrentBooking:
+    @pytest.mark.asyncio
+    async def test_concurrent_bookings_of_one_slot_accept_exactly_one(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(YieldingAppointmentRepository())
+        therapist, *patients = make_users(51)
+        at = datetime.now() + timedelta(days=1)
+        outcomes = await asyncio.gather(
+            *(
+                controller.create_appointment(at, a_patient, therapist)
+                for a_patient in patients
+            ),
+            return_exceptions=True,
+        )
+        booked = [
+            an_outcome for an_outcome in outcomes if isinstance(an_outcome, Appointment)
+        ]
+        assert len(booked) == 1
+        assert all(
+            isinstance(an_outcome, OverlappingAppointmentError)
+            for an_outcome in outcomes
+            if an_outcome is not booked[0]
+        )
+        assert len(await controller.repository.list()) == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_batches_and_single_bookings_do_not_overlap(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(YieldingAppointmentRepository())
+        therapist, patient_1, patient_2 = make_users(3)
+        at = datetime.now() + timedelta(days=1)
+        batch = [
+            BookingRequest(
+                title="batch",
+                start_at=at,
+                patient_id=patient_1.id,
+                therapist_id=therapist.id,
+            )
+        ]
+        results, single = await asyncio.gather(
+            controller.create_appointments(batch),
+            controller.create_appointment(at, patient_2, therapist),
+            return_exceptions=True,
+        )
+        accepted = isinstance(single, Appointment) + sum(
+            a_result.status == BookingStatus.ACCEPTED
+            for a_result in results  # type: ignore[union-attr]
+        )
+        assert accepted == 1
+        assert len(await controller.repository.list()) == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_bookings_of_different_therapists_all_succeed(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(YieldingAppointmentRepository())
+        users = make_users(40)
+        at = datetime.now() + timedelta(days=1)
+        await asyncio.gather(
+            *(
+                controller.create_appointment(at, patient, therapist)
+                for therapist, patient in zip(users[::2], users[1::2])
+            )
+        )
+        assert len(await controller.repository.list()) == 20
+
+
+class TestAgendaCache:
+    @pytest.mark.asyncio
+    async def test_repeated_queries_are_served_from_the_cache(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient = make_users(2)
+        at = datetime.now() + timedelta(days=1)
+        await controller.create_appointment(at, patient, therapist)
+        for _ in range(3):
+            appointments = await controller.get_all_appointments(
+                therapist_id=therapist.id, day=at.date()
+            )
+            assert len(appointments) == 1
+        assert (controller.cache.hits, controller.cache.misses) == (2, 1)
+
+    @pytest.mark.asyncio
+    async def test_a_booking_invalidates_only_the_queries_it_affects(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist_1, therapist_2, patient_1, patient_2 = make_users(4)
+        at = datetime.now() + timedelta(days=1)
+        for query in (
+            dict(therapist_id=therapist_1.id),
+            dict(therapist_id=therapist_2.id),
+            dict(day=at.date()),
+        ):
+            assert await controller.get_all_appointments(**query) == []
+
+        booked = await controller.create_appointment(at, patient_1, therapist_1)
+        assert await controller.get_all_appointments(therapist_id=therapist_1.id) == [
+            booked
+        ]
+        assert await controller.get_all_appointments(day=at.date()) == [booked]
+        assert await controller.get_all_appointments(therapist_id=therapist_2.id) == []
+        assert controller.cache.hits == 1
+
+        results = await controller.create_appointments(
+            [
+                BookingRequest(
+                    title="batch",
+                    start_at=at,
+                    patient_id=patient_2.id,
+                    therapist_id=therapist_2.id,
+                )
+            ]
+        )
+        appointments = await controller.get_all_appointments(
+            therapist_id=therapist_2.id
+        )
+        assert [an_appointment.id for an_appointment in appointments] == [
+            results[0].appointment_id
+        ]
+
+    @pytest.mark.asyncio
+    async def test_a_read_racing_a_booking_is_not_served_stale(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(YieldingQueryRepository())
+        therapist, patient = make_users(2)
+        at = datetime.now() + timedelta(days=1)
+
+        read = asyncio.create_task(
+            controller.get_all_appointments(therapist_id=therapist.id)
+        )
+        await asyncio.sleep(0)
+        booked = await controller.create_appointment(at, patient, therapist)
+        assert await read == []
+        assert await controller.get_all_appointments(therapist_id=therapist.id) == [
+            booked
+        ]
+
+    @pytest.mark.asyncio
+    async def test_etags_change_with_the_agendas_they_cover(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient, other = make_users(3)
+        scopes = [
+            (therapist.id, None),
+            (None, patient.id),
+            (other.id, None),
+            (None, None),
+        ]
+        before = [controller.cache.etag(*scope) for scope in scopes]
+
+        await controller.create_appointment(
+            datetime.now() + timedelta(days=1), patient, therapist
+        )
+        after = [controller.cache.etag(*scope) for scope in scopes]
+        assert [x != y for x, y in zip(before, after)] == [True, True, False, True]
+        assert AgendaCache().etag(None, None) != controller.cache.etag(None, None)
+
+    @pytest.mark.asyncio
+    async def test_cache_size_is_bounded(self, make_users: UserFactory) -> None:
+        controller = AppointmentController(
+            InMemoryAppointmentRepository(), cache=AgendaCache(size=2)
+        )
+        for a_therapist in make_users(5):
+            await controller.get_all_appointments(therapist_id=a_therapist.id)
+        assert len(controller.cache) == 2
+
+
+class TestRecurringSeries:
+    @staticmethod
+    def request(
+        at: datetime, patient: User, therapist: User, **fields: Any
+    ) -> SeriesRequest:
+        return SeriesRequest(
+            title="series",
+            start_at=at,
+            patient_id=patient.id,
+            therapist_id=therapist.id,
+            **fields,
+        )
+
+    @pytest.mark.asyncio
+    async def test_occurrences_are_listed_with_appointments(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient = make_users(2)
+        at = datetime.now().replace(microsecond=0) + timedelta(days=1)
+        single = await controller.create_appointment(
+            at + timedelta(hours=1), patient, therapist
+        )
+        series = await controller.create_series(
+            self.request(at, patient, therapist, frequency=Frequency.DAILY)
+        )
+
+        page = await controller.get_all_appointments(therapist_id=therapist.id, limit=3)
+        assert page == [series.occurrence(0), single, series.occurrence(1)]
+        following = await controller.get_all_appointments(
+            therapist_id=therapist.id, after=page[-1].key, limit=2
+        )
+        assert following == [series.occurrence(2), series.occurrence(3)]
+        day = await controller.get_all_appointments(day=(at + timedelta(days=5)).date())
+        assert day == [series.occurrence(5)]
+
+        unbounded = await controller.get_all_appointments(therapist_id=therapist.id)
+        assert len(unbounded) == 367
+        streamed = [
+            an_appointment
+            async for an_appointment in controller.stream_appointments(
+                therapist_id=therapist.id, batch_size=100
+            )
+        ]
+        assert streamed == unbounded
+
+    @pytest.mark.asyncio
+    async def test_bookings_cannot_overlap_an_occurrence(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient, another_patient = make_users(3)
+        at = datetime.now() + timedelta(days=1)
+        series = await controller.create_series(self.request(at, patient, therapist))
+        clashing = at + timedelta(weeks=40, minutes=10)
+
+        with pytest.raises(OverlappingAppointmentError):
+            await controller.create_appointment(clashing, another_patient, therapist)
+        results = await controller.create_appointments(
+            [
+                BookingRequest(
+                    title="batch",
+                    start_at=start_at,
+                    patient_id=another_patient.id,
+                    therapist_id=therapist.id,
+                )
+                for start_at in (clashing, clashing + timedelta(days=1))
+            ]
+        )
+        assert results[0].status == BookingStatus.CONFLICT
+        assert results[0].conflicting_id == series.occurrence(40).id
+        assert results[1].status == BookingStatus.ACCEPTED
+
+    @pytest.mark.asyncio
+    async def test_series_cannot_overlap_appointments_or_series(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient, another_patient = make_users(3)
+        at = datetime.now() + timedelta(days=1)
+        await controller.create_appointment(
+            at + timedelta(weeks=52), another_patient, therapist
+        )
+
+        with pytest.raises(OverlappingAppointmentError):
+            await controller.create_series(self.request(at, patient, therapist))
+        await controller.create_series(self.request(at, patient, therapist, count=52))
+        with pytest.raises(OverlappingAppointmentError):
+            await controller.create_series(
+                self.request(
+                    at + timedelta(days=2),
+                    another_patient,
+                    therapist,
+                    frequency=Frequency.DAILY,
+                    interval=5,
+                )
+            )
+        assert len(await controller.series.list()) == 1
+
+    @pytest.mark.asyncio
+    async def test_a_series_invalidates_cached_agendas_and_slots(
+        self, make_users: UserFactory
+    ) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        therapist, patient = make_users(2)
+        day = (datetime.now() + timedelta(days=1)).date()
+        assert await controller.get_all_appointments(therapist_id=therapist.id) == []
+        slots = await controller.find_free_slots(therapist.id, day, day)
+
+        await controller.create_series(
+            self.request(slots[0].start_at, patient, therapist, count=1)
+        )
+        assert (
+            len(await controller.get_all_appointments(therapist_id=therapist.id)) == 1
+        )
+        assert slots[0] not in await controller.find_free_slots(therapist.id, day, day)
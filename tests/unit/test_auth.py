@@ -0,0 +1,89 @@
+import time
+from typing import Any
+
+import pytest
+from joserfc import jwt
+
+from app.auth import KeyRing, TokenVerifier
+from app.exceptions import InvalidTokenError
+
+
+def sign(keyring: KeyRing, claims: dict[str, Any]) -> str:
+    key = keyring.signing_key
+    return jwt.encode(dict(alg="HS256", kid=key.kid), claims, key)
+
+
+class TestTokenVerifier:
+
+    def test_verify_returns_the_claims(self) -> None:
+        keyring = KeyRing({"current": "current secret key"})
+        token = sign(keyring, {"sub": "john", "exp": int(time.time()) + 60})
+        assert TokenVerifier(keyring).verify(token)["sub"] == "john"
+
+    def test_verify_rejects_another_key(self) -> None:
+        token = sign(KeyRing({"current": "other secret key"}), {"sub": "john"})
+        with pytest.raises(InvalidTokenError):
+            TokenVerifier(KeyRing({"current": "current secret key"})).verify(token)
+
+    def test_verify_rejects_garbage(self) -> None:
+        with pytest.raises(InvalidTokenError):
+            TokenVerifier(KeyRing({"current": "current secret key"})).verify(
+                "token.token.token"
+            )
+
+    def test_verify_rejects_expired_and_not_yet_valid_tokens(self) -> None:
+        keyring = KeyRing({"current": "current secret key"})
+        verifier = TokenVerifier(keyring)
+        with pytest.raises(InvalidTokenError):
+            verifier.verify(sign(keyring, {"exp": int(time.time()) - 10}))
+        with pytest.raises(InvalidTokenError):
+            verifier.verify(sign(keyring, {"nbf": int(time.time()) + 60}))
+
+    def test_rotated_out_key_still_verifies(self) -> None:
+        old = KeyRing({"2025": "old secret key 2025"})
+        token = sign(old, {"sub": "john"})
+        rotated = KeyRing(
+            {"2026": "new secret key 2026", "2025": "old secret key 2025"}
+        )
+        assert TokenVerifier(rotated).verify(token)["sub"] == "john"
+        retired = KeyRing({"2026": "new secret key 2026"})
+        with pytest.raises(InvalidTokenError):
+            TokenVerifier(retired).verify(token)
+
+    def test_repeated_tokens_skip_decoding(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        keyring = KeyRing({"current": "current secret key"})
+        verifier = TokenVerifier(keyring)
+        token = sign(keyring, {"sub": "john"})
+        verifier.verify(token)
+
+        def fail(*args: object, **kwargs: object) -> None:
+            raise AssertionError("the token should come from the cache")
+
+        monkeypatch.setattr(jwt, "decode", fail)
+        assert verifier.verify(token)["sub"] == "john"
+
+    def test_cache_does_not_outlive_the_token(self) -> None:
+        keyring = KeyRing({"current": "current secret key"})
+        verifier = TokenVerifier(keyring, ttl=3600)
+        token = sign(keyring, {"exp": int(time.time()) - 1})
+        verifier._cache[token] = ({}, time.time() - 1)
+        with pytest.raises(InvalidTokenError):
+            verifier.verify(token)
+
+    def test_cache_is_bounded(self) -> None:
+        keyring = KeyRing({"current": "current secret key"})
+        verifier = TokenVerifier(keyring, cache_size=2)
+        tokens = [sign(keyring, {"sub": str(i)}) for i in range(3)]
+        for token in tokens:
+            verifier.verify(token)
+        assert list(verifier._cache) == tokens[1:]
+
+    def test_keyring_from_environment(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv(
+            KeyRing.ENVIRONMENT_VARIABLE, "new=new secret key, old=old secret key"
+        )
+        keyring = KeyRing.from_environment()
+        assert keyring.signing_key.kid == "new"
+        assert len(keyring.keys.keys) == 2
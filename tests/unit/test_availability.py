@@ -0,0 +1,105 @@
+import random
+from datetime import date, datetime, time, timedelta
+from uuid import uuid4
+
+import pytest
+
+from app.adapters import InMemoryAppointmentRepository
+from app.domain import Appointment
+from app.domain.availability import free_slots, merge_intervals
+from app.exceptions import OverlappingAppointmentError
+from app.service import AppointmentController
+
+DAY = date.today() + timedelta(days=1)
+
+
+def at(hour: int, minute: int = 0) -> datetime:
+    return datetime.combine(DAY, time(hour, minute))
+
+
+class TestFreeSlots:
+
+    def test_merge_joins_overlapping_and_touching_intervals(self) -> None:
+        merged = merge_intervals(
+            [
+                (at(11), at(12)),
+                (at(9), at(10)),
+                (at(10), at(10, 30)),
+                (at(9), at(9, 15)),
+            ]
+        )
+        assert merged == [(at(9), at(10, 30)), (at(11), at(12))]
+
+    def test_slots_avoid_busy_intervals_including_their_bounds(self) -> None:
+        slots = free_slots(
+            busy=[(at(10), at(10, 30))],
+            windows=[(at(9), at(12))],
+            duration=timedelta(minutes=30),
+            step=timedelta(minutes=30),
+        )
+        assert [x.start_at for x in slots] == [at(9), at(11), at(11, 30)]
+
+    def test_slots_must_fit_in_the_window(self) -> None:
+        slots = free_slots(
+            busy=[],
+            windows=[(at(9), at(10, 15))],
+            duration=timedelta(minutes=45),
+            step=timedelta(minutes=15),
+        )
+        assert [x.start_at for x in slots] == [at(9), at(9, 15), at(9, 30)]
+
+
+class TestFindFreeSlots:
+
+    @pytest.mark.asyncio
+    async def test_free_slots_agree_with_the_overlap_rule(self) -> None:
+        random.seed(5)
+        repository = InMemoryAppointmentRepository()
+        controller = AppointmentController(repository)
+        therapist_id = uuid4()
+        stored = []
+        for _ in range(40):
+            appointment = Appointment(
+                id=uuid4(),
+                title="busy",
+                start_at=at(8)
+                + timedelta(minutes=5 * random.randrange(0, 12 * 24 * 5)),
+                duration=timedelta(minutes=random.choice([15, 30, 50, 90])),
+                therapist_id=therapist_id,
+                patient_id=uuid4(),
+            )
+            stored.append(appointment)
+            await repository.save(appointment)
+
+        duration = timedelta(minutes=30)
+        step = timedelta(minutes=10)
+        slots = await controller.find_free_slots(
+            therapist_id, DAY, DAY + timedelta(days=4), duration=duration, step=step
+        )
+        free = {x.start_at for x in slots}
+
+        for offset in range(5):
+            start = at(9) + timedelta(days=offset)
+            while start + duration <= at(17) + timedelta(days=offset):
+                candidate = Appointment(
+                    id=uuid4(),
+                    title="candidate",
+                    start_at=start,
+                    duration=duration,
+                    therapist_id=therapist_id,
+                    patient_id=uuid4(),
+                )
+                try:
+                    for an_appointment in stored:
+                        candidate.is_not_overlapping_with(an_appointment)
+                    bookable = True
+                except OverlappingAppointmentError:
+                    bookable = False
+                assert (start in free) == bookable
+                start += step
+
+    @pytest.mark.asyncio
+    async def test_no_slots_in_the_past(self) -> None:
+        controller = AppointmentController(InMemoryAppointmentRepository())
+        yesterday = date.today() - timedelta(days=1)
+        assert await controller.find_free_slots(uuid4(), yesterday, yesterday) == []
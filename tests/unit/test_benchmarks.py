@@ -0,0 +1,83 @@
+import argparse
+
+import pytest
+
+from app.adapters import InMemoryAppointmentRepository, InMemoryUserRepository
+from benchmarks import load
+from benchmarks.datasets import populate
+from benchmarks.suite import compare
+
+
+class TestDatasets:
+
+    @pytest.mark.asyncio
+    async def test_seeded_dataset_is_reproducible_and_never_overlaps(self) -> None:
+        repositories = [
+            (InMemoryAppointmentRepository(), InMemoryUserRepository())
+            for _ in range(2)
+        ]
+        datasets = [
+            await populate(appointments, users, 2_000, seed=3)
+            for appointments, users in repositories
+        ]
+        stored = [await appointments.list() for appointments, _ in repositories]
+        assert [a.id for a in stored[0]] == [a.id for a in stored[1]]
+        assert len(stored[0]) == 2_000
+        assert datasets[0].sample
+
+        appointments = stored[0]
+        for an_appointment in appointments:
+            overlapping = await repositories[0][0].find_overlapping(
+                {an_appointment.therapist_id},
+                {an_appointment.patient_id},
+                an_appointment.start_at,
+                an_appointment.end_at - an_appointment.duration / 2,
+            )
+            assert overlapping == [an_appointment]
+
+
+class TestCompare:
+
+    def test_only_slower_medians_beyond_tolerance_are_regressions(self) -> None:
+        baseline = {"results": {"a": {"p50_us": 100.0}, "b": {"p50_us": 100.0}}}
+        current = {
+            "results": {
+                "a": {"p50_us": 119.0},
+                "b": {"p50_us": 150.0},
+                "new": {"p50_us": 1.0},
+            }
+        }
+        regressions = compare(baseline, current, tolerance=0.2)
+        assert len(regressions) == 1
+        assert regressions[0].startswith("b:")
+
+
+class TestLoad:
+
+    def test_mix_weights_are_parsed_and_checked(self) -> None:
+        assert load.parse_mix("list=8,book") == {"list": 8.0, "book": 1.0}
+        for invalid in ("list=8,delete=1", "list=x", "list=0"):
+            with pytest.raises(argparse.ArgumentTypeError):
+                load.parse_mix(invalid)
+
+    @pytest.mark.asyncio
+    async def test_an_in_process_run_reports_every_route_of_the_mix(self) -> None:
+        arguments = argparse.Namespace(
+            url=None,
+            uvicorn=False,
+            users=1,
+            therapists=5,
+            seed=0,
+            mix=load.parse_mix("list=3,book=1"),
+            concurrency=None,
+            rate=200.0,
+            duration=0.2,
+        )
+        report = await load.run(arguments)
+
+        results = report["results"]
+        routes = {"GET /appointments", "POST /appointments/batch", "total"}
+        assert set(results) == routes
+        assert results["total"]["requests"] == 40
+        assert results["total"]["errors"] == {}
+        assert all(x["p50_us"] <= x["p99_us"] <= x["max_us"] for x in results.values())
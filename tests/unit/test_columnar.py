@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+
+from app.domain import Appointment
+
+columnar = pytest.importorskip("app.adapters.columnar")
+
+START = datetime.now() + timedelta(days=1)
+
+
+def make_appointments(count: int, title: str = "weekly session") -> list[Appointment]:
+    return [
+        Appointment(
+            id=uuid4(),
+            title=title,
+            start_at=START + timedelta(hours=i),
+            therapist_id=uuid4(),
+            patient_id=uuid4(),
+        )
+        for i in range(count)
+    ]
+
+
+class TestColumnarAppointmentRepository:
+
+    @pytest.mark.asyncio
+    async def test_rows_are_fixed_size_and_titles_interned(self) -> None:
+        repository = columnar.ColumnarAppointmentRepository()
+        await repository.save_many(make_appointments(100))
+        assert len(repository) == 100
+        assert repository.nbytes == 100 * 68
+        assert repository._titles == ["weekly session"]
+
+    @pytest.mark.asyncio
+    async def test_saving_an_existing_id_updates_its_row(self) -> None:
+        repository = columnar.ColumnarAppointmentRepository()
+        appointment, other = make_appointments(2)
+        await repository.save_many([appointment, other])
+        moved = appointment.model_copy(
+            update=dict(title="moved", start_at=START + timedelta(days=3))
+        )
+        await repository.save(moved)
+        assert len(repository) == 2
+        assert await repository.get(appointment.id) == moved
+        assert await repository.query() == [other, moved]
@@ -0,0 +1,72 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from app.events import ChangeBus, Subscription
+
+
+async def drain(subscription: Subscription) -> list[bytes]:
+    frames = []
+    while subscription._frames:
+        frames.append(await anext(subscription))
+    return frames
+
+
+class TestChangeBus:
+
+    @pytest.mark.asyncio
+    async def test_a_waiting_subscriber_wakes_on_publish(self) -> None:
+        bus = ChangeBus()
+        person = uuid4()
+        subscription = bus.subscribe(person)
+        received = asyncio.create_task(anext(subscription))
+        await asyncio.sleep(0)
+        bus.publish("created", [person, uuid4()], b'{"n":1}')
+        assert await received == b'id: 1\nevent: created\ndata: {"n":1}\n\n'
+
+    @pytest.mark.asyncio
+    async def test_reconnecting_resumes_after_the_last_event_seen(self) -> None:
+        bus = ChangeBus()
+        person, other = uuid4(), uuid4()
+        for i in range(5):
+            bus.publish("created", [person if i % 2 == 0 else other], b"%d" % i)
+
+        frames = await drain(bus.subscribe(person, last_id=1))
+        assert [frame.split(b"\n")[0] for frame in frames] == [b"id: 3", b"id: 5"]
+        assert await drain(bus.subscribe(person, last_id=5)) == []
+
+    @pytest.mark.asyncio
+    async def test_a_lost_position_gets_a_reset(self) -> None:
+        bus = ChangeBus(history=2)
+        person = uuid4()
+        for i in range(5):
+            bus.publish("created", [person], b"%d" % i)
+
+        assert len(await drain(bus.subscribe(person, last_id=3))) == 2
+        for last_id in (1, 9):
+            frames = await drain(bus.subscribe(person, last_id=last_id))
+            assert frames == [b"id: 5\nevent: reset\ndata: {}\n\n"]
+
+    @pytest.mark.asyncio
+    async def test_a_subscriber_falling_behind_is_dropped(self) -> None:
+        bus = ChangeBus(queue_size=3)
+        person = uuid4()
+        slow = bus.subscribe(person)
+        for i in range(5):
+            bus.publish("created", [person], b"%d" % i)
+
+        assert len([frame async for frame in slow]) == 3
+        assert slow.closed
+        bus.unsubscribe(slow)
+        assert bus.subscribers == 0
+
+    @pytest.mark.asyncio
+    async def test_close_ends_every_stream(self) -> None:
+        bus = ChangeBus()
+        subscriptions = [bus.subscribe(uuid4()) for _ in range(1000)]
+        waiting = asyncio.gather(*(anext(x, None) for x in subscriptions))
+        await asyncio.sleep(0)
+        bus.close()
+        assert await waiting == [None] * 1000
+        assert bus.subscribers == 0
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from app.domain.intervals import IntervalIndex
+
+START = datetime(2030, 1, 1, 9)
+
+
+class TestIntervalIndex:
+
+    def test_finds_intervals_starting_inside_the_window(self) -> None:
+        index = IntervalIndex()
+        id = uuid4()
+        index.add(id, START, START + timedelta(minutes=30))
+        found = index.overlapping(
+            START + timedelta(minutes=10), START + timedelta(hours=1)
+        )
+        assert list(found) == [id]
+
+    def test_finds_long_intervals_starting_before_the_window(self) -> None:
+        index = IntervalIndex()
+        long_one, short_one = uuid4(), uuid4()
+        index.add(long_one, START, START + timedelta(hours=8))
+        index.add(short_one, START + timedelta(hours=1), START + timedelta(hours=2))
+        window = (START + timedelta(hours=5), START + timedelta(hours=6))
+        assert list(index.overlapping(*window)) == [long_one]
+
+    def test_touching_bounds_overlap(self) -> None:
+        index = IntervalIndex()
+        id = uuid4()
+        index.add(id, START, START + timedelta(minutes=30))
+        assert list(
+            index.overlapping(START + timedelta(minutes=30), START + timedelta(hours=1))
+        ) == [id]
+        assert list(index.overlapping(START - timedelta(minutes=30), START)) == [id]
+
+    def test_ignores_distant_intervals(self) -> None:
+        index = IntervalIndex()
+        for day in range(10):
+            index.add(
+                uuid4(),
+                START + timedelta(days=day),
+                START + timedelta(days=day, minutes=30),
+            )
+        assert (
+            list(
+                index.overlapping(
+                    START + timedelta(hours=1), START + timedelta(hours=2)
+                )
+            )
+            == []
+        )
+
+    def test_re_adding_moves_the_interval(self) -> None:
+        index = IntervalIndex()
+        id = uuid4()
+        index.add(id, START, START + timedelta(minutes=30))
+        index.add(id, START + timedelta(days=1), START + timedelta(days=1, minutes=30))
+        assert len(index) == 1
+        assert list(index.overlapping(START, START + timedelta(minutes=30))) == []
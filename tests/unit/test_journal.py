@@ -0,0 +1,214 @@
+import asyncio
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+
+from app import wiring
+from app.adapters import InMemoryAppointmentRepository, InMemoryUserRepository
+from app.adapters.journal import (
+    HEADER,
+    Journal,
+    JournaledAppointmentRepository,
+    JournaledUserRepository,
+)
+from app.domain import Appointment, User
+from app.exceptions import CorruptJournalError, EmailAlreadyUsedError
+
+START = datetime.now().replace(microsecond=0) + timedelta(days=1)
+
+
+def make_appointment(hours: int) -> Appointment:
+    return Appointment(
+        id=uuid4(),
+        title="test",
+        start_at=START + timedelta(hours=hours),
+        therapist_id=uuid4(),
+        patient_id=uuid4(),
+    )
+
+
+async def reopen(path: Path) -> JournaledAppointmentRepository:
+    repository = JournaledAppointmentRepository(
+        InMemoryAppointmentRepository(), Journal(path)
+    )
+    await repository.replay()
+    return repository
+
+
+class TestJournal:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_saves_share_fsyncs(self, tmp_path: Path) -> None:
+        path = tmp_path / "appointments.journal"
+        journal = Journal(path, max_delay=0.01)
+        repository = JournaledAppointmentRepository(
+            InMemoryAppointmentRepository(), journal
+        )
+        appointments = [make_appointment(i) for i in range(100)]
+        await asyncio.gather(*(repository.save(x) for x in appointments))
+        await journal.close()
+
+        assert 1 <= journal.fsyncs <= 5
+        replayed = await reopen(path)
+        assert await replayed.query() == appointments
+
+    @pytest.mark.asyncio
+    async def test_a_torn_last_record_is_dropped(self, tmp_path: Path) -> None:
+        path = tmp_path / "appointments.journal"
+        repository = await reopen(path)
+        appointments = [make_appointment(i) for i in range(3)]
+        for an_appointment in appointments:
+            await repository.save(an_appointment)
+        await repository.journal.close()
+        path.write_bytes(path.read_bytes()[:-5])
+
+        repository = await reopen(path)
+        assert await repository.query() == appointments[:2]
+        await repository.save(appointments[2])
+        await repository.journal.close()
+        assert await (await reopen(path)).query() == appointments
+
+    @pytest.mark.asyncio
+    async def test_damage_before_the_last_record_is_reported(
+        self, tmp_path: Path
+    ) -> None:
+        path = tmp_path / "appointments.journal"
+        repository = await reopen(path)
+        for i in range(3):
+            await repository.save(make_appointment(i))
+        await repository.journal.close()
+        data = bytearray(path.read_bytes())
+        data[10] ^= 0xFF
+        path.write_bytes(data)
+
+        with pytest.raises(CorruptJournalError):
+            await reopen(path)
+
+    def test_a_damaged_length_before_the_last_record_is_reported(
+        self, tmp_path: Path
+    ) -> None:
+        path = tmp_path / "records.journal"
+        frames = [
+            HEADER.pack(len(record), zlib.crc32(record)) + record
+            for record in (b"record-%d" % i for i in range(5))
+        ]
+        data = bytearray(b"".join(frames))
+        HEADER.pack_into(data, len(frames[0]) + len(frames[1]), 1_000_000, 0)
+        path.write_bytes(data)
+
+        with pytest.raises(CorruptJournalError):
+            list(Journal(path).replay())
+        assert path.read_bytes() == data
+
+    @pytest.mark.asyncio
+    async def test_deletes_are_replayed_in_order(self, tmp_path: Path) -> None:
+        path = tmp_path / "appointments.journal"
+        repository = await reopen(path)
+        appointments = [make_appointment(i) for i in range(3)]
+        await repository.save_many(appointments)
+        await repository.delete(appointments[1].id)
+        await repository.save(appointments[1])
+        await repository.delete(appointments[0].id)
+        await repository.journal.close()
+
+        replayed = await reopen(path)
+        assert await replayed.query() == appointments[1:]
+
+    @pytest.mark.asyncio
+    async def test_a_failed_write_changes_nothing(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        path = tmp_path / "appointments.journal"
+        repository = await reopen(path)
+        kept = make_appointment(0)
+        await repository.save(kept)
+
+        def failing_write(data: bytes) -> None:
+            raise OSError("disk full")
+
+        monkeypatch.setattr(repository.journal, "_write", failing_write)
+        with pytest.raises(OSError):
+            await repository.save(make_appointment(1))
+        with pytest.raises(OSError):
+            await repository.delete(kept.id)
+        assert await repository.query() == [kept]
+        monkeypatch.undo()
+        await repository.journal.close()
+        assert await (await reopen(path)).query() == [kept]
+
+    @pytest.mark.asyncio
+    async def test_compaction_folds_the_log_into_a_snapshot(
+        self, tmp_path: Path
+    ) -> None:
+        path = tmp_path / "appointments.journal"
+        journal = Journal(path, compact_after=1024)
+        repository = JournaledAppointmentRepository(
+            InMemoryAppointmentRepository(), journal
+        )
+        appointments = [make_appointment(i) for i in range(20)]
+        for an_appointment in appointments:
+            await repository.save(an_appointment)
+        moved = appointments[0].model_copy(update=dict(title="moved"))
+        await repository.save_many([moved])
+        await journal.close()
+
+        assert journal.snapshot_path.exists()
+        assert path.stat().st_size < 1024
+        replayed = await reopen(path)
+        assert await replayed.query() == [moved, *appointments[1:]]
+
+    @pytest.mark.asyncio
+    async def test_users_are_replayed(self, tmp_path: Path) -> None:
+        path = tmp_path / "users.journal"
+        repository = JournaledUserRepository(InMemoryUserRepository(), Journal(path))
+        user = User(
+            id=uuid4(),
+            firstname="John",
+            lastname="Doe",
+            email="johndoe@test.com",
+            password_hash=bytes(range(64)),
+            salt="salt",
+        )
+        await repository.save(user)
+        await repository.journal.close()
+
+        replayed = JournaledUserRepository(InMemoryUserRepository(), Journal(path))
+        await replayed.replay()
+        assert await replayed.get_by_email("johndoe@test.com") == user
+
+    @pytest.mark.asyncio
+    async def test_an_email_is_only_logged_for_one_user(self, tmp_path: Path) -> None:
+        path = tmp_path / "users.journal"
+        repository = JournaledUserRepository(InMemoryUserRepository(), Journal(path))
+        users = [
+            User(
+                id=uuid4(),
+                firstname="John",
+                lastname="Doe",
+                email="johndoe@test.com",
+                password_hash=bytes(range(64)),
+                salt="salt",
+            )
+            for _ in range(2)
+        ]
+        outcomes = await asyncio.gather(
+            *(repository.save(a_user) for a_user in users), return_exceptions=True
+        )
+        assert outcomes[0] == users[0].id
+        assert isinstance(outcomes[1], EmailAlreadyUsedError)
+        await repository.journal.close()
+
+        replayed = JournaledUserRepository(InMemoryUserRepository(), Journal(path))
+        await replayed.replay()
+        assert await replayed.list() == [users[0]]
+
+    @pytest.mark.asyncio
+    async def test_journaled_wiring_survives_a_restart(self, tmp_path: Path) -> None:
+        appointment = make_appointment(0)
+        async with wiring.journaled(tmp_path)() as repositories:
+            await repositories.appointments.save(appointment)
+        async with wiring.journaled(tmp_path)() as repositories:
+            assert await repositories.appointments.list() == [appointment]
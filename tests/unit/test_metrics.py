@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+
+from app.adapters import InMemoryAppointmentRepository
+from app.adapters.instrumented import InstrumentedAppointmentRepository
+from app.domain import Appointment
+from app.metrics import (
+    REPOSITORY_ERRORS,
+    REPOSITORY_RESULT_SIZE,
+    REPOSITORY_SECONDS,
+    Counter,
+    Histogram,
+    Registry,
+)
+
+
+class TestRegistry:
+
+    def test_histogram_buckets_are_cumulative(self) -> None:
+        registry = Registry()
+        histogram = registry.register(
+            Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1))
+        )
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value, "/a")
+        lines = registry.render().splitlines()
+        assert lines[:2] == [
+            "# HELP latency_seconds Latency.",
+            "# TYPE latency_seconds histogram",
+        ]
+        assert lines[2:] == [
+            'latency_seconds_bucket{route="/a",le="0.1"} 2',
+            'latency_seconds_bucket{route="/a",le="1"} 3',
+            'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+            'latency_seconds_sum{route="/a"} 2.65',
+            'latency_seconds_count{route="/a"} 4',
+        ]
+
+    def test_counter_samples_and_family_share_a_name(self) -> None:
+        registry = Registry()
+        counter = registry.register(Counter("errors", "Errors.", ("error",)))
+        counter.inc('a "quoted"\\name\n')
+        counter.inc('a "quoted"\\name\n', amount=2)
+        assert registry.render().splitlines() == [
+            "# HELP errors_total Errors.",
+            "# TYPE errors_total counter",
+            'errors_total{error="a \\"quoted\\"\\\\name\\n"} 3',
+        ]
+
+    def test_names_are_unique(self) -> None:
+        registry = Registry()
+        registry.register(Counter("errors", "Errors."))
+        with pytest.raises(ValueError):
+            registry.register(Counter("errors", "Errors again."))
+
+
+class TestInstrumentedRepository:
+
+    @pytest.mark.asyncio
+    async def test_records_calls_sizes_and_errors(self) -> None:
+        repository = InstrumentedAppointmentRepository(InMemoryAppointmentRepository())
+        labels = ("InMemoryAppointmentRepository", "save_many")
+        calls = REPOSITORY_SECONDS.count(*labels)
+        sizes = REPOSITORY_RESULT_SIZE.count(*labels)
+        errors = REPOSITORY_ERRORS.value(
+            "InMemoryAppointmentRepository", "get", "KeyError"
+        )
+
+        at = datetime.now() + timedelta(days=1)
+        appointments = [
+            Appointment(
+                id=uuid4(),
+                title="test",
+                start_at=at + timedelta(hours=i),
+                therapist_id=uuid4(),
+                patient_id=uuid4(),
+            )
+            for i in range(3)
+        ]
+        await repository.save_many(iter(appointments))
+        assert await repository.query() == appointments
+        with pytest.raises(KeyError):
+            await repository.get(uuid4())
+
+        assert REPOSITORY_SECONDS.count(*labels) == calls + 1
+        assert REPOSITORY_RESULT_SIZE.count(*labels) == sizes + 1
+        assert (
+            REPOSITORY_ERRORS.value("InMemoryAppointmentRepository", "get", "KeyError")
+            == errors + 1
+        )
@@ -0,0 +1,91 @@
+import asyncio
+from hashlib import sha3_512
+from uuid import uuid4
+
+import pytest
+
+from app.adapters import InMemoryUserRepository
+from app.domain import User
+from app.passwords import PasswordHasher, ScryptScheme, Sha3Scheme
+from app.service import UserService
+
+
+class TestPasswordHasher:
+
+    @pytest.mark.asyncio
+    async def test_hash_is_versioned_scrypt(self) -> None:
+        hasher = PasswordHasher()
+        stored = await hasher.hash("secret", "salt")
+        assert stored.startswith(b"$scrypt$v=1$n=16384,r=8,p=1$")
+        assert await hasher.verify("secret", "salt", stored)
+        assert not await hasher.verify("wrong", "salt", stored)
+        assert not await hasher.verify("secret", "other salt", stored)
+        assert not hasher.needs_rehash(stored)
+
+    @pytest.mark.asyncio
+    async def test_legacy_sha3_hashes_still_verify(self) -> None:
+        hasher = PasswordHasher()
+        stored = sha3_512(b"salt" + b"secret").digest()
+        assert await hasher.verify("secret", "salt", stored)
+        assert not await hasher.verify("wrong", "salt", stored)
+        assert hasher.needs_rehash(stored)
+
+    @pytest.mark.asyncio
+    async def test_legacy_sha3_hashes_starting_with_a_dollar_still_verify(
+        self,
+    ) -> None:
+        hasher = PasswordHasher()
+        salt = next(
+            f"salt{i}"
+            for i in range(10_000)
+            if sha3_512(f"salt{i}secret".encode()).digest().startswith(b"$")
+        )
+        stored = sha3_512(f"{salt}secret".encode()).digest()
+        assert await hasher.verify("secret", salt, stored)
+        assert not await hasher.verify("wrong", salt, stored)
+
+    @pytest.mark.asyncio
+    async def test_changed_parameters_need_rehash(self) -> None:
+        weak = PasswordHasher(ScryptScheme(n=2**10))
+        stored = await weak.hash("secret", "salt")
+        strong = PasswordHasher(ScryptScheme(n=2**12))
+        assert await strong.verify("secret", "salt", stored)
+        assert strong.needs_rehash(stored)
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_capped(self) -> None:
+        running = peak = 0
+
+        class SlowScheme(Sha3Scheme):
+
+            def hash(self, password: str, salt: str) -> bytes:
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                try:
+                    return super().hash(password, salt)
+                finally:
+                    running -= 1
+
+        hasher = PasswordHasher(SlowScheme(), max_concurrency=2)
+        await asyncio.gather(*(hasher.hash("secret", "salt") for _ in range(20)))
+        assert peak <= 2
+
+    @pytest.mark.asyncio
+    async def test_login_rehashes_legacy_password(self) -> None:
+        repository = InMemoryUserRepository()
+        user = User(
+            id=uuid4(),
+            firstname="John",
+            lastname="Doe",
+            email="johndoe@test.com",
+            password_hash=sha3_512(b"salt" + b"test").digest(),
+            salt="salt",
+        )
+        await repository.save(user)
+        service = UserService(repository)
+
+        assert await service.authenticate_user("johndoe@test.com", "test")
+        rehashed = await repository.get(user.id)
+        assert rehashed.password_hash.startswith(ScryptScheme.PREFIX)
+        assert await service.authenticate_user("johndoe@test.com", "test")
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from uuid import uuid4
+
+import pytest
+
+from app.domain import Frequency, Series
+from app.exceptions import InvalidRecurrenceError, TimeZoneGivenError
+
+START = datetime.now().replace(microsecond=0) + timedelta(days=1)
+
+
+def make_series(**fields: Any) -> Series:
+    defaults: dict[str, Any] = dict(
+        id=uuid4(),
+        title="test",
+        start_at=START,
+        therapist_id=uuid4(),
+        patient_id=uuid4(),
+    )
+    return Series(**defaults | fields)
+
+
+class TestOccurrences:
+
+    def test_count_and_until_end_the_series(self) -> None:
+        by_count = make_series(count=3)
+        by_date = make_series(until=START + timedelta(weeks=2, days=1))
+        for a_series in (by_count, by_date):
+            starts = [x.start_at for x in a_series.occurrences()]
+            assert starts == [START + timedelta(weeks=i) for i in range(3)]
+            assert a_series.end_at == starts[-1] + a_series.duration
+
+    def test_exceptions_are_skipped_but_counted(self) -> None:
+        a_series = make_series(
+            frequency=Frequency.DAILY,
+            interval=2,
+            count=4,
+            exceptions=frozenset({START + timedelta(days=2)}),
+        )
+        starts = [x.start_at for x in a_series.occurrences()]
+        assert starts == [START + timedelta(days=i) for i in (0, 4, 6)]
+
+    def test_occurrences_in_a_half_open_range(self) -> None:
+        a_series = make_series(frequency=Frequency.DAILY)
+        found = a_series.occurrences(
+            START + timedelta(hours=1), START + timedelta(days=3)
+        )
+        assert [x.start_at for x in found] == [
+            START + timedelta(days=1),
+            START + timedelta(days=2),
+        ]
+
+    def test_occurrences_are_lazy_and_keep_their_ids(self) -> None:
+        a_series = make_series()
+        first = next(a_series.occurrences())
+        again = next(a_series.occurrences())
+        assert first.id == again.id
+        assert first.id.version == 4
+        assert first.id != a_series.occurrence(1).id
+
+    def test_overlapping_includes_touching_occurrences(self) -> None:
+        a_series = make_series(frequency=Frequency.DAILY)
+        end = START + a_series.duration
+        found = a_series.overlapping(end, end + timedelta(days=1))
+        assert [x.start_at for x in found] == [START, START + timedelta(days=1)]
+
+    @pytest.mark.parametrize(
+        "fields",
+        [
+            dict(duration=timedelta(weeks=1)),
+            dict(until=START - timedelta(days=1)),
+        ],
+    )
+    def test_invalid_series(self, fields: dict[str, Any]) -> None:
+        with pytest.raises(InvalidRecurrenceError):
+            make_series(**fields)
+
+    @pytest.mark.parametrize(
+        "fields",
+        [
+            dict(start_at=START.astimezone(timezone.utc)),
+            dict(until=(START + timedelta(weeks=2)).astimezone(timezone.utc)),
+            dict(exceptions=frozenset({START.astimezone(timezone.utc)})),
+        ],
+    )
+    def test_times_with_a_time_zone_are_rejected(self, fields: dict[str, Any]) -> None:
+        with pytest.raises(TimeZoneGivenError):
+            make_series(**fields)
+
+
+class TestConflicts:
+
+    def test_series_of_other_people_never_conflict(self) -> None:
+        assert make_series().first_conflict_with(make_series()) is None
+
+    def test_conflict_far_after_the_start_is_found(self) -> None:
+        therapist_id = uuid4()
+        every_third_day = make_series(
+            frequency=Frequency.DAILY, interval=3, therapist_id=therapist_id
+        )
+        every_other_week = make_series(
+            start_at=START + timedelta(days=1),
+            interval=2,
+            therapist_id=therapist_id,
+        )
+        conflict = every_third_day.first_conflict_with(every_other_week)
+        assert conflict is not None
+        assert conflict.start_at == START + timedelta(days=15)
+        assert every_other_week.first_conflict_with(every_third_day) is not None
+
+    def test_interleaved_series_do_not_conflict(self) -> None:
+        therapist_id = uuid4()
+        even_weeks = make_series(interval=2, therapist_id=therapist_id)
+        odd_weeks = make_series(
+            start_at=START + timedelta(weeks=1), interval=2, therapist_id=therapist_id
+        )
+        assert even_weeks.first_conflict_with(odd_weeks) is None
+
+    def test_exceptions_can_remove_the_only_conflicts(self) -> None:
+        therapist_id = uuid4()
+        weekly = make_series(therapist_id=therapist_id)
+        clashing = START + timedelta(weeks=3)
+        short = make_series(start_at=clashing, count=1, therapist_id=therapist_id)
+        assert weekly.first_conflict_with(short) is not None
+        skipping = make_series(
+            therapist_id=therapist_id, exceptions=frozenset({clashing})
+        )
+        assert skipping.first_conflict_with(short) is None
+        assert short.first_conflict_with(skipping) is None
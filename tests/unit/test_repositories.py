@@ -0,0 +1,384 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator
+from uuid import UUID, uuid4
+
+import pytest
+
+from app.adapters import (
+    InMemoryAppointmentRepository,
+    InMemorySeriesRepository,
+    InMemoryUserRepository,
+    ShardedAppointmentRepository,
+    SQLiteAppointmentRepository,
+    SQLiteDatabase,
+    SQLiteSeriesRepository,
+    SQLiteUserRepository,
+)
+from app.domain import (
+    Appointment,
+    AppointmentRepository,
+    Frequency,
+    Series,
+    SeriesRepository,
+    User,
+    UserRepository,
+)
+from app.exceptions import EmailAlreadyUsedError
+
+START = datetime.now().replace(microsecond=0) + timedelta(days=1)
+
+
+@pytest.fixture
+def sqlite_database(tmp_path: Path) -> Iterator[SQLiteDatabase]:
+    database = SQLiteDatabase(tmp_path / "kin.sqlite3")
+    yield database
+    database.close()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def user_repository(request: pytest.FixtureRequest) -> UserRepository:
+    if request.param == "sqlite":
+        return SQLiteUserRepository(request.getfixturevalue("sqlite_database"))
+    return InMemoryUserRepository()
+
+
+@pytest.fixture(params=["memory", "sqlite", "columnar", "sharded"])
+def appointment_repository(request: pytest.FixtureRequest) -> AppointmentRepository:
+    if request.param == "sqlite":
+        return SQLiteAppointmentRepository(request.getfixturevalue("sqlite_database"))
+    if request.param == "columnar":
+        columnar = pytest.importorskip("app.adapters.columnar")
+        repository: AppointmentRepository = columnar.ColumnarAppointmentRepository(
+            capacity=2
+        )
+        return repository
+    if request.param == "sharded":
+        return ShardedAppointmentRepository(
+            {str(i): InMemoryAppointmentRepository() for i in range(3)}
+        )
+    return InMemoryAppointmentRepository()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def series_repository(request: pytest.FixtureRequest) -> SeriesRepository:
+    if request.param == "sqlite":
+        return SQLiteSeriesRepository(request.getfixturevalue("sqlite_database"))
+    return InMemorySeriesRepository()
+
+
+def make_appointment(
+    at: datetime, therapist_id: UUID, patient_id: UUID, minutes: int = 30
+) -> Appointment:
+    return Appointment(
+        id=uuid4(),
+        title="test",
+        start_at=at,
+        duration=timedelta(minutes=minutes),
+        therapist_id=therapist_id,
+        patient_id=patient_id,
+    )
+
+
+def make_user(email: str) -> User:
+    return User(
+        id=uuid4(),
+        firstname="test",
+        lastname="test",
+        email=email,
+        password_hash=b"hash",
+        salt="salt",
+    )
+
+
+class TestUserRepository:
+    @pytest.mark.asyncio
+    async def test_get_by_normalized_email(
+        self, user_repository: UserRepository
+    ) -> None:
+        repository = user_repository
+        user = make_user("john@test.com")
+        await repository.save(user)
+        assert await repository.get_by_email("John@Test.com ") == user
+        assert await repository.get_by_email("jane@test.com") is None
+
+    @pytest.mark.asyncio
+    async def test_email_is_unique(self, user_repository: UserRepository) -> None:
+        repository = user_repository
+        await repository.save(make_user("john@test.com"))
+        with pytest.raises(EmailAlreadyUsedError):
+            await repository.save(make_user("JOHN@test.com"))
+
+    @pytest.mark.asyncio
+    async def test_save_many_saves_all_or_none(
+        self, user_repository: UserRepository
+    ) -> None:
+        repository = user_repository
+        await repository.save(make_user("john@test.com"))
+        with pytest.raises(EmailAlreadyUsedError):
+            await repository.save_many(
+                [make_user("jane@test.com"), make_user("John@test.com")]
+            )
+        assert await repository.get_by_email("jane@test.com") is None
+
+        users = [make_user("jane@test.com"), make_user("jim@test.com")]
+        assert await repository.save_many(users) == [x.id for x in users]
+        assert len(await repository.list()) == 3
+
+    @pytest.mark.asyncio
+    async def test_changing_email_frees_the_old_one(
+        self, user_repository: UserRepository
+    ) -> None:
+        repository = user_repository
+        user = make_user("john@test.com")
+        await repository.save(user)
+        await repository.save(user.model_copy(update=dict(email="johnny@test.com")))
+        await repository.save(make_user("john@test.com"))
+        assert len(await repository.list()) == 2
+
+
+class TestAppointmentRepositoryQuery:
+    @pytest.mark.asyncio
+    async def test_query_without_filters_returns_everything_by_start(
+        self, appointment_repository: AppointmentRepository
+    ) -> None:
+        repository = appointment_repository
+        later = make_appointment(START + timedelta(hours=2), uuid4(), uuid4())
+        sooner = make_appointment(START, uuid4(), uuid4())
+        await repository.save(later)
+        await repository.save(sooner)
+        assert await repository.query() == [sooner, later]
+
+    @pytest.mark.asyncio
+    async def test_query_by_therapist_and_patient(
+        self, appointment_repository: AppointmentRepository
+    ) -> None:
+        repository = appointment_repository
+        therapist, patient, someone_else = uuid4(), uuid4(), uuid4()
+        expected = make_appointment(START, therapist, patient)
+        await repository.save(expected)
+        await repository.save(
+            make_appointment(START + timedelta(hours=1), therapist, someone_else)
+        )
+        await repository.save(
+            make_appointment(START + timedelta(hours=2), someone_else, patient)
+        )
+
+        assert await repository.query(therapist_id=therapist, patient_id=patient) == [
+            expected
+        ]
+        assert len(await repository.query(therapist_id=therapist)) == 2
+        assert len(await repository.query(patient_id=patient)) == 2
+        assert await repository.query(therapist_id=uuid4()) == []
+
+    @pytest.mark.asyncio
+    async def test_query_time_range_is_half_open(
+        self, appointment_repository: AppointmentRepository
+    ) -> None:
+        repository = appointment_repository
+        therapist = uuid4()
+        appointments = [
+            make_appointment(START + timedelta(hours=i), therapist, uuid4())
+            for i in range(4)
+        ]
+        for an_appointment in appointments:
+            await repository.save(an_appointment)
+
+        found = await repository.query(
+            therapist_id=therapist,
+            start=START + timedelta(hours=1),
+            end=START + timedelta(hours=3),
+        )
+        assert found == appointments[1:3]
+
+    @pytest.mark.asyncio
+    async def test_query_follows_rescheduled_appointments(
+        self, appointment_repository: AppointmentRepository
+    ) -> None:
+        repository = appointment_repository
+        therapist, new_therapist = uuid4(), uuid4()
+        appointment = make_appointment(START, therapist, uuid4())
+        await repository.save(appointment)
+        moved = appointment.model_copy(
+            update=dict(start_at=START + timedelta(days=2), therapist_id=new_therapist)
+        )
+        await repository.save(moved)
+
+        assert await repository.query(therapist_id=therapist) == []
+        assert await repository.query(
+            therapist_id=new_therapist, start=START + timedelta(days=1)
+        ) == [moved]
+
+
+class TestAppointmentRepositoryOverlaps:
+    @pytest.mark.asyncio
+    async def test_find_overlapping_by_therapist_or_patient(
+        self, appointment_repository: AppointmentRepository
+    ) -> None:
+        repository = appointment_repository
+        therapist, patient = uuid4(), uuid4()
+        long_one = make_appointment(START, therapist, uuid4(), minutes=240)
+        patients_one = make_appointment(START + timedelta(hours=2), uuid4(), patient)
+        unrelated = make_appointment(START + timedelta(hours=2), uuid4(), uuid4())
+        later = make_appointment(START + timedelta(hours=6), therapist, patient)
+        for an_appointment in (long_one, patients_one, unrelated, later):
+            await repository.save(an_appointment)
+
+        found = await repository.find_overlapping(
+            {therapist},
+            {patient},
+            START + timedelta(hours=2),
+            START + timedelta(hours=2, minutes=30),
+        )
+        assert sorted(found, key=lambda x: x.start_at) == [long_one, patients_one]
+
+    @pytest.mark.asyncio
+    async def test_get_returns_the_saved_appointment(
+        self, appointment_repository: AppointmentRepository
+    ) -> None:
+        appointment = make_appointment(START, uuid4(), uuid4(), minutes=45)
+        await appointment_repository.save(appointment)
+        assert await appointment_repository.get(appointment.id) == appointment
+        with pytest.raises(KeyError):
+            await appointment_repository.get(uuid4())
+
+    @pytest.mark.asyncio
+    async def test_deleted_appointments_are_gone_from_every_lookup(
+        self, appointment_repository: AppointmentRepository
+    ) -> None:
+        therapist, patient = uuid4(), uuid4()
+        appointments = [
+            make_appointment(START + timedelta(hours=i), therapist, patient)
+            for i in range(3)
+        ]
+        await appointment_repository.save_many(appointments)
+        await appointment_repository.delete(appointments[0].id)
+
+        with pytest.raises(KeyError):
+            await appointment_repository.get(appointments[0].id)
+        remaining = await appointment_repository.query(therapist_id=therapist)
+        assert remaining == appointments[1:]
+        overlapping = await appointment_repository.find_overlapping(
+            {therapist}, {patient}, START, START + timedelta(minutes=30)
+        )
+        assert overlapping == []
+        with pytest.raises(KeyError):
+            await appointment_repository.delete(appointments[0].id)
+
+    @pytest.mark.asyncio
+    async def test_appointments_that_took_place_load_again(
+        self, appointment_repository: AppointmentRepository
+    ) -> None:
+        last_week = START - timedelta(days=8)
+        appointment = Appointment.hydrate(
+            id=uuid4(),
+            title="test",
+            start_at=last_week,
+            duration=timedelta(minutes=30),
+            therapist_id=uuid4(),
+            patient_id=uuid4(),
+        )
+        await appointment_repository.save(appointment)
+        assert await appointment_repository.get(appointment.id) == appointment
+        assert await appointment_repository.query(end=START) == [appointment]
+
+
+class TestAppointmentRepositoryPagination:
+    @pytest.mark.asyncio
+    async def test_keyset_pages_cover_every_appointment_once(
+        self, appointment_repository: AppointmentRepository
+    ) -> None:
+        therapist = uuid4()
+        appointments = [
+            make_appointment(START + timedelta(hours=i // 2), therapist, uuid4())
+            for i in range(7)
+        ]
+        for an_appointment in appointments:
+            await appointment_repository.save(an_appointment)
+
+        pages = []
+        after = None
+        while page := await appointment_repository.query(
+            therapist_id=therapist, after=after, limit=3
+        ):
+            pages.append(page)
+            after = page[-1].key
+        assert [len(page) for page in pages] == [3, 3, 1]
+        assert [x for page in pages for x in page] == sorted(
+            appointments, key=lambda x: x.key
+        )
+
+    @pytest.mark.asyncio
+    async def test_stream_yields_every_match_in_order(
+        self, appointment_repository: AppointmentRepository
+    ) -> None:
+        therapist = uuid4()
+        appointments = [
+            make_appointment(START + timedelta(hours=i), therapist, uuid4())
+            for i in range(5)
+        ]
+        await appointment_repository.save(make_appointment(START, uuid4(), uuid4()))
+        for an_appointment in appointments:
+            await appointment_repository.save(an_appointment)
+
+        streamed = [
+            x
+            async for x in appointment_repository.stream(
+                therapist_id=therapist, batch_size=2
+            )
+        ]
+        assert streamed == appointments
+
+
+class TestSeriesRepository:
+    @pytest.mark.asyncio
+    async def test_saved_series_load_again(
+        self, series_repository: SeriesRepository
+    ) -> None:
+        series = Series(
+            id=uuid4(),
+            title="test",
+            start_at=START,
+            duration=timedelta(minutes=45),
+            therapist_id=uuid4(),
+            patient_id=uuid4(),
+            frequency=Frequency.DAILY,
+            interval=3,
+            until=START + timedelta(weeks=10),
+            exceptions=frozenset({START + timedelta(days=3)}),
+        )
+        await series_repository.save(series)
+        assert await series_repository.get(series.id) == series
+        assert await series_repository.list() == [series]
+        with pytest.raises(KeyError):
+            await series_repository.get(uuid4())
+
+    @pytest.mark.asyncio
+    async def test_find_by_therapist_or_patient(
+        self, series_repository: SeriesRepository
+    ) -> None:
+        therapist_id, patient_id = uuid4(), uuid4()
+        mine, theirs, other = (
+            Series(
+                id=uuid4(),
+                title="test",
+                start_at=START,
+                therapist_id=a_therapist_id,
+                patient_id=a_patient_id,
+                count=count,
+            )
+            for a_therapist_id, a_patient_id, count in (
+                (therapist_id, uuid4(), None),
+                (uuid4(), patient_id, 4),
+                (uuid4(), uuid4(), 1),
+            )
+        )
+        for a_series in (mine, theirs, other):
+            await series_repository.save(a_series)
+
+        found = await series_repository.find({therapist_id}, {patient_id})
+        assert sorted(found, key=lambda x: x.id) == sorted(
+            [mine, theirs], key=lambda x: x.id
+        )
+        assert await series_repository.find({therapist_id}, set()) == [mine]
+        assert await series_repository.find(set(), set()) == []
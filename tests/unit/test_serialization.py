@@ -0,0 +1,81 @@
+import json
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from app.domain import Appointment
+from app.main import AppointmentsResponse
+from app.serialization import AppointmentEncoder
+
+
+def make_appointments(count: int) -> list[Appointment]:
+    at = datetime.now() + timedelta(days=1)
+    return [
+        Appointment(
+            id=uuid4(),
+            title=f'Appointment "{i}" é',
+            start_at=at + timedelta(hours=i),
+            patient_id=uuid4(),
+            therapist_id=uuid4(),
+        )
+        for i in range(count)
+    ]
+
+
+class TestAppointmentEncoder:
+
+    def test_page_matches_the_response_model(self) -> None:
+        encoder = AppointmentEncoder()
+        appointments = make_appointments(3)
+        for next_cursor in (None, "c3RhcnQ="):
+            expected = AppointmentsResponse(
+                appointments=appointments, next_cursor=next_cursor
+            ).model_dump(mode="json", exclude_none=True)
+            assert (
+                json.loads(encoder.encode_page(appointments, next_cursor)) == expected
+            )
+
+    def test_empty_page(self) -> None:
+        assert json.loads(AppointmentEncoder().encode_page([])) == {"appointments": []}
+
+    def test_encodings_are_cached_until_invalidated(self) -> None:
+        encoder = AppointmentEncoder()
+        (appointment,) = make_appointments(1)
+        first = encoder.encode(appointment)
+        renamed = appointment.model_copy(update={"title": "Renamed"})
+        assert encoder.encode(renamed) is first
+
+        encoder.invalidate([appointment.id])
+        assert b"Renamed" in encoder.encode(renamed)
+
+    def test_cache_is_bounded(self) -> None:
+        encoder = AppointmentEncoder(cache_size=2)
+        for an_appointment in make_appointments(5):
+            encoder.encode(an_appointment)
+        assert len(encoder) == 2
+
+    def test_oldest_entries_are_evicted_first(self) -> None:
+        encoder = AppointmentEncoder(cache_size=2)
+        first, second, third = make_appointments(3)
+        encoded = encoder.encode_many([first, second, third])
+        assert len(encoder) == 2
+        assert encoder.encode(third) is encoded[2]
+        assert encoder.encode(first) is not encoded[0]
+
+    def test_misses_are_dumped_together_like_one_by_one(self) -> None:
+        appointments = make_appointments(4)
+        appointments[1].title = '},{"id":"x"}\\'
+        appointments[2].title = "},{\n"
+        encoder = AppointmentEncoder()
+        encoder.encode(appointments[2])
+        assert encoder.encode_many(appointments) == [
+            AppointmentEncoder.dump(an_appointment) for an_appointment in appointments
+        ]
+
+    def test_dumping_leaves_the_cache_alone(self) -> None:
+        encoder = AppointmentEncoder()
+        (appointment,) = make_appointments(1)
+        assert encoder.dump(appointment) == encoder.encode(appointment)
+        assert len(encoder) == 1
+        encoder.invalidate([appointment.id])
+        encoder.dump(appointment)
+        assert len(encoder) == 0
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+from typing import Any
+from uuid import UUID, uuid4
+
+import pytest
+
+from app import wiring
+from app.adapters import InMemoryAppointmentRepository, ShardedAppointmentRepository
+from app.domain import Appointment
+
+START = datetime.now().replace(microsecond=0) + timedelta(days=1)
+
+
+class CountingRepository(InMemoryAppointmentRepository):
+    """Counts the reads reaching it."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.reads = 0
+
+    async def query(self, **filters: Any) -> list[Appointment]:
+        self.reads += 1
+        return await super().query(**filters)
+
+    async def find_overlapping(self, *args: Any) -> list[Appointment]:
+        self.reads += 1
+        return await super().find_overlapping(*args)
+
+
+def make_appointment(hours: int, therapist_id: UUID, patient_id: UUID) -> Appointment:
+    return Appointment(
+        id=uuid4(),
+        title="test",
+        start_at=START + timedelta(hours=hours),
+        therapist_id=therapist_id,
+        patient_id=patient_id,
+    )
+
+
+def make_sharded(count: int) -> ShardedAppointmentRepository:
+    return ShardedAppointmentRepository(
+        {f"shard-{i}": CountingRepository() for i in range(count)}
+    )
+
+
+def reads(repository: ShardedAppointmentRepository) -> list[int]:
+    return [
+        x.reads for x in repository.shards.values() if isinstance(x, CountingRepository)
+    ]
+
+
+class TestShardedAppointmentRepository:
+
+    @pytest.mark.asyncio
+    async def test_therapist_reads_go_to_one_shard(self) -> None:
+        repository = make_sharded(4)
+        therapist = uuid4()
+        appointments = [make_appointment(i, therapist, uuid4()) for i in range(3)]
+        await repository.save_many(appointments)
+
+        assert await repository.query(therapist_id=therapist) == appointments
+        await repository.find_overlapping(
+            {therapist}, set(), START, START + timedelta(days=1)
+        )
+        assert sorted(reads(repository)) == [0, 0, 0, 2]
+
+    @pytest.mark.asyncio
+    async def test_patient_pages_merge_every_shard_in_order(self) -> None:
+        repository = make_sharded(4)
+        patient = uuid4()
+        appointments = [make_appointment(i, uuid4(), patient) for i in range(20)]
+        await repository.save_many(reversed(appointments))
+
+        first = await repository.query(patient_id=patient, limit=8)
+        rest = await repository.query(patient_id=patient, after=first[-1].key)
+        assert first + rest == appointments
+        assert reads(repository) == [2, 2, 2, 2]
+        streamed = [x async for x in repository.stream(batch_size=3)]
+        assert streamed == appointments
+
+    @pytest.mark.asyncio
+    async def test_adding_a_shard_moves_only_the_therapists_it_takes(self) -> None:
+        repository = make_sharded(4)
+        therapists = [uuid4() for _ in range(400)]
+        await repository.save_many(
+            make_appointment(0, a_therapist, uuid4()) for a_therapist in therapists
+        )
+        before = {x: repository.shard_for(x) for x in therapists}
+
+        added = CountingRepository()
+        moved = await repository.add_shard("shard-4", added)
+        assert 40 < moved < 140
+        for a_therapist in therapists:
+            owner = repository.shard_for(a_therapist)
+            assert owner is before[a_therapist] or owner is added
+            assert len(await owner.query(therapist_id=a_therapist)) == 1
+        assert len(await repository.list()) == 400
+
+    @pytest.mark.parametrize("value", ["two", "0", "-1", ""])
+    def test_a_bad_shard_count_is_reported(
+        self, monkeypatch: pytest.MonkeyPatch, value: str
+    ) -> None:
+        monkeypatch.setenv("KIN_SHARDS", value)
+        with pytest.raises(ValueError, match="KIN_SHARDS"):
+            wiring.from_environment()
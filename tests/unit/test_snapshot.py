@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+
+from app.domain import Appointment, Frequency, Series, User
+from app.exceptions import InvalidSnapshotError
+
+snapshots = pytest.importorskip("app.adapters.snapshot")
+
+START = datetime.now().replace(microsecond=0) + timedelta(days=1)
+
+
+def make_appointment(hours: int, title: str = "weekly session") -> Appointment:
+    return Appointment(
+        id=uuid4(),
+        title=title,
+        start_at=START + timedelta(hours=hours),
+        therapist_id=uuid4(),
+        patient_id=uuid4(),
+    )
+
+
+class TestSnapshot:
+
+    @pytest.mark.asyncio
+    async def test_dump_and_load_round_trip(self, tmp_path: Path) -> None:
+        path = tmp_path / "kin.snapshot"
+        snapshot = snapshots.Snapshot()
+        appointments = [make_appointment(i, f"title {i % 3}") for i in range(10)]
+        await snapshot.appointments.save_many(appointments)
+        user = User(
+            id=uuid4(),
+            firstname="John",
+            lastname="Doe",
+            email="johndoe@test.com",
+            password_hash=bytes(range(64)),
+            salt="salt",
+        )
+        await snapshot.users.save(user)
+        series = Series(
+            id=uuid4(),
+            title="series",
+            start_at=START,
+            therapist_id=uuid4(),
+            patient_id=uuid4(),
+            frequency=Frequency.DAILY,
+            count=5,
+            exceptions=frozenset({START + timedelta(days=1)}),
+        )
+        await snapshot.series.save(series)
+        await snapshots.dump(path, snapshot)
+
+        loaded = await snapshots.load(path)
+        assert await loaded.appointments.query() == appointments
+        assert await loaded.users.get_by_email("JohnDoe@test.com") == user
+        assert await loaded.series.find({series.therapist_id}, set()) == [series]
+
+    @pytest.mark.asyncio
+    async def test_writes_after_loading_do_not_reach_the_file(
+        self, tmp_path: Path
+    ) -> None:
+        path = tmp_path / "kin.snapshot"
+        snapshot = snapshots.Snapshot()
+        appointments = [make_appointment(i) for i in range(3)]
+        await snapshot.appointments.save_many(appointments)
+        await snapshots.dump(path, snapshot)
+        written = path.read_bytes()
+
+        loaded = await snapshots.load(path)
+        moved = appointments[0].model_copy(update=dict(title="moved"))
+        await loaded.appointments.save(moved)
+        await loaded.appointments.save(make_appointment(5))
+        assert await loaded.appointments.get(moved.id) == moved
+        assert len(loaded.appointments) == 4
+        assert path.read_bytes() == written
+
+    @pytest.mark.asyncio
+    async def test_an_empty_snapshot_loads(self, tmp_path: Path) -> None:
+        path = tmp_path / "kin.snapshot"
+        await snapshots.dump(path, snapshots.Snapshot())
+        loaded = await snapshots.load(path)
+        assert await loaded.appointments.list() == []
+        await loaded.appointments.save(make_appointment(0))
+        assert len(loaded.appointments) == 1
+
+    @pytest.mark.asyncio
+    async def test_other_files_are_rejected(self, tmp_path: Path) -> None:
+        path = tmp_path / "kin.snapshot"
+        path.write_bytes(b"not a snapshot at all")
+        with pytest.raises(InvalidSnapshotError):
+            await snapshots.load(path)
@@ -1,29 +1,48 @@
-from uuid import UUID, uuid4
+import asyncio
+from typing import AsyncIterator, Iterable
+from uuid import UUID
 
 import pytest
 from joserfc import jwt
 
-from app.domain.ports import UserRepository
-from app.domain.users import User
+from app.adapters import InMemoryUserRepository
+from app.domain import ImportStatus, User
+from app.exceptions import (
+    EmailAlreadyUsedError,
+    UserDontExistsError,
+    WrongPasswordError,
+)
+from app.imports import csv_rows, lines, ndjson_rows
+from app.passwords import PasswordHasher, ScryptScheme
 from app.service import UserService
 
 
-class InMemoryUserRepository(UserRepository):
+class CountingUserRepository(InMemoryUserRepository):
+    """Counts the batches saved."""
 
     def __init__(self) -> None:
-        self._users: dict[UUID, User] = {}
+        super().__init__()
+        self.batches = 0
 
-    async def get(self, id: UUID) -> User:
-        return self._users[id]
+    async def save_many(self, users: Iterable[User]) -> list[UUID]:
+        self.batches += 1
+        return await super().save_many(users)
 
-    async def save(self, user: User) -> UUID:
-        id = uuid4()
-        user.id = id
-        self._users[id] = user
-        return id
 
-    async def list(self) -> list[User]:
-        return list(self._users.values())
+class CountingScheme(ScryptScheme):
+    """Counts the hashes computed."""
+
+    hashed = 0
+
+    def hash(self, password: str, salt: str) -> bytes:
+        digest = super().hash(password, salt)
+        self.hashed += 1
+        return digest
+
+
+async def chunked(data: bytes, size: int) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
 
 
 class TestUserService:
@@ -32,13 +51,14 @@ class TestUserService:
     async def test_create_user(self) -> None:
         repository = InMemoryUserRepository()
         service = UserService(repository)
-        assert service.users == []
+        assert await repository.list() == []
 
         await service.create_user("John", "Doe", "johndoe@test.com", "test")
-        assert len(service.users) == 1
-        assert service.users[0].firstname == "John"
-        assert service.users[0].lastname == "Doe"
-        assert service.users[0].password_hash != "test".encode()
+        users = await repository.list()
+        assert len(users) == 1
+        assert users[0].firstname == "John"
+        assert users[0].lastname == "Doe"
+        assert users[0].password_hash != "test".encode()
 
     @pytest.mark.asyncio
     async def test_encode_token(self) -> None:
@@ -61,3 +81,140 @@ class TestUserService:
         await service.create_user("John", "Doe", "johndoe@test.com", "test")
         bearer_token: str = await service.authenticate_user("johndoe@test.com", "test")
         assert bearer_token
+
+        claims = jwt.decode(bearer_token, service.secret_key).claims
+        assert claims["email"] == "johndoe@test.com"
+        assert claims["exp"] > claims["iat"]
+        assert "salt" not in claims and "password_hash" not in claims
+
+    @pytest.mark.asyncio
+    async def test_authenticate_user_ignores_email_case(self) -> None:
+        repository = InMemoryUserRepository()
+        service = UserService(repository)
+        await service.create_user("John", "Doe", "johndoe@test.com", "test")
+        assert await service.authenticate_user(" JohnDoe@Test.com", "test")
+
+    @pytest.mark.asyncio
+    async def test_authenticate_unknown_user(self) -> None:
+        service = UserService(InMemoryUserRepository())
+        with pytest.raises(UserDontExistsError):
+            await service.authenticate_user("nobody@test.com", "test")
+
+    @pytest.mark.asyncio
+    async def test_authenticate_user_with_wrong_password(self) -> None:
+        service = UserService(InMemoryUserRepository())
+        await service.create_user("John", "Doe", "johndoe@test.com", "test")
+        with pytest.raises(WrongPasswordError):
+            await service.authenticate_user("johndoe@test.com", "wrong")
+
+    @pytest.mark.asyncio
+    async def test_create_user_rejects_duplicate_email(self) -> None:
+        repository = InMemoryUserRepository()
+        service = UserService(repository)
+        await service.create_user("John", "Doe", "johndoe@test.com", "test")
+        with pytest.raises(EmailAlreadyUsedError):
+            await service.create_user("Jane", "Doe", "JOHNDOE@test.com", "test")
+        assert len(await repository.list()) == 1
+
+
+class TestUserImport:
+
+    @pytest.mark.asyncio
+    async def test_rows_are_created_in_batches_with_a_result_each(self) -> None:
+        repository = CountingUserRepository()
+        service = UserService(repository)
+        await service.create_user("John", "Doe", "johndoe@test.com", "test")
+        upload = (
+            b"firstname,lastname,email,password\r\n"
+            b"Jane,Doe,jane@test.com,secret\r\n"
+            b"John,Again,JohnDoe@test.com,secret\r\n"
+            b"\r\n"
+            b"Bad,Email,not-an-email,secret\r\n"
+            b"Too,Few,fields\r\n"
+            b'"Doe, Jim",Doe,jim@test.com,secret\r\n'
+            b"Jane,Twice,JANE@test.com,secret\r\n"
+            b"Joe,Doe,joe@test.com,secret"
+        )
+
+        results = [
+            x async for x in service.import_users(csv_rows(chunked(upload, 7)), 3)
+        ]
+        assert [(x.row, x.status) for x in results] == [
+            (1, ImportStatus.CREATED),
+            (2, ImportStatus.DUPLICATE),
+            (3, ImportStatus.INVALID),
+            (4, ImportStatus.INVALID),
+            (5, ImportStatus.CREATED),
+            (6, ImportStatus.DUPLICATE),
+            (7, ImportStatus.CREATED),
+        ]
+        assert results[2].detail and results[2].detail.startswith("email:")
+        assert results[3].detail == "Expected 4 fields, got 3"
+        jim = await repository.get_by_email("jim@test.com")
+        assert jim is not None and jim.firstname == "Doe, Jim"
+        assert results[4].user_id == jim.id
+        assert repository.batches == 3
+        assert await service.authenticate_user("joe@test.com", "secret")
+
+    @pytest.mark.asyncio
+    async def test_ndjson_rows_report_what_is_wrong(self) -> None:
+        service = UserService(InMemoryUserRepository())
+        upload = (
+            b'{"firstname": "Jane", "lastname": "Doe", "email": "jane@test.com",'
+            b' "password": "secret"}\n'
+            b"{not json\n"
+            b"[1, 2]\n"
+            b'{"firstname": "Jim", "email": "jim@test.com", "password": "secret"}\n'
+        )
+        results = [
+            x async for x in service.import_users(ndjson_rows(chunked(upload, 16)))
+        ]
+        assert [x.status for x in results] == [
+            ImportStatus.CREATED,
+            ImportStatus.INVALID,
+            ImportStatus.INVALID,
+            ImportStatus.INVALID,
+        ]
+        assert [x.detail for x in results[1:]] == [
+            "Invalid JSON",
+            "Expected a JSON object",
+            "lastname: Field required",
+        ]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("chunk_size", [3, 1024])
+    async def test_long_lines_are_reported_and_skipped(self, chunk_size: int) -> None:
+        upload = b"short\n" + b"x" * 40 + b"\nexactly sixteen!\n" + b"y" * 17
+        found = [x async for x in lines(chunked(upload, chunk_size), max_length=16)]
+        assert found[0] == "short" and found[2] == "exactly sixteen!"
+        assert [str(x) for x in found[1::2]] == ["Line longer than 16 bytes"] * 2
+        assert len(found) == 4
+
+    @pytest.mark.asyncio
+    async def test_a_csv_header_too_long_ends_the_upload(self) -> None:
+        upload = b"email," * 20_000 + b"\nJane,Doe,jane@test.com,secret\n"
+        found = [x async for x in csv_rows(chunked(upload, 1024))]
+        assert len(found) == 1 and isinstance(found[0], ValueError)
+
+    @pytest.mark.asyncio
+    async def test_logins_do_not_wait_for_the_whole_import(self) -> None:
+        scheme = CountingScheme()
+        service = UserService(
+            InMemoryUserRepository(), PasswordHasher(scheme, max_concurrency=1)
+        )
+        await service.create_user("John", "Doe", "johndoe@test.com", "test")
+        scheme.hashed = 0
+        upload = b"firstname,lastname,email,password\n" + b"".join(
+            b"User,%d,user%d@test.com,secret\n" % (i, i) for i in range(24)
+        )
+
+        async def run_import() -> int:
+            rows = csv_rows(chunked(upload, 1024))
+            return len([x async for x in service.import_users(rows, 8)])
+
+        importing = asyncio.create_task(run_import())
+        await asyncio.sleep(0.01)
+        assert await service.authenticate_user("johndoe@test.com", "test")
+        # The login only waited for the one import hash queued before it.
+        assert scheme.hashed <= 2
+        assert await importing == 24